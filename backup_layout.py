@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Formatos de almacenamiento de los backups
+
+Un backup puede ser:
+- Un archivo único comprimido (`db_YYYYMMDD_HHMMSS.sql.gz`, `.sql.zst`...)
+  con el SHA-256 del volcado sin comprimir en `<archivo>.sha256` y, si se
+  escribió por bloques, el índice de tablas en `<archivo>.index.json` (ver
+  seekable_archive.py)
+- Un directorio por tablas (`db_YYYYMMDD_HHMMSS.tables/`) con:
+    manifest.json      Tablas, filas, tamaños y checksums
+    schema.sql.*       Tablas y vistas sin datos ni triggers
+    data/<tabla>.sql.* Datos de cada tabla (un archivo por tabla)
+    objects.sql.*      Triggers, rutinas y eventos
+- Un manifest de un backup deduplicado (`db_YYYYMMDD_HHMMSS.dedup`) cuyos
+  fragmentos están en `store/` (ver dedup_store.py)
+
+Este módulo es compartido por backup_mysql.py y web_monitor.py.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+from compression import is_backup_file, list_backup_files, strip_backup_extension
+from dedup_store import read_dedup_manifest, remove_dedup_backup
+
+CHUNKED_SUFFIX = '.tables'
+DEDUP_SUFFIX = '.dedup'
+CHECKSUM_SUFFIX = '.sha256'
+INDEX_SUFFIX = '.index.json'
+MANIFEST_NAME = 'manifest.json'
+SCHEMA_NAME = 'schema'
+OBJECTS_NAME = 'objects'
+DATA_DIR = 'data'
+MANIFEST_FORMAT = 1
+
+
+def table_filename(table, extension):
+    """Nombre de archivo seguro para los datos de una tabla"""
+    return f"{quote(table, safe='')}{extension}"
+
+
+def is_chunked_backup(path):
+    """Indica si `path` es un backup por tablas completo (con manifest)"""
+    path = Path(path)
+    return path.name.endswith(CHUNKED_SUFFIX) and (path / MANIFEST_NAME).is_file()
+
+
+def is_dedup_backup(path):
+    """Indica si `path` es el manifest de un backup deduplicado"""
+    path = Path(path)
+    return path.name.endswith(DEDUP_SUFFIX) and path.is_file()
+
+
+def is_backup(path):
+    """Indica si `path` es un backup válido en cualquiera de los formatos"""
+    path = Path(path)
+    return (path.is_file() and is_backup_file(path)) or is_chunked_backup(path) or is_dedup_backup(path)
+
+
+def read_manifest(path):
+    """
+    Lee el manifest de un backup por tablas
+
+    Returns:
+        dict: Contenido de manifest.json
+    """
+    with open(Path(path) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(path, manifest):
+    """Escribe manifest.json de forma atómica"""
+    manifest_path = Path(path) / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix('.json.part')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def checksum_path(path):
+    """Archivo con el SHA-256 de un backup de archivo único"""
+    path = Path(path)
+    return path.with_name(path.name + CHECKSUM_SUFFIX)
+
+
+def write_checksum(path, sha256):
+    """
+    Guarda el SHA-256 del volcado sin comprimir junto al backup
+
+    El formato es el de sha256sum, así que también se puede comprobar con
+    `zcat db.sql.gz | sha256sum`.
+    """
+    path = Path(path)
+    target = checksum_path(path)
+    tmp_path = target.with_name(target.name + '.part')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(f"{sha256}  {backup_basename(path.name)}.sql\n")
+    os.replace(tmp_path, target)
+
+
+def read_checksum(path):
+    """SHA-256 guardado junto a un backup de archivo único, o None si no tiene"""
+    try:
+        with open(checksum_path(path), 'r', encoding='utf-8') as f:
+            return f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def index_path(path):
+    """Índice de tablas de un backup de archivo único escrito por bloques"""
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def sidecar_paths(path):
+    """Archivos auxiliares (SHA-256 e índice) de un backup de archivo único"""
+    return [checksum_path(path), index_path(path)]
+
+
+def backup_basename(name):
+    """Quita la extensión de backup (`.sql.gz`, `.tables`...) de un nombre"""
+    for suffix in (CHUNKED_SUFFIX, DEDUP_SUFFIX):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return strip_backup_extension(name)
+
+
+def parse_backup_name(name):
+    """
+    Obtiene la base de datos y la fecha de un nombre de backup
+
+    Args:
+        name (str): Nombre como `gastos_db_20250101_233000.sql.gz`
+
+    Returns:
+        tuple: (base de datos, datetime o None si el nombre no tiene fecha)
+    """
+    base = backup_basename(name)
+    parts = base.rsplit('_', 2)
+    if len(parts) < 3:
+        return base, None
+    try:
+        return parts[0], datetime.strptime(f"{parts[1]}_{parts[2]}", "%Y%m%d_%H%M%S")
+    except ValueError:
+        return parts[0], None
+
+
+def backup_size(path):
+    """
+    Tamaño en disco de un backup
+
+    Para los backups por tablas se usa el total del manifest y, si no está,
+    la suma de sus archivos. Para los deduplicados, los bytes que agregaron
+    al almacén más su manifest (los fragmentos compartidos no se cuentan).
+    """
+    path = Path(path)
+    if is_dedup_backup(path):
+        return read_dedup_manifest(path)['new_bytes'] + path.stat().st_size
+    if not path.is_dir():
+        return path.stat().st_size
+    try:
+        return read_manifest(path)['size']
+    except (OSError, ValueError, KeyError):
+        return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def list_backups(directory):
+    """
+    Lista todos los backups de un directorio (archivos y directorios por tablas)
+
+    Returns:
+        list: Rutas de los backups encontrados
+    """
+    directory = Path(directory)
+    backups = list_backup_files(directory)
+    backups.extend(p for p in directory.glob(f'*{CHUNKED_SUFFIX}') if is_chunked_backup(p))
+    backups.extend(p for p in directory.glob(f'*{DEDUP_SUFFIX}') if is_dedup_backup(p))
+    return backups
+
+
+def remove_backup(path):
+    """Elimina un backup (archivo, directorio por tablas o deduplicado)"""
+    path = Path(path)
+    if is_dedup_backup(path):
+        # Libera sus fragmentos y borra los que ningún otro backup usa
+        remove_dedup_backup(path)
+    elif path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+        for sidecar in sidecar_paths(path):
+            sidecar.unlink(missing_ok=True)
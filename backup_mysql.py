@@ -6,17 +6,50 @@ Realiza backups de múltiples bases de datos y los guarda con fecha y hora
 
 import os
 import subprocess
+import sys
 import datetime
 import logging
 import json
+import hashlib
+import random
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
 
-# Configuración de logging
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+import backup_plan
+import bulk_load
+import mysql_native
+from backup_layout import (
+    CHUNKED_SUFFIX, DATA_DIR, DEDUP_SUFFIX, MANIFEST_FORMAT, OBJECTS_NAME, SCHEMA_NAME,
+    parse_backup_name, sidecar_paths, table_filename, write_checksum, write_manifest
+)
+from binlog_archive import BinlogArchive
+from catalog import open_catalog
+from compression import get_codec
+from dedup_store import STORE_DIR_NAME, DedupStore, DedupWriter
+from integrity import TrailerTracker, hash_stream
+from log_tail import rotating_handler
+from object_storage import TeeWriter, apply_remote_retention, open_storage, sync_uploads
+from progress import ProgressRegistry
+from retention import apply_retention
+from seekable_archive import SectionIndexer, SeekableWriter, build_index, write_index
+
+# Configuración de logging (el log rota al superar LOG_MAX_BYTES)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('backup_mysql.log'),
+        rotating_handler('backup_mysql.log'),
         logging.StreamHandler()
     ]
 )
@@ -26,183 +59,1611 @@ DB_HOST = '35.209.63.29'
 DB_PORT = '9090'
 DB_USER = 'root'
 DB_PASSWORD = 'sasa'
+# Bases de datos a respaldar (con DISCOVER_DATABASES=true se leen del servidor, ver backup_plan.py)
 DATABASES = ['db_springboot_cloud', 'gastos_db', 'ruleta_db', 'traking']
 
 # Directorio para guardar los backups
 BACKUP_DIR = Path('backups')
 BACKUP_DIR.mkdir(exist_ok=True)
 
-# Días de retención de backups (opcional)
-RETENTION_DAYS = 30
+# Concurrencia: número máximo de mysqldump simultáneos (1 = modo secuencial)
+MAX_PARALLEL_DUMPS = int(os.environ.get('MAX_PARALLEL_DUMPS', '2'))
+
+# Límite de operaciones simultáneas por base de datos (por defecto 1)
+DATABASE_CONCURRENCY = {
+    # 'db_springboot_cloud': 1,
+}
+
+STATUS_FILE = Path('backup_status.json')
+
+# Progreso de los volcados en curso (lo lee el monitor web)
+PROGRESS_FILE = Path('backup_progress.json')
+
+# Compresión: gzip, pgzip (gzip paralelo), zstd o lz4
+COMPRESSION_CODEC = os.environ.get('COMPRESSION_CODEC', 'gzip')
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', '0')) or None  # None = nivel por defecto del codec
+COMPRESSION_THREADS = int(os.environ.get('COMPRESSION_THREADS', str(os.cpu_count() or 1)))
+
+# Backups de archivo único comprimidos por bloques con un índice de tablas,
+# para restaurar tablas sueltas sin descomprimir todo el volcado (ver seekable_archive.py)
+SEEKABLE_BACKUPS = os.environ.get('SEEKABLE_BACKUPS', 'true').lower() in ('1', 'true', 'yes')
+
+# Formato de backup: 'single' (un archivo por base de datos), 'tables'
+# (directorio con un archivo por tabla, volcadas en paralelo, y manifest.json),
+# 'tab' (como 'tables' pero con los datos en TSV para cargarlos con LOAD DATA,
+# ver bulk_load.py) o 'dedup' (fragmentos deduplicados entre backups en backups/store/)
+BACKUP_LAYOUT = os.environ.get('BACKUP_LAYOUT', 'single')
+
+# Formato por base de datos (sobrescribe BACKUP_LAYOUT)
+DATABASE_LAYOUT = {
+    # 'db_springboot_cloud': 'tables',
+}
+
+# Volcados reanudables: se vuelca tabla por tabla registrando cada tabla
+# terminada en un checkpoint, y si el volcado falla el siguiente intento solo
+# vuelca las que faltan. Las tablas quedan consistentes individualmente pero
+# no entre sí (cada una usa su propia transacción)
+RESUMABLE_DUMPS = os.environ.get('RESUMABLE_DUMPS', 'false').lower() in ('1', 'true', 'yes')
+
+# Horas tras las que un volcado incompleto ya no se reanuda (se empieza de cero)
+RESUME_MAX_AGE_HOURS = int(os.environ.get('RESUME_MAX_AGE_HOURS', '24'))
+
+# Directorio de trabajo de los volcados por tablas y su checkpoint
+PARTIAL_SUFFIX = '.partial'
+CHECKPOINT_NAME = 'checkpoint.json'
+
+# Número máximo de tablas volcadas simultáneamente por base de datos
+MAX_PARALLEL_TABLES = int(os.environ.get('MAX_PARALLEL_TABLES', '4'))
+
+# Backups incrementales: registrar la posición del binlog en cada backup
+# completo y archivar los binlogs entre backups completos
+INCREMENTAL_BACKUPS = os.environ.get('INCREMENTAL_BACKUPS', 'false').lower() in ('1', 'true', 'yes')
+
+# Opción de mysqldump que escribe la posición del binlog: --master-data=2 con el
+# cliente MariaDB de la imagen; --source-data=2 con el cliente de MySQL 8.0.26+
+BINLOG_POSITION_OPTION = os.environ.get('BINLOG_POSITION_OPTION', '--master-data=2')
+
+# Reintentos: intentos por base de datos y espera entre ellos (backoff
+# exponencial desde RETRY_BACKOFF_BASE hasta RETRY_BACKOFF_MAX, con jitter
+# para que las bases de datos que fallan a la vez no reintenten a la vez)
+BACKUP_ATTEMPTS = max(1, int(os.environ.get('BACKUP_ATTEMPTS', '3')))
+RETRY_BACKOFF_BASE = float(os.environ.get('RETRY_BACKOFF_BASE', '30'))
+RETRY_BACKOFF_MAX = float(os.environ.get('RETRY_BACKOFF_MAX', '600'))
+
+# Segundos máximos de cada intento: al agotarse se mata mysqldump y se
+# reintenta (0 = sin límite)
+DUMP_TIMEOUT = int(os.environ.get('DUMP_TIMEOUT', '0'))
+
+# Tiempo máximo por base de datos (sobrescribe DUMP_TIMEOUT)
+DATABASE_TIMEOUTS = {
+    # 'db_springboot_cloud': 3600,
+}
+
+# Segundos máximos de toda la ejecución, incluidos los reintentos: al
+# agotarse se interrumpen los volcados en curso y no se empiezan más (0 = sin límite)
+RUN_DEADLINE = int(os.environ.get('RUN_DEADLINE', '0'))
+
+# Tamaño de bloque para leer la salida de mysqldump en streaming
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+_database_locks = {}
+_database_locks_guard = threading.Lock()
+
+# Límite global de volcados simultáneos en este proceso, aunque se lancen
+# varias ejecuciones a la vez (p.ej. desde el scheduler)
+_dump_slots = threading.BoundedSemaphore(max(1, MAX_PARALLEL_DUMPS))
+
+# Actualizaciones de STATUS_FILE de una en una (ver status_lock())
+_status_lock = threading.Lock()
+
+# Retención, sincronización con S3 y archivado de binlogs de uno en uno (ver run_maintenance())
+_maintenance_lock = threading.Lock()
+
+progress = ProgressRegistry(PROGRESS_FILE)
+
+# Último error de backup de cada hilo (se guarda en el historial de intentos)
+_last_error = threading.local()
+
+# Fila del catálogo del último backup registrado por cada hilo (para las métricas)
+_last_backup = threading.local()
+
+# Catálogo de backups que consulta el monitor web
+catalog = open_catalog(BACKUP_DIR)
+
+# Copia remota en almacenamiento S3 (None si S3_BUCKET no está configurado)
+storage = open_storage()
+
+
+class IncompleteDumpError(Exception):
+    """mysqldump terminó sin error pero el volcado no termina con el pie de mysqldump"""
+
+
+def report_error(message):
+    """Registra un error de backup en el log y como último error del hilo actual"""
+    logging.error(message)
+    _last_error.message = message.lstrip('✗ ')
+
+
+def get_database_semaphore(database_name):
+    """
+    Obtiene el semáforo que limita las operaciones simultáneas sobre una base de datos
+    
+    Args:
+        database_name (str): Nombre de la base de datos
+        
+    Returns:
+        threading.BoundedSemaphore: Semáforo compartido para esa base de datos
+    """
+    with _database_locks_guard:
+        if database_name not in _database_locks:
+            limit = max(1, DATABASE_CONCURRENCY.get(database_name, 1))
+            _database_locks[database_name] = threading.BoundedSemaphore(limit)
+        return _database_locks[database_name]
+
+
+@contextmanager
+def status_lock():
+    """
+    Bloqueo de STATUS_FILE entre hilos y entre procesos (p.ej. el scheduler y
+    un backup lanzado desde el monitor web), para leer y reescribir el estado
+    sin perder los resultados que escriba otra ejecución
+    """
+    with _status_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(BACKUP_DIR / '.status.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def database_run_lock(database_name):
+    """
+    Bloqueo entre procesos para no respaldar la misma base de datos dos veces a la vez
+    
+    Usa flock sobre `backups/.<base_de_datos>.lock`, que el sistema libera
+    aunque el proceso muera.
+    
+    Yields:
+        bool: True si se obtuvo el bloqueo, False si otra ejecución lo tiene
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(BACKUP_DIR / f'.{database_name}.lock', 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def connection_args():
+    """Argumentos de conexión comunes a mysql y mysqldump"""
+    return [
+        f'--host={DB_HOST}',
+        f'--port={DB_PORT}',
+        f'--user={DB_USER}',
+        f'--password={DB_PASSWORD}',
+        '--skip-ssl'
+    ]
+
+
+def build_dump_command(database_name):
+    """
+    Construye el comando mysqldump con todos los objetos de la base de datos
+    
+    Args:
+        database_name (str): Nombre de la base de datos a respaldar
+        
+    Returns:
+        list: Argumentos del comando
+    """
+    cmd = [
+        'mysqldump', *connection_args(),
+        '--single-transaction',
+        '--routines',           # Incluir procedimientos almacenados y funciones
+        '--triggers',           # Incluir triggers
+        '--events',             # Incluir eventos programados
+        '--skip-add-drop-table',  # No agregar DROP TABLE (para preservar estructura)
+    ]
+    if INCREMENTAL_BACKUPS:
+        # Posición del binlog como comentario en la cabecera (punto de partida de los incrementales)
+        cmd.append(BINLOG_POSITION_OPTION)
+    cmd += [
+        '--databases',          # Usar formato --databases para incluir CREATE DATABASE
+        database_name
+    ]
+    return cmd
+
+
+def source_pool():
+    """Pool de conexiones del servidor de origen (motor nativo, ver mysql_native.py)"""
+    return mysql_native.get_pool(DB_HOST, DB_PORT, DB_USER, DB_PASSWORD)
+
+
+def run_query(sql, database_name=None):
+    """
+    Ejecuta una consulta con el cliente mysql en modo batch (o con el motor nativo)
+    
+    Args:
+        sql (str): Consulta a ejecutar
+        database_name (str): Base de datos por defecto (opcional)
+        
+    Returns:
+        list: Filas devueltas, cada una como lista de columnas (str)
+        
+    Raises:
+        subprocess.CalledProcessError: Si mysql termina con error
+    """
+    if mysql_native.enabled():
+        try:
+            return mysql_native.query(source_pool(), sql, database_name)
+        except mysql_native.NativeError as e:
+            raise subprocess.CalledProcessError(1, 'mysql_native', stderr=str(e)) from e
+    cmd = ['mysql', *connection_args(), '--batch', '--skip-column-names', '-e', sql]
+    if database_name:
+        cmd.append(database_name)
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return [line.split('\t') for line in result.stdout.splitlines() if line]
+
+
+def list_tables(database_name):
+    """
+    Obtiene las tablas base de una base de datos con sus estimaciones de tamaño
+    
+    Args:
+        database_name (str): Nombre de la base de datos
+        
+    Returns:
+        list: dicts con name, rows (estimación de information_schema) y data_length,
+              ordenados de mayor a menor para empezar por las tablas más grandes
+    """
+    rows = run_query(
+        "SELECT TABLE_NAME, IFNULL(TABLE_ROWS, 0), IFNULL(DATA_LENGTH, 0) "
+        "FROM information_schema.TABLES "
+        f"WHERE TABLE_SCHEMA = '{database_name}' AND TABLE_TYPE = 'BASE TABLE'"
+    )
+    tables = [{'name': r[0], 'rows': int(r[1]), 'data_length': int(r[2])} for r in rows]
+    return sorted(tables, key=lambda t: t['data_length'], reverse=True)
+
+
+def build_schema_command(database_name):
+    """Comando mysqldump de tablas y vistas sin datos, triggers ni rutinas"""
+    return [
+        'mysqldump', *connection_args(),
+        '--single-transaction',
+        '--no-data',
+        '--skip-triggers',
+        '--skip-add-drop-table',
+        database_name
+    ]
+
+
+def build_objects_command(database_name):
+    """Comando mysqldump de triggers, rutinas y eventos (se aplican tras los datos)"""
+    return [
+        'mysqldump', *connection_args(),
+        '--no-data',
+        '--no-create-info',
+        '--triggers',
+        '--routines',
+        '--events',
+        database_name
+    ]
+
+
+def build_table_data_command(database_name, table):
+    """
+    Comando mysqldump con solo los datos de una tabla
+    
+    Con el motor nativo devuelve un mysql_native.TableDump con la misma salida
+    (pipe_dump() acepta ambos)
+    """
+    if mysql_native.enabled():
+        return mysql_native.TableDump(source_pool(), database_name, table)
+    return [
+        'mysqldump', *connection_args(),
+        '--single-transaction',
+        '--no-create-info',
+        '--skip-triggers',
+        database_name,
+        table
+    ]
+
+
+def pipe_dump(cmd, f_out, digest=None, tracker=None, deadline=None):
+    """
+    Ejecuta mysqldump y escribe su salida por bloques en `f_out`
+    
+    Args:
+        cmd (list): Comando mysqldump a ejecutar (o mysql_native.TableDump)
+        f_out: Destino con write() (archivo comprimido, almacén deduplicado...)
+        digest (hashlib hash): Si se indica, se actualiza con los datos sin comprimir
+        tracker (ProgressTracker): Progreso del volcado (bytes, tablas y filas)
+        deadline (float): Instante (time.monotonic()) en el que se mata mysqldump
+        
+    Returns:
+        int: Bytes sin comprimir leídos de mysqldump
+        
+    Raises:
+        subprocess.CalledProcessError: Si mysqldump termina con error
+        subprocess.TimeoutExpired: Si se alcanza `deadline`
+        IncompleteDumpError: Si el volcado no termina con "-- Dump completed"
+    """
+    if isinstance(cmd, mysql_native.TableDump):
+        return copy_dump(cmd, f_out, digest, tracker, deadline)
+    
+    raw_bytes = 0
+    completed = False
+    trailer = TrailerTracker()
+    timed_out = threading.Event()
+    
+    def kill(process):
+        timed_out.set()
+        # Todo el grupo: un envoltorio (p.ej. un script) dejaría el pipe abierto
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            process.kill()
+    
+    if deadline is not None and time.monotonic() >= deadline:
+        raise subprocess.TimeoutExpired(cmd[0], 0)
+    
+    # stderr a un archivo temporal para no bloquear el pipe de stdout
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+            start_new_session=deadline is not None and os.name == 'posix'
+        )
+        # Un mysqldump colgado bloquea la lectura, así que lo mata un temporizador
+        watchdog = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            watchdog = threading.Timer(timeout, kill, args=(process,))
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            while True:
+                chunk = process.stdout.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f_out.write(chunk)
+                raw_bytes += len(chunk)
+                trailer.update(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                if tracker is not None:
+                    tracker.scan_dump(chunk)
+            completed = True
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            process.stdout.close()
+            # Si la escritura falló (p.ej. disco lleno) no dejar mysqldump colgado
+            if not completed and process.poll() is None:
+                process.kill()
+            returncode = process.wait()
+        
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd[0], timeout)
+        if returncode != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='replace')
+            raise subprocess.CalledProcessError(returncode, cmd[0], stderr=stderr)
+    
+    if not trailer.complete:
+        raise IncompleteDumpError(f"El volcado de {cmd[0]} no termina con \"-- Dump completed\" ({raw_bytes} bytes)")
+    return raw_bytes
+
+
+def copy_dump(dump, f_out, digest=None, tracker=None, deadline=None):
+    """
+    pipe_dump() de un volcado del motor nativo (mysql_native.TableDump)
+    
+    El plazo se comprueba entre bloques: una consulta que no devuelve filas
+    no se interrumpe hasta el siguiente bloque.
+    
+    Raises:
+        subprocess.CalledProcessError: Si MySQL devuelve un error
+        subprocess.TimeoutExpired: Si se alcanza `deadline`
+        IncompleteDumpError: Si el volcado no termina con "-- Dump completed"
+    """
+    raw_bytes = 0
+    trailer = TrailerTracker()
+    chunks = dump.chunks()
+    try:
+        for chunk in chunks:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(str(dump), 0)
+            f_out.write(chunk)
+            raw_bytes += len(chunk)
+            trailer.update(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            if tracker is not None:
+                tracker.scan_dump(chunk)
+    except mysql_native.NativeError as e:
+        raise subprocess.CalledProcessError(1, str(dump), stderr=str(e)) from e
+    finally:
+        chunks.close()
+    
+    if not trailer.complete:
+        raise IncompleteDumpError(f"El volcado de {dump} no termina con \"-- Dump completed\" ({raw_bytes} bytes)")
+    return raw_bytes
+
+
+def stream_dump(cmd, output_path, codec=None, digest=None, tracker=None, deadline=None, upload=None, seekable=False,
+                wrap=None):
+    """
+    Ejecuta mysqldump y comprime su salida directamente en el archivo destino
+    
+    La salida nunca se escribe sin comprimir: se escribe en un archivo
+    temporal `.part` que se renombra de forma atómica al terminar con éxito.
+    Con `upload`, la salida comprimida se envía también a S3 mientras se
+    escribe; si el volcado falla, la subida se cancela. Con `seekable`, se
+    comprime por bloques y el índice de tablas se guarda junto al archivo.
+    
+    Args:
+        cmd (list): Comando mysqldump a ejecutar
+        output_path (Path): Ruta final del archivo comprimido
+        codec (Codec): Codec de compresión (por defecto COMPRESSION_CODEC)
+        digest (hashlib hash): Si se indica, se actualiza con los datos sin comprimir
+        tracker (ProgressTracker): Progreso del volcado (bytes, tablas y filas)
+        deadline (float): Instante (time.monotonic()) en el que se mata mysqldump
+        upload (MultipartUpload): Subida a S3 que recibe la salida comprimida (ver finish_upload())
+        seekable (bool): Comprimir por bloques y escribir `<archivo>.index.json`
+        wrap (callable): Recibe el destino comprimido y devuelve el que recibe la
+                         salida de mysqldump (p.ej. bulk_load.TsvWriter), con finish()
+        
+    Returns:
+        int: Bytes sin comprimir leídos de mysqldump
+        
+    Raises:
+        subprocess.CalledProcessError: Si mysqldump termina con error
+        subprocess.TimeoutExpired: Si se alcanza `deadline`
+    """
+    codec = codec or get_codec(COMPRESSION_CODEC)
+    tmp_path = Path(str(output_path) + '.part')
+    
+    def open_writer(target):
+        if seekable:
+            return SeekableWriter(codec, target, COMPRESSION_LEVEL, COMPRESSION_THREADS)
+        return codec.open_writer(target, COMPRESSION_LEVEL, COMPRESSION_THREADS)
+    
+    def dump_into(f_out):
+        if wrap is None:
+            return pipe_dump(cmd, f_out, digest, tracker, deadline)
+        converter = wrap(f_out)
+        raw_bytes = pipe_dump(cmd, converter, digest, tracker, deadline)
+        converter.finish()
+        return raw_bytes
+    
+    try:
+        if upload is None:
+            with open_writer(tmp_path) as f_out:
+                raw_bytes = dump_into(f_out)
+        else:
+            with open(tmp_path, 'wb') as f_disk:
+                with open_writer(TeeWriter(f_disk, upload)) as f_out:
+                    raw_bytes = dump_into(f_out)
+        os.replace(tmp_path, output_path)
+        if seekable:
+            write_index(output_path, f_out.index())
+        return raw_bytes
+    
+    except BaseException:
+        if upload is not None:
+            upload.abort()
+        raise
+    
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
 
 
-def create_backup(database_name):
+def dump_part(cmd, output_path, codec, tracker=None, deadline=None, tsv=False):
     """
-    Crea un backup de una base de datos específica
+    Vuelca una parte de un backup por tablas y devuelve su entrada del manifest
+    
+    Args:
+        cmd (list): Comando mysqldump
+        output_path (Path): Archivo comprimido destino
+        codec (Codec): Codec de compresión
+        tracker (ProgressTracker): Progreso del volcado
+        deadline (float): Instante (time.monotonic()) en el que se mata mysqldump
+        tsv (bool): Guardar los datos en TSV (ver bulk_load.py)
+        
+    Returns:
+        dict: raw_bytes, size, sha256 (de los datos sin comprimir) y duración;
+              con `tsv`, también format y columns
+        
+    Raises:
+        bulk_load.UnsupportedValue: Si los datos no se pueden pasar a TSV
+    """
+    digest = hashlib.sha256()
+    start = time.monotonic()
+    if not tsv:
+        raw_bytes = stream_dump(cmd, output_path, codec, digest, tracker, deadline)
+        extra = {}
+    else:
+        writer = bulk_load.TsvWriter(None, digest)
+        
+        def wrap(f_out):
+            writer.target = f_out
+            return writer
+        
+        stream_dump(cmd, output_path, codec, None, tracker, deadline, wrap=wrap)
+        raw_bytes = writer.bytes
+        extra = {'format': bulk_load.TSV_FORMAT, 'columns': writer.columns}
+    return {
+        'raw_bytes': raw_bytes,
+        'size': output_path.stat().st_size,
+        'sha256': digest.hexdigest(),
+        'duration_seconds': round(time.monotonic() - start, 3),
+        **extra
+    }
+
+
+def load_checkpoint(database_name, codec, layout):
+    """
+    Prepara el directorio de trabajo de un volcado por tablas y su checkpoint
+    
+    Con RESUMABLE_DUMPS se reutiliza el de un intento anterior que falló o se
+    interrumpió (mismo codec y formato y no más antiguo que RESUME_MAX_AGE_HOURS);
+    en otro caso se empieza de cero.
+    
+    Args:
+        database_name (str): Nombre de la base de datos
+        codec (Codec): Codec de compresión
+        layout (str): Formato final ('tables', 'tab' o 'single')
+        
+    Returns:
+        tuple: (directorio de trabajo, checkpoint)
+    """
+    work_dir = BACKUP_DIR / f"{database_name}{PARTIAL_SUFFIX}"
+    checkpoint = None
+    if RESUMABLE_DUMPS and work_dir.is_dir():
+        try:
+            with open(work_dir / CHECKPOINT_NAME, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            started = datetime.datetime.fromisoformat(checkpoint['started_at'])
+            if (checkpoint['codec'] != codec.name or checkpoint['layout'] != layout
+                    or datetime.datetime.now() - started > datetime.timedelta(hours=RESUME_MAX_AGE_HOURS)):
+                checkpoint = None
+        except (OSError, ValueError, KeyError):
+            checkpoint = None
+    
+    if checkpoint is None:
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+        checkpoint = {
+            'database': database_name,
+            'codec': codec.name,
+            'layout': layout,
+            'started_at': datetime.datetime.now().isoformat(),
+            'parts': {}
+        }
+    else:
+        # Restos de partes que se estaban escribiendo cuando falló el intento anterior
+        for leftover in work_dir.rglob('*.part'):
+            leftover.unlink()
+        logging.info(f"Reanudando volcado de {database_name}: {len(checkpoint['parts'])} partes ya completadas")
+    
+    (work_dir / DATA_DIR).mkdir(parents=True, exist_ok=True)
+    save_checkpoint(work_dir, checkpoint)
+    return work_dir, checkpoint
+
+
+def save_checkpoint(work_dir, checkpoint):
+    """Escribe checkpoint.json de forma atómica"""
+    tmp_path = work_dir / f"{CHECKPOINT_NAME}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, work_dir / CHECKPOINT_NAME)
+
+
+def dump_parts(database_name, work_dir, codec, checkpoint, tracker=None, deadline=None, tsv=False):
+    """
+    Vuelca esquema, datos de cada tabla en paralelo y objetos en `work_dir`
+    
+    Las partes registradas en el checkpoint cuyo archivo sigue intacto no se
+    vuelven a volcar; cada parte terminada se registra al momento. Con `tsv`
+    los datos de cada tabla se guardan en TSV (ver bulk_load.py), salvo los
+    de las tablas con valores que no se pueden convertir, que quedan en SQL.
+    
+    Returns:
+        tuple: (esquema, lista de tablas, objetos) como entradas del manifest
+    """
+    checkpoint_lock = threading.Lock()
+    parts = checkpoint['parts']
+    
+    def run_part(key, cmd, filename, tsv_filename=None):
+        entry = parts.get(key)
+        if entry and (work_dir / entry['file']).is_file() and (work_dir / entry['file']).stat().st_size == entry['size']:
+            if tracker is not None:
+                tracker.add_bytes(entry['raw_bytes'])
+            return dict(entry, resumed=True)
+        entry = None
+        if tsv_filename is not None:
+            try:
+                entry = {'file': tsv_filename, **dump_part(cmd, work_dir / tsv_filename, codec, tracker, deadline, tsv=True)}
+            except bulk_load.UnsupportedValue as e:
+                logging.info(f"  {database_name}: {key} se guarda en SQL ({str(e)})")
+        if entry is None:
+            entry = {'file': filename, **dump_part(cmd, work_dir / filename, codec, tracker, deadline)}
+        with checkpoint_lock:
+            parts[key] = entry
+            save_checkpoint(work_dir, checkpoint)
+        return entry
+    
+    tables = list_tables(database_name)
+    workers = max(1, min(MAX_PARALLEL_TABLES, len(tables) or 1))
+    logging.info(f"Iniciando backup por tablas de {database_name} ({len(tables)} tablas, {workers} simultáneas, {codec.name})...")
+    if tracker is not None:
+        tracker.set_stage('dump', total_tables=len(tables))
+    
+    schema = run_part('schema', build_schema_command(database_name), f"{SCHEMA_NAME}{codec.extension}")
+    
+    table_entries = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'dump-{database_name}') as executor:
+        futures = {}
+        for table in tables:
+            data_file = f"{DATA_DIR}/{table_filename(table['name'], codec.extension)}"
+            tsv_file = f"{DATA_DIR}/{table_filename(table['name'], bulk_load.tsv_extension(codec))}" if tsv else None
+            cmd = build_table_data_command(database_name, table['name'])
+            futures[executor.submit(run_part, f"table:{table['name']}", cmd, data_file, tsv_file)] = table
+        for future in as_completed(futures):
+            table = futures[future]
+            entry = future.result()
+            resumed = entry.pop('resumed', False)
+            table_entries[table['name']] = {'name': table['name'], 'rows': table['rows'], **entry}
+            if resumed:
+                logging.info(f"  {database_name}.{table['name']}: ya volcada en el intento anterior")
+            else:
+                logging.info(f"  {database_name}.{table['name']}: {entry['raw_bytes'] / (1024 * 1024):.2f} MB en {entry['duration_seconds']:.1f}s")
+    
+    objects = run_part('objects', build_objects_command(database_name), f"{OBJECTS_NAME}{codec.extension}")
+    schema.pop('resumed', None)
+    objects.pop('resumed', None)
+    return schema, [table_entries[t['name']] for t in tables], objects
+
+
+def create_table_backup(database_name, tracker=None, deadline=None, layout='tables'):
+    """
+    Crea un backup por tablas: esquema, datos de cada tabla en paralelo y
+    objetos (triggers, rutinas, eventos), con un manifest.json
+    
+    Cada tabla se vuelca con su propia conexión y transacción, por lo que las
+    tablas son consistentes individualmente pero no entre sí.
+    
+    Args:
+        database_name (str): Nombre de la base de datos a respaldar
+        tracker (ProgressTracker): Progreso del volcado
+        deadline (float): Instante (time.monotonic()) en el que se interrumpe el volcado
+        layout (str): 'tables' (datos en SQL) o 'tab' (datos en TSV, ver bulk_load.py)
+        
+    Returns:
+        bool: True si el backup fue exitoso, False en caso contrario
+    """
+    work_dir = None
+    completed = False
+    try:
+        codec = get_codec(COMPRESSION_CODEC)
+        work_dir, checkpoint = load_checkpoint(database_name, codec, layout)
+        schema, table_list, objects = dump_parts(database_name, work_dir, codec, checkpoint, tracker, deadline,
+                                                 tsv=layout == 'tab')
+        
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_dir = BACKUP_DIR / f"{database_name}_{timestamp}{CHUNKED_SUFFIX}"
+        
+        # Datos de tablas que ya no existen (volcadas en un intento anterior)
+        keep = {t['file'] for t in table_list}
+        for data_file in (work_dir / DATA_DIR).iterdir():
+            if f"{DATA_DIR}/{data_file.name}" not in keep:
+                data_file.unlink()
+        
+        parts = [schema, objects, *table_list]
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'layout': layout,
+            'database': database_name,
+            'created_at': datetime.datetime.now().isoformat(),
+            'codec': codec.name,
+            'schema': schema,
+            'objects': objects,
+            'tables': table_list,
+            'raw_bytes': sum(p['raw_bytes'] for p in parts),
+            'size': sum(p['size'] for p in parts)
+        }
+        (work_dir / CHECKPOINT_NAME).unlink()
+        write_manifest(work_dir, manifest)
+        os.replace(work_dir, backup_dir)
+        completed = True
+        update_catalog(backup_dir, raw_bytes=manifest['raw_bytes'], codec=codec.name, complete=True)
+        
+        raw_mb = manifest['raw_bytes'] / (1024 * 1024)
+        size_mb = manifest['size'] / (1024 * 1024)
+        logging.info(f"✓ Backup completado: {backup_dir.name} ({raw_mb:.2f} MB sin comprimir, {size_mb:.2f} MB comprimido)")
+        return True
+        
+    except subprocess.TimeoutExpired:
+        report_error(f"✗ Tiempo límite agotado al respaldar {database_name}: se interrumpió mysqldump")
+        return False
+    except subprocess.CalledProcessError as e:
+        report_error(f"✗ Error al crear backup de {database_name}: {e.stderr}")
+        return False
+    except Exception as e:
+        report_error(f"✗ Error inesperado al respaldar {database_name}: {str(e)}")
+        return False
+    finally:
+        if not completed and work_dir is not None and work_dir.exists():
+            if RESUMABLE_DUMPS:
+                logging.info(f"  Las partes completadas de {database_name} se conservan para reanudar")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def create_resumable_backup(database_name, tracker=None, deadline=None):
+    """
+    Crea un backup de archivo único reanudable
+    
+    Vuelca tabla por tabla (como el formato por tablas) registrando cada parte
+    terminada en un checkpoint; si el volcado falla, el siguiente intento solo
+    vuelca las partes que faltan. Al final concatena las partes comprimidas
+    (gzip, zstd y lz4 admiten varios bloques seguidos) en el archivo final,
+    sin descomprimir ni recomprimir.
     
     Args:
         database_name (str): Nombre de la base de datos a respaldar
+        tracker (ProgressTracker): Progreso del volcado
+        deadline (float): Instante (time.monotonic()) en el que se interrumpe el volcado
         
     Returns:
         bool: True si el backup fue exitoso, False en caso contrario
     """
+    work_dir = None
+    upload = None
+    completed = False
+    try:
+        codec = get_codec(COMPRESSION_CODEC)
+        work_dir, checkpoint = load_checkpoint(database_name, codec, 'single')
+        schema, table_list, objects = dump_parts(database_name, work_dir, codec, checkpoint, tracker, deadline)
+        
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_path = BACKUP_DIR / f"{database_name}_{timestamp}{codec.extension}"
+        tmp_path = Path(str(backup_path) + '.part')
+        parts = [schema, *table_list, objects]
+        # La concatenación se sube a S3 mientras se escribe
+        upload = storage.open_upload(backup_path.name) if storage else None
+        blocks = []
+        with open(tmp_path, 'wb') as f_disk:
+            f_out = TeeWriter(f_disk, upload) if upload else f_disk
+            for part in parts:
+                # Cada parte es un bloque independiente del índice de tablas
+                offset = blocks[-1][2] + blocks[-1][3] if blocks else 0
+                raw_offset = blocks[-1][0] + blocks[-1][1] if blocks else 0
+                blocks.append([raw_offset, part['raw_bytes'], offset, part['size']])
+                with open(work_dir / part['file'], 'rb') as f_in:
+                    shutil.copyfileobj(f_in, f_out, STREAM_CHUNK_SIZE)
+        
+        # El SHA-256 del volcado completo no se deduce de los de las partes:
+        # se relee el archivo concatenado, lo que además comprueba que se
+        # descomprime, y en la misma lectura se localizan las tablas
+        indexer = SectionIndexer()
+        with codec.open_reader(tmp_path) as reader:
+            sha256, raw_bytes, _ = hash_stream(reader, indexer.feed if SEEKABLE_BACKUPS else None)
+        expected_bytes = sum(p['raw_bytes'] for p in parts)
+        if raw_bytes != expected_bytes:
+            raise IncompleteDumpError(f"El archivo concatenado tiene {raw_bytes} bytes sin comprimir, se esperaban {expected_bytes}")
+        write_checksum(backup_path, sha256)
+        os.replace(tmp_path, backup_path)
+        if SEEKABLE_BACKUPS:
+            indexer.close()
+            write_index(backup_path, build_index(codec, blocks, indexer))
+        completed = True
+        shutil.rmtree(work_dir, ignore_errors=True)
+        
+        raw_mb = raw_bytes / (1024 * 1024)
+        size_mb = backup_path.stat().st_size / (1024 * 1024)
+        logging.info(f"✓ Backup completado: {backup_path.name} ({raw_mb:.2f} MB sin comprimir, {size_mb:.2f} MB comprimido)")
+        row = update_catalog(backup_path, raw_bytes=raw_bytes, codec=codec.name, sha256=sha256, complete=True)
+        if upload:
+            finish_upload(row, upload)
+            upload = None
+        return True
+        
+    except subprocess.TimeoutExpired:
+        report_error(f"✗ Tiempo límite agotado al respaldar {database_name}: se interrumpió mysqldump")
+        return False
+    except subprocess.CalledProcessError as e:
+        report_error(f"✗ Error al crear backup de {database_name}: {e.stderr}")
+        return False
+    except Exception as e:
+        report_error(f"✗ Error inesperado al respaldar {database_name}: {str(e)}")
+        return False
+    finally:
+        if upload:
+            upload.abort()
+        if not completed and work_dir is not None and work_dir.exists():
+            logging.info(f"  Las partes completadas de {database_name} se conservan para reanudar")
+
+
+def create_dedup_backup(database_name, tracker=None, deadline=None):
+    """
+    Crea un backup deduplicado: el volcado se divide en fragmentos por
+    contenido y solo se guardan los que no estaban ya en backups/store/
+    
+    Args:
+        database_name (str): Nombre de la base de datos a respaldar
+        tracker (ProgressTracker): Progreso del volcado
+        deadline (float): Instante (time.monotonic()) en el que se interrumpe el volcado
+        
+    Returns:
+        bool: True si el backup fue exitoso, False en caso contrario
+    """
+    writer = None
+    try:
+        codec = get_codec(COMPRESSION_CODEC)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_path = BACKUP_DIR / f"{database_name}_{timestamp}{DEDUP_SUFFIX}"
+        
+        logging.info(f"Iniciando backup deduplicado de {database_name} ({codec.name})...")
+        
+        writer = DedupWriter(DedupStore(BACKUP_DIR / STORE_DIR_NAME), codec, COMPRESSION_LEVEL)
+        raw_bytes = pipe_dump(build_dump_command(database_name), writer, tracker=tracker, deadline=deadline)
+        if raw_bytes == 0:
+            report_error(f"✗ El volcado de {database_name} está vacío")
+            return False
+        
+        manifest = writer.commit(
+            backup_path,
+            database=database_name,
+            created_at=datetime.datetime.now().isoformat()
+        )
+        writer = None
+        
+        raw_mb = manifest['raw_bytes'] / (1024 * 1024)
+        new_mb = manifest['new_bytes'] / (1024 * 1024)
+        logging.info(f"✓ Backup completado: {backup_path.name} ({raw_mb:.2f} MB sin comprimir, {new_mb:.2f} MB nuevos en el almacén, {len(manifest['chunks'])} fragmentos)")
+        update_catalog(backup_path, raw_bytes=manifest['raw_bytes'], codec=codec.name, complete=True)
+        return True
+        
+    except subprocess.TimeoutExpired:
+        report_error(f"✗ Tiempo límite agotado al respaldar {database_name}: se interrumpió mysqldump")
+        return False
+    except subprocess.CalledProcessError as e:
+        report_error(f"✗ Error al crear backup de {database_name}: {e.stderr}")
+        return False
+    except Exception as e:
+        report_error(f"✗ Error inesperado al respaldar {database_name}: {str(e)}")
+        return False
+    finally:
+        # Un volcado incompleto no debe dejar fragmentos referenciados
+        if writer is not None:
+            writer.abort()
+
+
+def create_backup(database_name, tracker=None, deadline=None):
+    """
+    Crea un backup comprimido de una base de datos específica
+    
+    Usa el formato por tablas o deduplicado si así lo indican DATABASE_LAYOUT o
+    BACKUP_LAYOUT, y el volcado reanudable por tablas si RESUMABLE_DUMPS está activo.
+    
+    Args:
+        database_name (str): Nombre de la base de datos a respaldar
+        tracker (ProgressTracker): Progreso del volcado (opcional)
+        deadline (float): Instante (time.monotonic()) en el que se interrumpe el volcado
+        
+    Returns:
+        bool: True si el backup fue exitoso, False en caso contrario
+    """
+    layout = DATABASE_LAYOUT.get(database_name, BACKUP_LAYOUT)
+    if layout in ('tables', 'tab'):
+        return create_table_backup(database_name, tracker, deadline, layout)
+    if layout == 'dedup':
+        return create_dedup_backup(database_name, tracker, deadline)
+    if RESUMABLE_DUMPS:
+        return create_resumable_backup(database_name, tracker, deadline)
+    
     try:
         # Generar nombre del archivo con fecha y hora
+        codec = get_codec(COMPRESSION_CODEC)
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"{database_name}_{timestamp}.sql"
+        backup_filename = f"{database_name}_{timestamp}{codec.extension}"
         backup_path = BACKUP_DIR / backup_filename
         
-        logging.info(f"Iniciando backup de {database_name}...")
-        
-        # Comando mysqldump con todos los objetos de la base de datos
-        cmd = [
-            'mysqldump',
-            f'--host={DB_HOST}',
-            f'--port={DB_PORT}',
-            f'--user={DB_USER}',
-            f'--password={DB_PASSWORD}',
-            '--skip-ssl',
-            '--single-transaction',
-            '--routines',           # Incluir procedimientos almacenados y funciones
-            '--triggers',           # Incluir triggers
-            '--events',             # Incluir eventos programados
-            '--skip-add-drop-table',  # No agregar DROP TABLE (para preservar estructura)
-            '--databases',          # Usar formato --databases para incluir CREATE DATABASE
-            database_name
-        ]
-        
-        # Ejecutar el comando y guardar el resultado
-        with open(backup_path, 'w', encoding='utf-8') as backup_file:
-            result = subprocess.run(
-                cmd,
-                stdout=backup_file,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=True
-            )
-        
-        # Verificar que el archivo se creó y tiene contenido
-        if backup_path.exists() and backup_path.stat().st_size > 0:
+        logging.info(f"Iniciando backup de {database_name} ({codec.name})...")
+        
+        # SHA-256 del volcado sin comprimir, calculado mientras se escribe
+        digest = hashlib.sha256()
+        upload = storage.open_upload(backup_filename) if storage else None
+        raw_bytes = stream_dump(build_dump_command(database_name), backup_path, codec, digest, tracker, deadline, upload,
+                                seekable=SEEKABLE_BACKUPS)
+        
+        # Verificar que el volcado tiene contenido
+        if raw_bytes > 0:
+            raw_mb = raw_bytes / (1024 * 1024)
             size_mb = backup_path.stat().st_size / (1024 * 1024)
-            logging.info(f"✓ Backup completado: {backup_filename} ({size_mb:.2f} MB)")
-            
-            # Comprimir el archivo (opcional)
-            compress_backup(backup_path)
-            
+            write_checksum(backup_path, digest.hexdigest())
+            logging.info(f"✓ Backup completado: {backup_filename} ({raw_mb:.2f} MB sin comprimir, {size_mb:.2f} MB comprimido)")
+            row = update_catalog(backup_path, raw_bytes=raw_bytes, codec=codec.name, sha256=digest.hexdigest(), complete=True)
+            if row and row.get('binlog_file'):
+                logging.info(f"  Posición del binlog: {row['binlog_file']}:{row['binlog_pos']}")
+            if upload:
+                finish_upload(row, upload)
             return True
         else:
-            logging.error(f"✗ El archivo de backup está vacío: {backup_filename}")
+            if upload:
+                upload.abort()
+            backup_path.unlink()
+            report_error(f"✗ El archivo de backup está vacío: {backup_filename}")
             return False
             
+    except subprocess.TimeoutExpired:
+        report_error(f"✗ Tiempo límite agotado al respaldar {database_name}: se interrumpió mysqldump")
+        return False
     except subprocess.CalledProcessError as e:
-        logging.error(f"✗ Error al crear backup de {database_name}: {e.stderr}")
+        report_error(f"✗ Error al crear backup de {database_name}: {e.stderr}")
         return False
     except Exception as e:
-        logging.error(f"✗ Error inesperado al respaldar {database_name}: {str(e)}")
+        report_error(f"✗ Error inesperado al respaldar {database_name}: {str(e)}")
         return False
 
 
-def compress_backup(backup_path):
+def compress_backup(backup_path, codec=None):
     """
-    Comprime el archivo de backup usando gzip
+    Comprime un archivo de backup .sql existente con el codec configurado
+    
+    create_backup() ya comprime en streaming; esta función se mantiene para
+    comprimir volcados sin comprimir generados manualmente o por versiones anteriores.
     
     Args:
         backup_path (Path): Ruta del archivo a comprimir
+        codec (Codec): Codec de compresión (por defecto COMPRESSION_CODEC)
     """
+    started_at = datetime.datetime.now()
+    start = time.monotonic()
+    database_name = parse_backup_name(backup_path.name)[0]
+    raw_bytes = None
     try:
-        import gzip
-        import shutil
-        
-        gz_path = Path(str(backup_path) + '.gz')
+        codec = codec or get_codec(COMPRESSION_CODEC)
+        compressed_path = backup_path.with_name(backup_path.stem + codec.extension)
+        raw_bytes = backup_path.stat().st_size
         
         with open(backup_path, 'rb') as f_in:
-            with gzip.open(gz_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+            if SEEKABLE_BACKUPS:
+                f_out = SeekableWriter(codec, compressed_path, COMPRESSION_LEVEL, COMPRESSION_THREADS)
+            else:
+                f_out = codec.open_writer(compressed_path, COMPRESSION_LEVEL, COMPRESSION_THREADS)
+            with f_out:
+                shutil.copyfileobj(f_in, f_out, STREAM_CHUNK_SIZE)
+        if SEEKABLE_BACKUPS:
+            write_index(compressed_path, f_out.index())
         
         # Eliminar el archivo original sin comprimir
         backup_path.unlink()
         
-        size_mb = gz_path.stat().st_size / (1024 * 1024)
-        logging.info(f"  Archivo comprimido: {gz_path.name} ({size_mb:.2f} MB)")
+        size = compressed_path.stat().st_size
+        logging.info(f"  Archivo comprimido: {compressed_path.name} ({size / (1024 * 1024):.2f} MB)")
+        update_catalog(compressed_path, raw_bytes=raw_bytes, codec=codec.name)
+        record_operation('compress', database_name, started_at, time.monotonic() - start, 'success',
+                         raw_bytes=raw_bytes, size=size, filename=compressed_path.name)
         
     except Exception as e:
         logging.warning(f"  No se pudo comprimir el archivo: {str(e)}")
+        record_operation('compress', database_name, started_at, time.monotonic() - start, 'failed',
+                         raw_bytes=raw_bytes, filename=backup_path.name)
 
 
 def cleanup_old_backups():
     """
-    Elimina backups más antiguos que RETENTION_DAYS
+    Aplica la retención abuelo-padre-hijo (ver retention.py) y elimina los
+    volcados incompletos que ya no se van a reanudar
+    
+    Returns:
+        dict: Resultado de apply_retention() (sin la lista de eliminados), o None si falló
     """
+    result = None
     try:
-        cutoff_date = datetime.datetime.now() - datetime.timedelta(days=RETENTION_DAYS)
-        deleted_count = 0
+        result = apply_retention(catalog, BACKUP_DIR)
+        if result['deleted']:
+            verb = 'Se eliminarían' if result['dry_run'] else 'Eliminados'
+            freed_mb = result['freed_bytes'] / (1024 * 1024)
+            logging.info(f"{verb} {len(result['deleted'])} backups antiguos ({freed_mb:.2f} MB); se conservan {result['kept']}")
+        result = dict(result, deleted=len(result['deleted']))
+    except Exception as e:
+        logging.warning(f"Error al aplicar la retención de backups: {str(e)}")
+    
+    try:
+        partial_cutoff = datetime.datetime.now() - datetime.timedelta(hours=RESUME_MAX_AGE_HOURS)
+        for work_dir in BACKUP_DIR.glob(f'*{PARTIAL_SUFFIX}'):
+            checkpoint_path = work_dir / CHECKPOINT_NAME
+            mtime = (checkpoint_path if checkpoint_path.exists() else work_dir).stat().st_mtime
+            if datetime.datetime.fromtimestamp(mtime) < partial_cutoff:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                logging.info(f"Eliminado volcado incompleto: {work_dir.name}")
+    except Exception as e:
+        logging.warning(f"Error al limpiar volcados incompletos: {str(e)}")
+    return result
+
+
+def update_catalog(path=None, removed=None, **meta):
+    """
+    Registra un backup creado (o eliminado) en el catálogo
+    
+    Un error del catálogo no debe hacer fallar el backup: se puede
+    reconstruir después con `python catalog.py reconcile`.
+    """
+    try:
+        if removed is not None:
+            catalog.remove(removed)
+        if path is not None:
+            _last_backup.row = catalog.record(path, **meta)
+            return _last_backup.row
+    except Exception as e:
+        logging.warning(f"No se pudo actualizar el catálogo: {str(e)}")
+    return None
+
+
+def record_operation(kind, database_name, started_at, duration, status, **fields):
+    """
+    Registra una operación en el catálogo para /metrics (ver metrics.py)
+    
+    Como el catálogo, un error aquí no debe hacer fallar la operación.
+    """
+    try:
+        catalog.record_operation(dict(
+            fields,
+            kind=kind,
+            database=database_name,
+            started_at=started_at.isoformat(),
+            duration_seconds=round(duration, 3),
+            status=status
+        ))
+    except Exception as e:
+        logging.warning(f"No se pudo registrar la métrica de {kind}: {str(e)}")
+
+
+def finish_upload(row, upload):
+    """
+    Completa la subida a S3 hecha mientras se escribía un backup de archivo
+    único, sube su .sha256 e índice y registra el resultado en el catálogo
+    
+    Un fallo de la subida no hace fallar el backup: upload_backups() lo
+    vuelve a subir desde el disco al final de la ejecución.
+    
+    Args:
+        row (dict): Fila del catálogo del backup (o None si no se pudo registrar)
+        upload (MultipartUpload): Subida del archivo de backup
+    """
+    error = upload.finish()
+    keys = [upload.key]
+    if error is None and row:
+        try:
+            for sidecar in sidecar_paths(BACKUP_DIR / row['filename']):
+                if sidecar.exists():
+                    storage.upload_file(sidecar, sidecar.name)
+                    keys.append(storage.key_for(sidecar.name))
+        except Exception as e:
+            error = e
+    
+    if error is None:
+        logging.info(f"  Subido a S3: {upload.key} ({upload.size / (1024 * 1024):.2f} MB)")
+    else:
+        logging.warning(f"  No se pudo subir a S3 {upload.key}: {str(error)}")
+    if not row:
+        return
+    try:
+        if error is None:
+            catalog.record_upload(row['filename'], row['database'], row['created_at'], keys, upload.size, 'uploaded')
+        else:
+            catalog.record_upload(row['filename'], row['database'], row['created_at'], [], 0, 'failed', str(error))
+    except Exception as e:
+        logging.warning(f"No se pudo actualizar el catálogo: {str(e)}")
+
+
+def upload_backups():
+    """
+    Sube a S3 los backups sin copia remota (por tablas, o cuya subida falló
+    durante el volcado) y aplica la retención remota
+    
+    Returns:
+        dict: uploaded, failed y expired, o None si no hay almacenamiento remoto
+    """
+    if storage is None:
+        return None
+    try:
+        uploaded, failed = sync_uploads(storage, catalog, BACKUP_DIR)
+        expired = apply_remote_retention(storage, catalog)
+    except Exception as e:
+        logging.error(f"✗ Error al sincronizar con S3: {str(e)}")
+        return {'uploaded': 0, 'failed': None, 'expired': 0, 'error': str(e)}
+    if uploaded or failed:
+        logging.info(f"Subidas a S3: {uploaded} correctas, {failed} fallidas")
+    return {'uploaded': uploaded, 'failed': failed, 'expired': expired}
+
+
+def archive_binlogs():
+    """
+    Archiva los binlogs del servidor desde el backup completo más antiguo
+    y elimina los que ya no necesita ningún backup completo
+    
+    Returns:
+        bool: True si el archivado fue exitoso, False en caso contrario
+    """
+    try:
+        with database_run_lock('_binlogs') as acquired:
+            if not acquired:
+                logging.info("Archivado de binlogs omitido: hay otro en curso")
+                return True
+            return _archive_binlogs()
+    except subprocess.CalledProcessError as e:
+        logging.error(f"✗ Error al archivar binlogs: {e.stderr}")
+        return False
+    except Exception as e:
+        logging.error(f"✗ Error inesperado al archivar binlogs: {str(e)}")
+        return False
+
+
+def _archive_binlogs():
+    """Archiva los binlogs desde el del backup completo más antiguo y poda los anteriores"""
+    archive = BinlogArchive(BACKUP_DIR)
+    start_from = catalog.oldest_binlog_file()
+    server_logs = [(row[0], int(row[1])) for row in run_query('SHOW BINARY LOGS')]
+    archived = archive.archive(connection_args(), server_logs, get_codec(COMPRESSION_CODEC), start_from)
+    logging.info(f"✓ Binlogs archivados: {len(archived)} ({', '.join(archived) or 'sin cambios'})")
+    if start_from:
+        pruned = archive.prune(start_from)
+        if pruned:
+            logging.info(f"Eliminados {pruned} binlogs anteriores al backup completo más antiguo")
+    return True
+
+
+def previous_status():
+    """
+    Contenido del archivo de estado anterior
+    
+    Returns:
+        dict: Estado guardado, o dict vacío si no hay registro
+    """
+    try:
+        with open(STATUS_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def previous_results():
+    """
+    Resultados por base de datos del archivo de estado anterior
+    
+    Returns:
+        list: Resultados guardados, o lista vacía si no hay registro
+    """
+    return previous_status().get('results', [])
+
+
+def previous_raw_bytes(database_name):
+    """
+    Bytes sin comprimir del último backup exitoso de una base de datos,
+    usados como estimación del total para calcular el ETA
+    
+    Returns:
+        int: Bytes del volcado anterior, o None si no hay registro
+    """
+    for result in previous_results():
+        if result.get('database') == database_name and result.get('status') == 'success':
+            return result.get('raw_bytes')
+    return None
+
+
+def database_sizes():
+    """
+    Bytes de datos (DATA_LENGTH) de cada base de datos del servidor
+    
+    Returns:
+        dict: {base de datos: bytes}
+    """
+    rows = run_query(
+        "SELECT TABLE_SCHEMA, IFNULL(SUM(DATA_LENGTH), 0) FROM information_schema.TABLES "
+        "WHERE TABLE_TYPE = 'BASE TABLE' GROUP BY TABLE_SCHEMA"
+    )
+    return {r[0]: int(r[1]) for r in rows}
+
+
+def discover_databases():
+    """
+    Bases de datos del servidor filtradas con DATABASE_INCLUDE / DATABASE_EXCLUDE
+    
+    Raises:
+        subprocess.CalledProcessError: Si la consulta falla
+    """
+    rows = run_query("SELECT SCHEMA_NAME FROM information_schema.SCHEMATA")
+    return backup_plan.select_databases(r[0] for r in rows)
+
+
+def configured_databases():
+    """
+    Bases de datos a respaldar: DATABASES, o las del servidor con DISCOVER_DATABASES
+    
+    Si el servidor no responde se usa DATABASES (el backup fallará igualmente
+    y quedará registrado).
+    """
+    if not backup_plan.DISCOVER_DATABASES:
+        return list(DATABASES)
+    try:
+        databases = discover_databases()
+    except (subprocess.CalledProcessError, OSError) as e:
+        logging.warning(f"No se pudieron descubrir las bases de datos, se usa DATABASES: {getattr(e, 'stderr', None) or str(e)}")
+        return list(DATABASES)
+    new = [db for db in databases if db not in DATABASES]
+    logging.info(f"Bases de datos descubiertas: {len(databases)}" + (f" (fuera de DATABASES: {', '.join(new)})" if new else ''))
+    return databases
+
+
+def plan_backups(databases, workers):
+    """
+    Ordena las bases de datos de mayor a menor duración estimada (ver backup_plan.py)
+    
+    Args:
+        databases (list): Bases de datos a respaldar
+        workers (int): Backups simultáneos
+        
+    Returns:
+        list: Las mismas bases de datos en el orden de lanzamiento
+    """
+    if backup_plan.BACKUP_ORDER != 'size' or len(databases) < 2:
+        return list(databases)
+    
+    try:
+        sizes = database_sizes()
+    except (subprocess.CalledProcessError, OSError) as e:
+        logging.warning(f"No se pudo consultar el tamaño de las bases de datos: {getattr(e, 'stderr', None) or str(e)}")
+        sizes = {}
+    durations = {}
+    for database in databases:
+        try:
+            operations = catalog.operations('backup', database, status='success', limit=backup_plan.PLAN_HISTORY_RUNS)
+        except Exception as e:
+            logging.warning(f"No se pudo leer el historial de {database}: {str(e)}")
+            continue
+        durations[database] = backup_plan.median_duration(operations)
+    
+    order, estimates = backup_plan.plan_order(databases, sizes, durations)
+    logging.info("Orden de los backups: " + ', '.join(
+        f"{db} (~{estimates[db]:.0f}s)" if estimates[db] is not None else db for db in order
+    ))
+    if all(estimates[db] is not None for db in order):
+        makespan = backup_plan.expected_makespan([estimates[db] for db in order], workers)
+        logging.info(f"Tiempo total estimado con {workers} simultáneos: {makespan:.0f}s")
+    return order
+
+
+def retry_delay(attempt):
+    """
+    Espera antes del siguiente intento: backoff exponencial con jitter
+    
+    Args:
+        attempt (int): Intento que acaba de fallar (1 = el primero)
         
-        for backup_file in BACKUP_DIR.glob('*.sql.gz'):
-            file_time = datetime.datetime.fromtimestamp(backup_file.stat().st_mtime)
-            if file_time < cutoff_date:
-                backup_file.unlink()
-                deleted_count += 1
-                logging.info(f"Eliminado backup antiguo: {backup_file.name}")
+    Returns:
+        float: Segundos a esperar, entre la mitad y el total del backoff
+    """
+    backoff = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (attempt - 1))
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def backup_attempt(database_name, attempt, run_deadline=None):
+    """
+    Un intento de backup de una base de datos, con su tiempo límite
+    
+    Args:
+        database_name (str): Nombre de la base de datos
+        attempt (int): Número de intento (1 = el primero)
+        run_deadline (float): Fin de la ejecución (time.monotonic()), si hay límite
         
-        for backup_file in BACKUP_DIR.glob('*.sql'):
-            file_time = datetime.datetime.fromtimestamp(backup_file.stat().st_mtime)
-            if file_time < cutoff_date:
-                backup_file.unlink()
-                deleted_count += 1
-                logging.info(f"Eliminado backup antiguo: {backup_file.name}")
+    Returns:
+        tuple: (registro del intento, ProgressTracker)
+    """
+    timeout = DATABASE_TIMEOUTS.get(database_name, DUMP_TIMEOUT)
+    started_at = datetime.datetime.now()
+    start = time.monotonic()
+    deadline = start + timeout if timeout else None
+    if run_deadline is not None:
+        deadline = min(deadline or run_deadline, run_deadline)
+    
+    _last_error.message = None
+    _last_backup.row = None
+    tracker = progress.start(database_name, 'dump', total_bytes=previous_raw_bytes(database_name))
+    success = create_backup(database_name, tracker, deadline)
+    tracker.finish('success' if success else 'failed')
+    
+    if success:
+        status = 'success'
+    elif deadline is not None and time.monotonic() >= deadline:
+        status = 'timeout'
+    else:
+        status = 'failed'
+    record = {
+        'attempt': attempt,
+        'status': status,
+        'started_at': started_at.isoformat(),
+        'finished_at': datetime.datetime.now().isoformat(),
+        'duration_seconds': round(time.monotonic() - start, 3),
+        'error': None if success else _last_error.message
+    }
+    row = _last_backup.row if success else None
+    record_operation(
+        'backup', database_name, started_at, record['duration_seconds'], status,
+        raw_bytes=tracker.bytes,
+        size=row['size'] if row else None,
+        attempt=attempt,
+        filename=row['filename'] if row else None
+    )
+    return record, tracker
+
+
+def run_database_backup(database_name, run_deadline=None):
+    """
+    Ejecuta el backup de una base de datos respetando su límite de concurrencia
+    y registra los tiempos de inicio y fin
+    
+    Si un intento falla o supera su tiempo límite (DUMP_TIMEOUT) se reintenta
+    hasta BACKUP_ATTEMPTS veces, esperando entre intentos y sin pasar de
+    `run_deadline`. Con RESUMABLE_DUMPS cada reintento continúa desde el
+    checkpoint del anterior.
+    
+    Si otra ejecución (de este u otro proceso) está respaldando la misma base
+    de datos, el backup se omite con estado 'skipped'.
+    
+    Args:
+        database_name (str): Nombre de la base de datos a respaldar
+        run_deadline (float): Fin de la ejecución (time.monotonic()), si hay límite
         
-        if deleted_count > 0:
-            logging.info(f"Total de backups antiguos eliminados: {deleted_count}")
+    Returns:
+        dict: Resultado con estado, inicio, fin, duración en segundos e intentos
+    """
+    with database_run_lock(database_name) as acquired:
+        if not acquired:
+            logging.warning(f"Backup de {database_name} omitido: hay otra ejecución en curso")
+            return {'database': database_name, 'status': 'skipped', 'started_at': datetime.datetime.now().isoformat()}
+        
+        started_at = datetime.datetime.now()
+        start = time.monotonic()
+        attempts = []
+        tracker = None
+        error = None
+        for attempt in range(1, BACKUP_ATTEMPTS + 1):
+            if run_deadline is not None and time.monotonic() >= run_deadline:
+                error = 'Tiempo máximo de la ejecución agotado'
+                logging.error(f"✗ {error}: no se respalda {database_name}")
+                break
             
-    except Exception as e:
-        logging.warning(f"Error al limpiar backups antiguos: {str(e)}")
+            # El semáforo y el cupo de volcados se liberan durante la espera
+            with get_database_semaphore(database_name), _dump_slots:
+                record, tracker = backup_attempt(database_name, attempt, run_deadline)
+            attempts.append(record)
+            error = record['error']
+            if record['status'] == 'success' or attempt == BACKUP_ATTEMPTS:
+                break
+            
+            delay = retry_delay(attempt)
+            if run_deadline is not None and time.monotonic() + delay >= run_deadline:
+                logging.error(f"✗ No queda tiempo en la ejecución para reintentar {database_name}")
+                break
+            logging.warning(f"Reintentando backup de {database_name} en {delay:.0f}s (intento {attempt + 1}/{BACKUP_ATTEMPTS})")
+            time.sleep(delay)
+        
+        success = bool(attempts) and attempts[-1]['status'] == 'success'
+        duration = time.monotonic() - start
+        finished_at = datetime.datetime.now()
+    
+    return {
+        'database': database_name,
+        'status': 'success' if success else 'failed',
+        'started_at': started_at.isoformat(),
+        'finished_at': finished_at.isoformat(),
+        'duration_seconds': round(duration, 3),
+        'raw_bytes': tracker.bytes if tracker else 0,
+        'rows': tracker.rows if tracker else 0,
+        'error': None if success else error,
+        'attempts': attempts
+    }
+
+
+def run_backups(databases, max_workers=None, run_deadline=None):
+    """
+    Respalda varias bases de datos usando un pool acotado de hilos
+    
+    Cada mysqldump corre en su propio proceso, por lo que los hilos solo
+    esperan la E/S y el tiempo total tiende al de la base de datos más lenta.
+    
+    Args:
+        databases (list): Bases de datos a respaldar
+        max_workers (int): Límite global de backups simultáneos
+        run_deadline (float): Fin de la ejecución (time.monotonic()), si hay límite
+        
+    Returns:
+        list: Resultados de run_database_backup() en el orden de `databases`
+    """
+    workers = max(1, min(max_workers or MAX_PARALLEL_DUMPS, len(databases) or 1))
+    
+    if workers == 1:
+        return [run_database_backup(database, run_deadline) for database in databases]
+    
+    logging.info(f"Ejecutando backups en paralelo ({workers} simultáneos)")
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup') as executor:
+        futures = {executor.submit(run_database_backup, db, run_deadline): db for db in databases}
+        for future in as_completed(futures):
+            database = futures[future]
+            try:
+                results[database] = future.result()
+            except Exception as e:
+                logging.error(f"✗ Error inesperado al respaldar {database}: {str(e)}")
+                results[database] = {'database': database, 'status': 'failed', 'error': str(e)}
+    
+    return [results[database] for database in databases]
+
+
+def update_status(results=(), run=None, maintenance=None):
+    """
+    Registra en STATUS_FILE los resultados de una ejecución para el monitor web
+    
+    Los resultados se combinan con los guardados (el scheduler respalda cada
+    base de datos por separado y varias ejecuciones pueden terminar a la vez)
+    y los totales se calculan sobre todos ellos, no solo sobre esta ejecución.
+    
+    Args:
+        results (list): Resultados de run_database_backup() de esta ejecución
+        run (dict): Datos de la ejecución (elapsed_seconds, deadline_reached...)
+        maintenance (dict): Resultado de run_maintenance()
+    """
+    with status_lock():
+        status = previous_status()
+        databases = [r['database'] for r in results]
+        merged = list(results) + [r for r in status.get('results', []) if r.get('database') not in databases]
+        success_count = sum(1 for r in merged if r.get('status') == 'success')
+        skipped_count = sum(1 for r in merged if r.get('status') == 'skipped')
+        failed_count = len(merged) - success_count - skipped_count
+        status.update({
+            'timestamp': datetime.datetime.now().isoformat(),
+            'success_count': success_count,
+            'failed_count': failed_count,
+            'skipped_count': skipped_count,
+            'total_databases': len(merged),
+            'status': 'success' if failed_count == 0 else 'error',
+            'databases': [r.get('database') for r in merged],
+            'discover_databases': backup_plan.DISCOVER_DATABASES,
+            'backup_order': backup_plan.BACKUP_ORDER,
+            'max_parallel_dumps': MAX_PARALLEL_DUMPS,
+            'backup_layout': BACKUP_LAYOUT,
+            'incremental_backups': INCREMENTAL_BACKUPS,
+            'backup_attempts': BACKUP_ATTEMPTS,
+            'run_deadline_seconds': RUN_DEADLINE or None,
+            'results': merged
+        })
+        status.update(run or {})
+        status.update(maintenance or {})
+        
+        try:
+            # Escritura atómica: el monitor web puede leerlo mientras tanto
+            tmp_path = STATUS_FILE.with_name(f"{STATUS_FILE.name}.{os.getpid()}.part")
+            with open(tmp_path, 'w') as f:
+                json.dump(status, f, indent=2)
+            os.replace(tmp_path, STATUS_FILE)
+        except Exception as e:
+            logging.warning(f"No se pudo guardar el archivo de estado: {str(e)}")
+
+
+def backup_databases(databases):
+    """
+    Respalda varias bases de datos (con RUN_DEADLINE) y registra sus resultados
+    
+    No aplica la retención, ni sincroniza con S3 ni archiva binlogs: eso lo
+    hace run_maintenance(), una vez por ejecución o por ciclo del scheduler.
+    
+    Args:
+        databases (list): Bases de datos a respaldar, en orden de lanzamiento
+        
+    Returns:
+        list: Resultados de run_database_backup()
+    """
+    run_start = time.monotonic()
+    run_deadline = run_start + RUN_DEADLINE if RUN_DEADLINE else None
+    
+    results = run_backups(databases, run_deadline=run_deadline)
+    
+    update_status(results, run={
+        'deadline_reached': run_deadline is not None and time.monotonic() >= run_deadline,
+        'elapsed_seconds': round(time.monotonic() - run_start, 3),
+        'sum_duration_seconds': round(sum(r.get('duration_seconds', 0) for r in results), 3)
+    })
+    return results
 
 
-def main():
+def run_maintenance():
+    """
+    Tareas posteriores a los backups: retención, sincronización con S3 y
+    archivado de binlogs (con INCREMENTAL_BACKUPS)
+    
+    Se ejecutan de una en una aunque terminen varias ejecuciones a la vez,
+    para no subir dos veces el mismo backup pendiente.
+    
+    Returns:
+        dict: retention, remote_uploads y binlogs_archived (también en STATUS_FILE)
+    """
+    with _maintenance_lock:
+        # Limpiar backups antiguos según la política de retención
+        retention = cleanup_old_backups()
+        
+        # Subir a S3 lo que no se subió durante el volcado y aplicar la retención remota
+        remote = upload_backups()
+        
+        # Archivar los binlogs hasta este momento (y podar los que ya no se necesitan)
+        binlogs_ok = archive_binlogs() if INCREMENTAL_BACKUPS else None
+    
+    maintenance = {'retention': retention, 'remote_uploads': remote, 'binlogs_archived': binlogs_ok}
+    update_status(maintenance=maintenance)
+    return maintenance
+
+
+def main(databases=None):
     """
     Función principal que ejecuta el proceso de backup
+    
+    Args:
+        databases (list): Bases de datos a respaldar (por defecto las de
+                          configured_databases(), de mayor a menor duración estimada),
+                          o ['--incremental'] para archivar solo los binlogs
     """
+    if databases and databases[0] == '--incremental':
+        logging.info("Archivando binlogs (backup incremental)...")
+        return 0 if archive_binlogs() else 1
+    
+    databases = plan_backups(databases or configured_databases(), MAX_PARALLEL_DUMPS)
+    
     logging.info("="*60)
     logging.info("INICIO DEL PROCESO DE BACKUP")
     logging.info("="*60)
     
-    success_count = 0
-    failed_count = 0
+    run_start = time.monotonic()
     
     # Realizar backup de cada base de datos
-    for database in DATABASES:
-        if create_backup(database):
-            success_count += 1
-        else:
-            failed_count += 1
+    results = backup_databases(databases)
     
-    # Limpiar backups antiguos
-    cleanup_old_backups()
+    elapsed = time.monotonic() - run_start
+    success_count = sum(1 for r in results if r['status'] == 'success')
+    skipped_count = sum(1 for r in results if r['status'] == 'skipped')
+    failed_count = len(results) - success_count - skipped_count
+    
+    # Retención, copia remota y binlogs
+    run_maintenance()
     
     # Resumen
     logging.info("="*60)
-    logging.info(f"RESUMEN: {success_count} exitosos, {failed_count} fallidos")
+    logging.info(f"RESUMEN: {success_count} exitosos, {failed_count} fallidos, {skipped_count} omitidos")
+    logging.info(f"Tiempo total: {elapsed:.1f}s")
+    retried = [r['database'] for r in results if len(r.get('attempts', [])) > 1]
+    if retried:
+        logging.info(f"Reintentados: {', '.join(retried)}")
     logging.info("="*60)
     
-    # Guardar estado en archivo JSON para monitoreo web
-    status_data = {
-        'timestamp': datetime.datetime.now().isoformat(),
-        'success_count': success_count,
-        'failed_count': failed_count,
-        'total_databases': len(DATABASES),
-        'status': 'success' if failed_count == 0 else 'error',
-        'databases': DATABASES
-    }
-    
-    try:
-        with open('backup_status.json', 'w') as f:
-            json.dump(status_data, f, indent=2)
-    except Exception as e:
-        logging.warning(f"No se pudo guardar el archivo de estado: {str(e)}")
-    
     # Retornar código de salida
     return 0 if failed_count == 0 else 1
 
 
 if __name__ == '__main__':
-    exit(main())
+    # Uso: python backup_mysql.py [base_de_datos ...]
+    #      python backup_mysql.py --incremental   (solo archivar binlogs)
+    exit(main(sys.argv[1:]))
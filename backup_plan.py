@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Descubrimiento de bases de datos y orden de los backups
+
+Con DISCOVER_DATABASES=true las bases de datos a respaldar se leen del
+servidor (information_schema.SCHEMATA) en cada ejecución en lugar de la
+lista DATABASES de backup_mysql.py, filtradas con DATABASE_INCLUDE y
+DATABASE_EXCLUDE (patrones tipo shell separados por comas).
+
+Los volcados en paralelo se lanzan de mayor a menor duración estimada
+(LPT, longest processing time first): si la base de datos más grande
+empieza la última, el total es su duración más la espera. La estimación
+es la mediana de los últimos backups exitosos (tabla operations del
+catálogo) y, para las bases de datos sin historial, su tamaño
+(information_schema.TABLES) al ritmo observado en las demás.
+"""
+
+import heapq
+import os
+import statistics
+from fnmatch import fnmatchcase
+
+# Leer las bases de datos del servidor en lugar de usar DATABASES
+DISCOVER_DATABASES = os.environ.get('DISCOVER_DATABASES', 'false').lower() in ('1', 'true', 'yes')
+
+# Patrones de las bases de datos descubiertas que se respaldan / se omiten
+DATABASE_INCLUDE = os.environ.get('DATABASE_INCLUDE', '*')
+DATABASE_EXCLUDE = os.environ.get('DATABASE_EXCLUDE', '')
+
+# Nunca se respaldan: esquemas del sistema y las bases de datos temporales
+# de las restauraciones con intercambio (ver shadow_restore.py)
+ALWAYS_EXCLUDED = ('information_schema', 'performance_schema', 'mysql', 'sys', '*__shadow', '*__previous')
+
+# Orden de los backups: 'size' (mayor duración estimada primero) o 'config'
+# (el de DATABASES o el de la línea de comandos)
+BACKUP_ORDER = os.environ.get('BACKUP_ORDER', 'size')
+
+# Backups exitosos recientes usados para estimar la duración de cada base de datos
+PLAN_HISTORY_RUNS = int(os.environ.get('PLAN_HISTORY_RUNS', '5'))
+
+
+def parse_patterns(value):
+    """Patrones de una lista separada por comas"""
+    return [pattern.strip() for pattern in value.split(',') if pattern.strip()]
+
+
+def select_databases(names, include=None, exclude=None):
+    """
+    Filtra las bases de datos descubiertas
+
+    Args:
+        names (iterable): Bases de datos del servidor
+        include (list): Patrones a respaldar (por defecto DATABASE_INCLUDE)
+        exclude (list): Patrones a omitir, además de ALWAYS_EXCLUDED (por defecto DATABASE_EXCLUDE)
+
+    Returns:
+        list: Bases de datos seleccionadas, ordenadas por nombre
+    """
+    include = parse_patterns(DATABASE_INCLUDE) if include is None else include
+    exclude = [*ALWAYS_EXCLUDED, *(parse_patterns(DATABASE_EXCLUDE) if exclude is None else exclude)]
+    return sorted(
+        name for name in set(names)
+        if any(fnmatchcase(name, p) for p in include) and not any(fnmatchcase(name, p) for p in exclude)
+    )
+
+
+def median_duration(operations):
+    """
+    Duración típica de los backups de una base de datos
+
+    Args:
+        operations (list): Operaciones exitosas del catálogo (con duration_seconds)
+
+    Returns:
+        float: Mediana de las duraciones, o None si no hay ninguna
+    """
+    durations = [op['duration_seconds'] for op in operations if op.get('duration_seconds')]
+    return statistics.median(durations) if durations else None
+
+
+def plan_order(databases, sizes, durations):
+    """
+    Ordena las bases de datos de mayor a menor duración estimada
+
+    Sin ninguna base de datos con historial y tamaño no hay ritmo con el que
+    convertir tamaños en segundos, así que se ordena por tamaño. Los empates
+    mantienen el orden recibido.
+
+    Args:
+        databases (list): Bases de datos a respaldar
+        sizes (dict): {base de datos: bytes de datos} de information_schema
+        durations (dict): {base de datos: segundos} de median_duration()
+
+    Returns:
+        tuple: (bases de datos ordenadas, {base de datos: segundos estimados o None})
+    """
+    known = [db for db in databases if durations.get(db) and sizes.get(db)]
+    known_seconds = sum(durations[db] for db in known)
+    rate = sum(sizes[db] for db in known) / known_seconds if known_seconds else None
+
+    estimates = {}
+    for db in databases:
+        if durations.get(db):
+            estimates[db] = durations[db]
+        elif rate and db in sizes:
+            estimates[db] = sizes[db] / rate
+        else:
+            estimates[db] = None
+
+    if rate is None and sizes:
+        order = sorted(databases, key=lambda db: sizes.get(db, 0), reverse=True)
+    else:
+        order = sorted(databases, key=lambda db: estimates[db] or 0, reverse=True)
+    return order, estimates
+
+
+def expected_makespan(seconds, workers):
+    """
+    Duración total de lanzar los backups en ese orden con `workers` simultáneos
+
+    Args:
+        seconds (list): Duraciones estimadas, en el orden de lanzamiento
+        workers (int): Backups simultáneos
+
+    Returns:
+        float: Segundos hasta que termina el último
+    """
+    finish = [0.0] * max(1, min(workers, len(seconds) or 1))
+    for duration in seconds:
+        heapq.heapreplace(finish, finish[0] + duration)
+    return max(finish)
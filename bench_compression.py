@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los codecs de compresión de backups
+
+Comprime un volcado de ejemplo con cada codec disponible y reporta la
+velocidad (MB/s de entrada) y el ratio de compresión.
+
+Uso:
+    python bench_compression.py                      # Volcado sintético de 64 MB
+    python bench_compression.py --sample dump.sql    # Volcado real
+    python bench_compression.py --size-mb 256 --threads 4 --codecs zstd pgzip
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from compression import CODECS
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def generate_sample(path, size_mb):
+    """
+    Genera un volcado SQL sintético con INSERTs de aspecto realista
+
+    Args:
+        path (Path): Archivo destino
+        size_mb (int): Tamaño aproximado en MB
+    """
+    rng = random.Random(42)
+    words = ['pago', 'gasto', 'usuario', 'cliente', 'pedido', 'factura', 'ruleta', 'envio', 'activo', 'pendiente']
+    target = size_mb * 1024 * 1024
+    written = 0
+    row_id = 0
+
+    with open(path, 'w', encoding='utf-8') as f:
+        header = "-- MySQL dump (sintético)\nCREATE TABLE `movimientos` (`id` int, `descripcion` varchar(255), `monto` decimal(10,2), `fecha` datetime);\n"
+        f.write(header)
+        written += len(header)
+        while written < target:
+            rows = []
+            for _ in range(500):
+                row_id += 1
+                descripcion = ' '.join(rng.choice(words) for _ in range(rng.randint(2, 6)))
+                rows.append(
+                    f"({row_id},'{descripcion}',{rng.uniform(1, 100000):.2f},"
+                    f"'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00')"
+                )
+            line = f"INSERT INTO `movimientos` VALUES {','.join(rows)};\n"
+            f.write(line)
+            written += len(line)
+        f.write("-- Dump completed\n")
+
+
+def bench_codec(codec, sample_path, output_dir, level, threads):
+    """
+    Comprime y descomprime el volcado con un codec
+
+    Returns:
+        dict: Tiempos, velocidades y ratio del codec
+    """
+    raw_bytes = sample_path.stat().st_size
+    output_path = output_dir / f"bench{codec.extension}"
+
+    start = time.perf_counter()
+    with open(sample_path, 'rb') as f_in, codec.open_writer(output_path, level, threads) as f_out:
+        while True:
+            chunk = f_in.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f_out.write(chunk)
+    compress_seconds = time.perf_counter() - start
+    compressed_bytes = output_path.stat().st_size
+
+    start = time.perf_counter()
+    with codec.open_reader(output_path) as f_in:
+        while f_in.read(CHUNK_SIZE):
+            pass
+    decompress_seconds = time.perf_counter() - start
+
+    output_path.unlink()
+    raw_mb = raw_bytes / (1024 * 1024)
+    return {
+        'codec': codec.name,
+        'level': level or codec.default_level,
+        'compress_mb_s': raw_mb / compress_seconds if compress_seconds else 0,
+        'decompress_mb_s': raw_mb / decompress_seconds if decompress_seconds else 0,
+        'ratio': raw_bytes / compressed_bytes if compressed_bytes else 0,
+        'compressed_mb': compressed_bytes / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de codecs de compresión')
+    parser.add_argument('--sample', type=Path, help='Volcado .sql a comprimir (por defecto uno sintético)')
+    parser.add_argument('--size-mb', type=int, default=64, help='Tamaño del volcado sintético en MB')
+    parser.add_argument('--codecs', nargs='+', default=list(CODECS), help='Codecs a medir')
+    parser.add_argument('--level', type=int, default=None, help='Nivel de compresión (por defecto el del codec)')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Hilos de compresión')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = Path(tmp)
+        sample_path = args.sample
+        if sample_path is None:
+            sample_path = output_dir / 'sample.sql'
+            print(f"Generando volcado sintético de {args.size_mb} MB...")
+            generate_sample(sample_path, args.size_mb)
+
+        raw_mb = sample_path.stat().st_size / (1024 * 1024)
+        print(f"Volcado: {sample_path.name} ({raw_mb:.1f} MB), hilos: {args.threads}")
+        print(f"{'codec':<8} {'nivel':>5} {'comp MB/s':>10} {'desc MB/s':>10} {'ratio':>7} {'tamaño MB':>10}")
+
+        for name in args.codecs:
+            codec = CODECS.get(name)
+            if codec is None or not codec.available():
+                print(f"{name:<8} (no disponible)")
+                continue
+            r = bench_codec(codec, sample_path, output_dir, args.level, args.threads)
+            print(f"{r['codec']:<8} {r['level']:>5} {r['compress_mb_s']:>10.1f} {r['decompress_mb_s']:>10.1f} "
+                  f"{r['ratio']:>7.2f} {r['compressed_mb']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
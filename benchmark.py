@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las rutas críticas: volcado, compresión, restauración y listado
+
+Genera un volcado sintético con el formato de mysqldump (varias tablas) y mide:
+- dump:    create_backup() con cada codec. Sin servidor, mysqldump se sustituye
+           por un proceso que emite el volcado sintético (se mide el pipe, la
+           compresión, el SHA-256 y el registro en el catálogo); con --mysql el
+           volcado se carga en la base de datos BENCH_DATABASE del servidor
+           configurado en backup_mysql.py y se respalda de verdad.
+- codecs:  compresión y descompresión de cada codec (ver bench_compression.py).
+- restore: restore_engine.restore() del backup y la restauración de una
+           sola tabla (seekable_archive.restore_tables()). Sin servidor, cada
+           conexión mysql es un proceso que descarta lo que recibe (se mide la
+           división, la descompresión y el reparto en paralelo).
+- listing: get_recent_backups() y get_backup_stats() con --listing-files
+           backups en el catálogo (por defecto 10000).
+
+Los resultados se guardan en JSON y se pueden comparar con los de otra versión:
+    python benchmark.py --output antes.json
+    python benchmark.py --output despues.json --compare antes.json
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bench_compression import bench_codec
+from compression import CODECS
+
+# Base de datos que se crea (y elimina) en el servidor con --mysql
+BENCH_DATABASE = 'bench_backup_manager'
+
+# Repeticiones de cada medición del listado (se reporta la mediana)
+LISTING_REPEAT = 5
+
+# Umbral por defecto para considerar una medición como regresión al comparar
+REGRESSION_THRESHOLD = 0.10
+
+# Diferencia mínima en segundos para contar como regresión (ruido de las mediciones de milisegundos)
+MIN_REGRESSION_SECONDS = 0.001
+
+WORDS = ['pago', 'gasto', 'usuario', 'cliente', 'pedido', 'factura', 'ruleta', 'envio', 'activo', 'pendiente']
+
+# Proceso que emite un archivo por stdout (sustituye a mysqldump sin servidor)
+CAT_SCRIPT = 'import shutil, sys; shutil.copyfileobj(open(sys.argv[1], "rb"), sys.stdout.buffer)'
+
+# Proceso que descarta stdin (sustituye a mysql sin servidor)
+SINK_SCRIPT = 'import sys\nwhile sys.stdin.buffer.read(1 << 20): pass'
+
+
+def generate_dump(path, size_mb, tables, seed=42):
+    """
+    Genera un volcado sintético con el formato de mysqldump
+
+    Las tablas tienen tamaños distintos (la primera es la más grande), como
+    suele pasar en las bases de datos reales.
+
+    Args:
+        path (Path): Archivo destino
+        size_mb (int): Tamaño aproximado en MB
+        tables (int): Número de tablas
+
+    Returns:
+        dict: Filas por tabla
+    """
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(tables)]
+    targets = [size_mb * 1024 * 1024 * w / sum(weights) for w in weights]
+    rows = {}
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("-- MySQL dump (sintético)\n--\n-- Host: benchmark    Database: bench\n\n")
+        for index, target in enumerate(targets):
+            table = f"tabla_{index:03d}"
+            f.write(f"--\n-- Table structure for table `{table}`\n--\n\n")
+            f.write(f"CREATE TABLE `{table}` (\n  `id` int NOT NULL,\n  `descripcion` varchar(255),\n"
+                    f"  `monto` decimal(12,2),\n  `fecha` datetime,\n  PRIMARY KEY (`id`)\n);\n\n")
+            f.write(f"--\n-- Dumping data for table `{table}`\n--\n\nLOCK TABLES `{table}` WRITE;\n")
+            written = row_id = 0
+            while written < target:
+                values = []
+                for _ in range(500):
+                    row_id += 1
+                    descripcion = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+                    values.append(
+                        f"({row_id},'{descripcion}',{rng.uniform(1, 100000):.2f},"
+                        f"'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00')"
+                    )
+                line = f"INSERT INTO `{table}` VALUES {','.join(values)};\n"
+                f.write(line)
+                written += len(line)
+            f.write("UNLOCK TABLES;\n\n")
+            rows[table] = row_id
+        f.write(f"-- Dump completed on {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+    return rows
+
+
+def timed(func, *args, **kwargs):
+    """Ejecuta `func` y devuelve (resultado, segundos)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def throughput(raw_bytes, seconds):
+    return round(raw_bytes / (1024 * 1024) / seconds, 2) if seconds else None
+
+
+def load_backup_module(work_dir):
+    """
+    Importa backup_mysql con el directorio de trabajo en `work_dir`, para que
+    sus backups, catálogo y logs queden dentro del benchmark
+    """
+    os.chdir(work_dir)
+    import backup_mysql
+    logging.getLogger().setLevel(logging.WARNING)
+    return backup_mysql
+
+
+def bench_dump(backup_mysql, sample_path, codecs, use_mysql):
+    """
+    Mide create_backup() con cada codec
+
+    Returns:
+        tuple: (resultados por codec, ruta del último backup creado)
+    """
+    raw_bytes = sample_path.stat().st_size
+    if use_mysql:
+        mysql = ['mysql', *backup_mysql.connection_args()]
+        subprocess.run(mysql + ['-e', f"DROP DATABASE IF EXISTS `{BENCH_DATABASE}`; CREATE DATABASE `{BENCH_DATABASE}`"],
+                       check=True, capture_output=True)
+        with open(sample_path, 'rb') as f:
+            _, load_seconds = timed(subprocess.run, mysql + [BENCH_DATABASE], stdin=f, check=True, capture_output=True)
+        print(f"  Volcado sintético cargado en {BENCH_DATABASE} en {load_seconds:.1f}s")
+    else:
+        backup_mysql.build_dump_command = lambda database_name: [sys.executable, '-c', CAT_SCRIPT, str(sample_path)]
+
+    results, last_backup = {}, None
+    for name in codecs:
+        backup_mysql.COMPRESSION_CODEC = name
+        success, seconds = timed(backup_mysql.create_backup, BENCH_DATABASE)
+        if not success:
+            results[name] = {'error': 'create_backup() falló (ver backup_mysql.log)'}
+            continue
+        row = backup_mysql.catalog.query(database=BENCH_DATABASE, limit=1)[0]
+        last_backup = backup_mysql.BACKUP_DIR.resolve() / row['filename']
+        results[name] = {
+            'seconds': round(seconds, 3),
+            'mb_s': throughput(row['raw_bytes'] or raw_bytes, seconds),
+            'ratio': round(row['raw_bytes'] / row['size'], 3) if row['raw_bytes'] and row['size'] else None
+        }
+        print(f"  dump {name:<6} {seconds:8.2f}s {results[name]['mb_s']:>8} MB/s")
+        # Cada backup del mismo segundo tendría el mismo nombre
+        time.sleep(max(0.0, 1.0 - (time.time() % 1)))
+    return results, last_backup
+
+
+def bench_codecs(sample_path, work_dir, codecs, threads):
+    """Velocidad y ratio de cada codec"""
+    results = {}
+    for name in codecs:
+        r = bench_codec(CODECS[name], sample_path, work_dir, None, threads)
+        results[name] = {
+            'compress_mb_s': round(r['compress_mb_s'], 2),
+            'decompress_mb_s': round(r['decompress_mb_s'], 2),
+            'ratio': round(r['ratio'], 3)
+        }
+        print(f"  codec {name:<6} {r['compress_mb_s']:8.1f} MB/s comp {r['decompress_mb_s']:8.1f} MB/s desc {r['ratio']:6.2f}x")
+    return results
+
+
+def bench_restore(backup_mysql, backup_path, raw_bytes, workers, use_mysql, table):
+    """Restauración en paralelo de un backup y de una sola de sus tablas"""
+    import restore_engine
+    import seekable_archive
+
+    if use_mysql:
+        target = f"{BENCH_DATABASE}_restore"
+        mysql = ['mysql', *backup_mysql.connection_args()]
+        subprocess.run(mysql + ['-e', f"DROP DATABASE IF EXISTS `{target}`; CREATE DATABASE `{target}`"],
+                       check=True, capture_output=True)
+        restore_cmd = mysql + [target]
+    else:
+        restore_cmd = [sys.executable, '-c', SINK_SCRIPT, 'bench']
+
+    stats, seconds = timed(restore_engine.restore, backup_path, restore_cmd, workers=workers)
+    table_stats, table_seconds = timed(seekable_archive.restore_tables, backup_path, [table], restore_cmd)
+    if use_mysql:
+        subprocess.run(['mysql', *backup_mysql.connection_args(), '-e',
+                        f"DROP DATABASE IF EXISTS `{target}`; DROP DATABASE IF EXISTS `{BENCH_DATABASE}`"],
+                       capture_output=True)
+    print(f"  restore ({workers} conexiones) {seconds:8.2f}s {throughput(raw_bytes, seconds):>8} MB/s")
+    print(f"  restore de la tabla {table} ({table_stats['method']}) {table_seconds:8.2f}s")
+    return {
+        'seconds': round(seconds, 3),
+        'mb_s': throughput(raw_bytes, seconds),
+        'tables': stats.get('tables'),
+        'workers': workers,
+        'single_table': {'seconds': round(table_seconds, 3), 'method': table_stats['method']}
+    }
+
+
+def create_listing_dir(directory, files, databases=8):
+    """
+    Crea `files` backups pequeños (uno por hora hacia atrás, repartidos entre
+    varias bases de datos) para medir el listado
+    """
+    payload = gzip.compress(b"-- MySQL dump\n-- Dump completed\n")
+    start = datetime(2025, 1, 1)
+    for i in range(files):
+        created = start - timedelta(hours=i)
+        database = f"db_{i % databases:02d}"
+        (directory / f"{database}_{created:%Y%m%d_%H%M%S}.sql.gz").write_bytes(payload)
+
+
+def median_seconds(func, repeat=LISTING_REPEAT):
+    return round(statistics.median(timed(func)[1] for _ in range(repeat)), 6)
+
+
+def bench_listing(work_dir, files):
+    """
+    Listado de backups con `files` archivos en el directorio
+
+    Usa get_recent_backups() y get_backup_stats() de web_monitor.py si se puede
+    importar (Flask instalado y /app escribible) y, si no, las consultas al
+    catálogo que hacen.
+    """
+    from catalog import Catalog, CATALOG_NAME
+
+    directory = work_dir / 'listing'
+    directory.mkdir()
+    create_listing_dir(directory, files)
+    catalog = Catalog(directory / CATALOG_NAME)
+    _, reconcile_seconds = timed(catalog.reconcile, directory)
+
+    try:
+        import web_monitor
+        web_monitor.catalog = catalog
+        web_monitor.BACKUP_DIR = directory
+        recent = web_monitor.get_recent_backups
+        stats = web_monitor.get_backup_stats
+        source = 'web_monitor'
+    except (ImportError, OSError):
+        recent = lambda limit=20, offset=0, database=None: catalog.query(database=database, limit=limit, offset=offset)
+        stats = lambda: (catalog.stats(), catalog.databases())
+        source = 'catalog'
+
+    results = {
+        'files': files,
+        'source': source,
+        'reconcile_seconds': round(reconcile_seconds, 3),
+        'recent_seconds': median_seconds(lambda: recent()),
+        'recent_deep_page_seconds': median_seconds(lambda: recent(limit=20, offset=files - 20)),
+        'recent_by_database_seconds': median_seconds(lambda: recent(database='db_03')),
+        'stats_seconds': median_seconds(lambda: stats())
+    }
+    print(f"  listing ({files} backups, {source}): reconcile {reconcile_seconds:.2f}s, "
+          f"recientes {results['recent_seconds'] * 1000:.2f} ms, estadísticas {results['stats_seconds'] * 1000:.2f} ms")
+    return results
+
+
+def flatten(results, prefix=''):
+    """Mediciones numéricas como {'dump.gzip.seconds': 1.2, ...}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, previous, threshold):
+    """
+    Compara dos resultados: sube `seconds` = peor, sube `mb_s` o `ratio` = mejor
+
+    Returns:
+        list: Mediciones que empeoraron más que `threshold`
+    """
+    now, before = flatten(current['results']), flatten(previous['results'])
+    regressions = []
+    print(f"\nComparación con {previous.get('version') or 'la versión anterior'} ({previous.get('created_at')}):")
+    changed = [k for k, v in current['params'].items() if k != 'raw_bytes' and previous.get('params', {}).get(k) != v]
+    if changed:
+        print(f"  Aviso: parámetros distintos ({', '.join(changed)}), las mediciones no son comparables")
+    for name in sorted(set(now) & set(before)):
+        if not before[name] or not (name.endswith('seconds') or name.endswith('mb_s') or name.endswith('ratio')):
+            continue
+        change = (now[name] - before[name]) / before[name]
+        if name.endswith('seconds'):
+            worse = change > threshold and now[name] - before[name] > MIN_REGRESSION_SECONDS
+        else:
+            worse = change < -threshold
+        mark = '✗' if worse else ' '
+        print(f" {mark} {name:<45} {before[name]:>12g} -> {now[name]:>12g} ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def git_version():
+    """Commit actual del repositorio (o None fuera de git)"""
+    try:
+        result = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de volcado, compresión, restauración y listado')
+    parser.add_argument('--size-mb', type=int, default=64, help='Tamaño del volcado sintético en MB')
+    parser.add_argument('--tables', type=int, default=8, help='Tablas del volcado sintético')
+    parser.add_argument('--codecs', nargs='+', default=[name for name, c in CODECS.items() if c.available()],
+                        help='Codecs a medir (por defecto los disponibles)')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Hilos de compresión')
+    parser.add_argument('--restore-workers', type=int, default=4, help='Conexiones de la restauración')
+    parser.add_argument('--listing-files', type=int, default=10000, help='Backups para medir el listado')
+    parser.add_argument('--only', nargs='+', choices=['dump', 'codecs', 'restore', 'listing'],
+                        default=['dump', 'codecs', 'restore', 'listing'], help='Pruebas a ejecutar')
+    parser.add_argument('--mysql', action='store_true',
+                        help=f'Usar el servidor de backup_mysql.py (crea y elimina {BENCH_DATABASE})')
+    parser.add_argument('--output', type=Path, help='Archivo JSON de resultados')
+    parser.add_argument('--compare', type=Path, help='Resultados JSON anteriores con los que comparar')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Empeoramiento que cuenta como regresión (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    unavailable = [name for name in args.codecs if name not in CODECS or not CODECS[name].available()]
+    if unavailable:
+        parser.error(f"Codecs no disponibles: {', '.join(unavailable)}")
+    output = args.output.resolve() if args.output else None
+    previous = json.loads(args.compare.read_text(encoding='utf-8')) if args.compare else None
+    cwd = os.getcwd()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench-') as tmp:
+        work_dir = Path(tmp)
+        try:
+            sample_path = work_dir / 'sample.sql'
+            print(f"Generando volcado sintético de {args.size_mb} MB en {args.tables} tablas...")
+            generate_dump(sample_path, args.size_mb, args.tables)
+            raw_bytes = sample_path.stat().st_size
+
+            backup_path = None
+            if 'dump' in args.only or 'restore' in args.only:
+                backup_mysql = load_backup_module(work_dir)
+                results['dump'], backup_path = bench_dump(
+                    backup_mysql, sample_path, args.codecs if 'dump' in args.only else args.codecs[:1], args.mysql
+                )
+            if 'codecs' in args.only:
+                results['codecs'] = bench_codecs(sample_path, work_dir, args.codecs, args.threads)
+            if 'restore' in args.only and backup_path is not None:
+                # La tabla más pequeña: su restauración no debería depender del tamaño del backup
+                results['restore'] = bench_restore(backup_mysql, backup_path, raw_bytes, args.restore_workers,
+                                                   args.mysql, f"tabla_{args.tables - 1:03d}")
+            if 'listing' in args.only:
+                results['listing'] = bench_listing(work_dir, args.listing_files)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'version': git_version(),
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {
+            'size_mb': args.size_mb,
+            'tables': args.tables,
+            'threads': args.threads,
+            'restore_workers': args.restore_workers,
+            'listing_files': args.listing_files,
+            'mysql': args.mysql,
+            'raw_bytes': raw_bytes
+        },
+        'results': results
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(f"\nResultados guardados en {output}")
+
+    if previous is not None:
+        regressions = compare(report, previous, args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} mediciones empeoraron más de un {args.threshold:.0%}")
+            return 1
+        print("\n✓ Sin regresiones")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
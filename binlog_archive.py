@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Backups incrementales a partir de los binary logs de MySQL
+
+- Cada backup completo se hace con `--source-data=2`, que escribe en la
+  cabecera del volcado (como comentario) el binlog y la posición exactos
+  de la instantánea.
+- Entre backups completos se archivan los binlogs del servidor con
+  `mysqlbinlog --read-from-remote-server --raw`, comprimidos, en
+  `backups/binlogs/` junto a un índice `index.json`.
+- Para recuperar hasta un instante se restaura un backup completo y luego se
+  reproducen los binlogs archivados desde su posición hasta ese instante.
+
+Requiere binlog activado en el servidor y un usuario con los privilegios
+RELOAD, REPLICATION CLIENT y REPLICATION SLAVE.
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from backup_layout import is_dedup_backup
+from compression import codec_for_path, get_codec
+from dedup_store import open_backup
+
+BINLOG_DIR_NAME = 'binlogs'
+INDEX_NAME = 'index.json'
+
+# Bytes del inicio de un volcado en los que buscar la posición del binlog
+HEADER_SCAN_BYTES = 64 * 1024
+
+# Comentario que escribe mysqldump con --source-data=2 (o --master-data=2)
+POSITION_PATTERN = re.compile(
+    rb"CHANGE (?:REPLICATION SOURCE|MASTER) TO (?:SOURCE|MASTER)_LOG_FILE='([^']+)', *(?:SOURCE|MASTER)_LOG_POS=(\d+)"
+)
+
+
+def read_binlog_position(backup_path):
+    """
+    Lee la posición del binlog registrada en la cabecera de un volcado
+
+    Args:
+        backup_path (Path): Backup de archivo único comprimido o deduplicado
+
+    Returns:
+        tuple: (archivo de binlog, posición) o None si el volcado no la tiene
+    """
+    if is_dedup_backup(backup_path):
+        opener = open_backup
+    else:
+        codec = codec_for_path(backup_path)
+        if codec is None:
+            return None
+        opener = codec.open_reader
+    with opener(backup_path) as reader:
+        head = reader.read(HEADER_SCAN_BYTES)
+    match = POSITION_PATTERN.search(head)
+    if match is None:
+        return None
+    return match.group(1).decode(), int(match.group(2))
+
+
+def binlog_sort_key(name):
+    """Orden de los binlogs por su sufijo numérico (binlog.000009 < binlog.000010)"""
+    base, _, number = name.rpartition('.')
+    return (base, int(number) if number.isdigit() else 0)
+
+
+class BinlogArchive:
+    """
+    Archivo local de binlogs
+
+    Args:
+        backup_dir (Path): Directorio de backups (los binlogs van en un subdirectorio)
+    """
+
+    def __init__(self, backup_dir):
+        self.dir = Path(backup_dir) / BINLOG_DIR_NAME
+        self.index_path = self.dir / INDEX_NAME
+
+    def load_index(self):
+        """
+        Índice de binlogs archivados
+
+        Returns:
+            dict: {nombre: {file, size, codec, complete, archived_at}}
+        """
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self, index):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.json.part')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def archive(self, connection_args, server_logs, codec, start_from=None):
+        """
+        Descarga y comprime los binlogs nuevos o incompletos
+
+        El binlog activo se descarga parcialmente y se vuelve a descargar en
+        la siguiente ejecución; los anteriores se marcan como completos.
+
+        Args:
+            connection_args (list): Argumentos de conexión (--host, --port...)
+            server_logs (list): Tuplas (nombre, tamaño) de SHOW BINARY LOGS
+            codec (Codec): Codec de compresión
+            start_from (str): Primer binlog a archivar si el índice está vacío
+
+        Returns:
+            list: Nombres de los binlogs archivados en esta ejecución
+        """
+        index = self.load_index()
+        if not server_logs:
+            return []
+        active = server_logs[-1][0]
+        if not index:
+            start_from = start_from or active
+        else:
+            start_from = min(index, key=binlog_sort_key)
+        suffix = codec.extension[len('.sql'):]
+        archived = []
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='binlog-', dir=self.dir) as tmp:
+            for name, size in server_logs:
+                if binlog_sort_key(name) < binlog_sort_key(start_from):
+                    continue
+                entry = index.get(name)
+                if entry and (entry['complete'] or entry['size'] == size):
+                    continue
+
+                cmd = [
+                    'mysqlbinlog', *connection_args,
+                    '--read-from-remote-server',
+                    '--raw',
+                    f'--result-file={tmp}/',
+                    name
+                ]
+                subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+                raw_path = Path(tmp) / name
+                target = self.dir / f"{name}{suffix}"
+                part = Path(str(target) + '.part')
+                with open(raw_path, 'rb') as f_in, codec.open_writer(part) as f_out:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+                os.replace(part, target)
+                raw_path.unlink()
+
+                index[name] = {
+                    'file': target.name,
+                    'size': size,
+                    'codec': codec.name,
+                    'complete': name != active,
+                    'archived_at': datetime.now().isoformat()
+                }
+                archived.append(name)
+
+        self.save_index(index)
+        return archived
+
+    def prune(self, keep_from):
+        """
+        Elimina los binlogs anteriores a `keep_from` (el del backup completo más antiguo)
+
+        Returns:
+            int: Binlogs eliminados
+        """
+        index = self.load_index()
+        removed = [name for name in index if binlog_sort_key(name) < binlog_sort_key(keep_from)]
+        for name in removed:
+            (self.dir / index.pop(name)['file']).unlink(missing_ok=True)
+        if removed:
+            self.save_index(index)
+        return len(removed)
+
+    def chain_from(self, start_file):
+        """
+        Binlogs archivados desde `start_file`, comprobando que no falte ninguno
+
+        Returns:
+            list: Entradas del índice en orden
+
+        Raises:
+            ValueError: Si `start_file` no está archivado o hay huecos en la secuencia
+        """
+        index = self.load_index()
+        if start_file not in index:
+            raise ValueError(f"El binlog {start_file} no está archivado")
+        names = sorted((n for n in index if binlog_sort_key(n) >= binlog_sort_key(start_file)), key=binlog_sort_key)
+        for previous, current in zip(names, names[1:]):
+            if binlog_sort_key(current)[1] != binlog_sort_key(previous)[1] + 1:
+                raise ValueError(f"Faltan binlogs entre {previous} y {current}")
+        return [dict(index[n], name=n) for n in names]
+
+    def replay(self, start_file, start_position, stop_datetime, source_db, target_db, mysql_cmd, timeout=None):
+        """
+        Reproduce los binlogs archivados sobre una base de datos ya restaurada
+
+        Args:
+            start_file (str): Binlog del backup completo
+            start_position (int): Posición del backup completo
+            stop_datetime (datetime): Instante hasta el que recuperar (exclusivo)
+            source_db (str): Base de datos original
+            target_db (str): Base de datos destino (se reescribe si es distinta)
+            mysql_cmd (list): Comando mysql que lee SQL por stdin
+            timeout (int): Segundos máximos (None = sin límite)
+
+        Returns:
+            int: Binlogs reproducidos
+        """
+        chain = self.chain_from(start_file)
+        with tempfile.TemporaryDirectory(prefix='replay-', dir=self.dir) as tmp:
+            paths = []
+            for entry in chain:
+                # mysqlbinlog necesita los archivos sin comprimir
+                path = Path(tmp) / entry['name']
+                with get_codec(entry['codec']).open_reader(self.dir / entry['file']) as f_in, open(path, 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+                paths.append(str(path))
+
+            cmd = [
+                'mysqlbinlog',
+                f'--start-position={start_position}',
+                f"--stop-datetime={stop_datetime.strftime('%Y-%m-%d %H:%M:%S')}",
+            ]
+            if target_db != source_db:
+                cmd.append(f'--rewrite-db={source_db}->{target_db}')
+            cmd += [f'--database={target_db}', *paths]
+
+            # stderr a un archivo temporal: un pipe sin leer bloquearía mysqlbinlog
+            with tempfile.TemporaryFile() as stderr_file:
+                binlog_process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+                try:
+                    result = subprocess.run(mysql_cmd, stdin=binlog_process.stdout, capture_output=True, text=True, timeout=timeout)
+                except BaseException:
+                    binlog_process.kill()
+                    raise
+                finally:
+                    binlog_process.stdout.close()
+                    binlog_process.wait()
+
+                if binlog_process.returncode != 0:
+                    stderr_file.seek(0)
+                    binlog_stderr = stderr_file.read().decode('utf-8', errors='replace')
+                    raise RuntimeError(f"mysqlbinlog falló: {binlog_stderr}")
+            if result.returncode != 0:
+                raise RuntimeError(f"Error al reproducir binlogs: {result.stderr}")
+        return len(chain)
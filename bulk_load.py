@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Carga masiva de datos: formato TSV y LOAD DATA
+
+Con BACKUP_LAYOUT=tab los backups por tablas guardan los datos de cada tabla
+como texto separado por tabuladores (`data/<tabla>.tsv.gz`, el formato por
+defecto de LOAD DATA y de `mysqldump --tab`) en lugar de sentencias INSERT.
+`mysqldump --tab` escribe los archivos en el servidor de MySQL, así que aquí
+se convierte la salida normal de mysqldump mientras se vuelca (TsvWriter).
+
+Al restaurar (restore_engine.py), cada tabla se carga con
+`LOAD DATA LOCAL INFILE` en una sesión sin comprobaciones de claves únicas
+ni foráneas, y los índices secundarios se crean después de los datos, en
+una sola pasada por tabla (defer_indexes()). Si el servidor no permite
+LOAD DATA LOCAL (`local_infile=OFF`), los datos se envían como INSERT
+generados a partir del TSV.
+"""
+
+import os
+import re
+import subprocess
+
+# Valor de 'format' en las tablas del manifest cuyos datos están en TSV
+TSV_FORMAT = 'tsv'
+
+# Usar LOAD DATA LOCAL si el servidor lo permite (si no, INSERT)
+RESTORE_LOAD_DATA = os.environ.get('RESTORE_LOAD_DATA', 'true').lower() in ('1', 'true', 'yes')
+
+# Crear los índices secundarios después de cargar los datos
+RESTORE_DEFER_INDEXES = os.environ.get('RESTORE_DEFER_INDEXES', 'true').lower() in ('1', 'true', 'yes')
+
+# No escribir la carga en el binlog del servidor destino (requiere privilegios
+# y las réplicas del destino no reciben los datos)
+RESTORE_SKIP_BINLOG = os.environ.get('RESTORE_SKIP_BINLOG', 'false').lower() in ('1', 'true', 'yes')
+
+# Tamaño de las sentencias INSERT generadas cuando no se puede usar LOAD DATA
+INSERT_BATCH_BYTES = 1024 * 1024
+
+# INSERT de mysqldump (con lista de columnas si la tabla tiene columnas generadas)
+INSERT_LINE = re.compile(rb'^INSERT INTO `((?:[^`]|``)+)`(?: \(((?:`(?:[^`]|``)+`,?)+)\))? VALUES \(')
+IDENTIFIER = re.compile(rb'`((?:[^`]|``)+)`')
+# Valores de un INSERT: cadenas, separadores de filas y de columnas, NULL y
+# los literales que LOAD DATA no entiende (hexadecimales y de bits)
+VALUE_TOKEN = re.compile(rb"'((?:[^'\\]|\\.)*)'|\),\(|,|NULL|_binary |[bBxX]'|0x", re.DOTALL)
+
+# Definiciones de CREATE TABLE en el esquema de mysqldump
+CREATE_TABLE_LINE = re.compile(rb'^CREATE TABLE `((?:[^`]|``)+)` \($')
+KEY_LINE = re.compile(rb'^  KEY `(?:[^`]|``)+` \((.*)\)')
+FOREIGN_KEY_LINE = re.compile(rb'FOREIGN KEY \(([^)]*)\) REFERENCES `((?:[^`]|``)+)` \(([^)]*)\)')
+
+
+class UnsupportedValue(ValueError):
+    """El volcado de la tabla tiene valores que no se pueden pasar a TSV"""
+
+
+def _name(raw):
+    return raw.replace(b'``', b'`').decode('utf-8')
+
+
+def _quote(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _columns(raw):
+    return [_name(column) for column in IDENTIFIER.findall(raw)]
+
+
+def tsv_extension(codec):
+    """Extensión de los datos en TSV con un codec (`.tsv.gz`, `.tsv.zst`...)"""
+    return '.tsv' + codec.extension[len('.sql'):]
+
+
+def _convert_token(match):
+    if match.group(1) is not None:
+        # Las secuencias de escape de mysqldump valen para LOAD DATA; solo el
+        # tabulador, que mysqldump no escapa, separaría columnas
+        return match.group(1).replace(b'\t', b'\\t')
+    token = match.group(0)
+    if token == b'),(':
+        return b'\n'
+    if token == b',':
+        return b'\t'
+    if token == b'NULL':
+        return b'\\N'
+    if token == b'_binary ':
+        return b''
+    raise UnsupportedValue(f"Literal no soportado en TSV: {token.decode('ascii')}")
+
+
+class TsvWriter:
+    """
+    Convierte la salida de mysqldump de una tabla en TSV y la escribe en `target`
+
+    Solo se conservan las filas de los INSERT; la sesión de la carga fija el
+    resto (juego de caracteres, zona horaria UTC y sql_mode de mysqldump).
+
+    Args:
+        target: Destino con write() (p.ej. el archivo comprimido)
+        digest (hashlib hash): Si se indica, se actualiza con el TSV escrito
+
+    Raises:
+        UnsupportedValue: Si hay literales hexadecimales o de bits
+    """
+
+    def __init__(self, target, digest=None):
+        self.target = target
+        self.digest = digest
+        self.bytes = 0
+        self.columns = None
+        self._pending = b''
+
+    def write(self, chunk):
+        lines = (self._pending + chunk).split(b'\n')
+        self._pending = lines.pop()
+        for line in lines:
+            self._convert(line)
+
+    def finish(self):
+        """Convierte la última línea pendiente (llamar antes de cerrar `target`)"""
+        if self._pending:
+            self._convert(self._pending)
+            self._pending = b''
+
+    def _convert(self, line):
+        match = INSERT_LINE.match(line)
+        if match is None:
+            return
+        if not line.endswith(b');'):
+            raise UnsupportedValue("INSERT sin terminar en el volcado")
+        if match.group(2):
+            self.columns = _columns(match.group(2))
+        data = VALUE_TOKEN.sub(_convert_token, line[match.end():-2]) + b'\n'
+        self.target.write(data)
+        self.bytes += len(data)
+        if self.digest is not None:
+            self.digest.update(data)
+
+
+def session_sql():
+    """Ajustes de la sesión de carga (los de la cabecera de mysqldump, sin comprobaciones)"""
+    settings = [
+        "NAMES utf8mb4",
+        "SESSION time_zone = '+00:00'",
+        "SESSION sql_mode = 'NO_AUTO_VALUE_ON_ZERO'",
+        "SESSION unique_checks = 0",
+        "SESSION foreign_key_checks = 0",
+    ]
+    if RESTORE_SKIP_BINLOG:
+        settings.append("SESSION sql_log_bin = 0")
+    return 'SET ' + ', '.join(settings) + ';'
+
+
+def load_data_sql(table, columns=None):
+    """LOAD DATA del TSV de una tabla leído del stdin del cliente mysql"""
+    column_list = f" ({', '.join(_quote(c) for c in columns)})" if columns else ''
+    return (f"{session_sql()} LOAD DATA LOCAL INFILE '/dev/stdin' INTO TABLE {_quote(table)} "
+            f"CHARACTER SET utf8mb4{column_list};")
+
+
+def load_data_command(restore_cmd, table, columns=None):
+    """Comando mysql que carga con LOAD DATA el TSV recibido por stdin"""
+    return [*restore_cmd[:-1], '--local-infile=1', '-e', load_data_sql(table, columns), restore_cmd[-1]]
+
+
+def local_infile_enabled(restore_cmd):
+    """Indica si el servidor de `restore_cmd` permite LOAD DATA LOCAL"""
+    cmd = [*restore_cmd[:-1], '--batch', '--skip-column-names', '-e', 'SELECT @@GLOBAL.local_infile']
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0 and result.stdout.strip() == '1'
+
+
+def insert_chunks(reader, table, columns=None):
+    """
+    SQL con los datos de un TSV como INSERT extendidos (sin LOAD DATA)
+
+    Cada campo del TSV es un literal de cadena válido (las secuencias de
+    escape son las de MySQL) y MySQL convierte las cadenas al tipo de la columna.
+
+    Args:
+        reader: Flujo TSV sin comprimir con read()
+        table (str): Tabla destino
+        columns (list): Columnas de los datos (None = todas)
+
+    Yields:
+        bytes: Sentencias SQL
+    """
+    column_list = f" ({','.join(_quote(c) for c in columns)})" if columns else ''
+    prefix = f"INSERT INTO {_quote(table)}{column_list} VALUES ".encode('utf-8')
+    yield session_sql().encode('utf-8') + b'\n'
+
+    rows, size, pending = [], 0, b''
+    while True:
+        chunk = reader.read(INSERT_BATCH_BYTES)
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop() if chunk else b''
+        for line in lines:
+            if not line:
+                continue
+            row = b"(" + b','.join(b'NULL' if f == b'\\N' else b"'" + f + b"'" for f in line.split(b'\t')) + b")"
+            rows.append(row)
+            size += len(row)
+            if size >= INSERT_BATCH_BYTES:
+                yield prefix + b','.join(rows) + b';\n'
+                rows, size = [], 0
+        if not chunk:
+            break
+    if rows:
+        yield prefix + b','.join(rows) + b';\n'
+
+
+def defer_indexes(schema_sql, tables):
+    """
+    Quita los índices secundarios de las tablas del esquema para crearlos tras los datos
+
+    Se mantienen la clave primaria, los índices únicos, FULLTEXT y SPATIAL y
+    los índices que necesita una clave foránea (de la tabla o de las que la
+    referencian).
+
+    Args:
+        schema_sql (bytes): Esquema de mysqldump (CREATE TABLE)
+        tables (iterable): Tablas que se cargan en bloque
+
+    Returns:
+        tuple: (esquema sin esos índices, {tabla: [definiciones KEY ...]})
+    """
+    lines = schema_sql.split(b'\n')
+    tables = set(tables)
+
+    # Columnas que deben seguir indexadas por las claves foráneas
+    required = {}
+    table = None
+    for line in lines:
+        match = CREATE_TABLE_LINE.match(line)
+        if match:
+            table = _name(match.group(1))
+        elif line.startswith(b')'):
+            table = None
+        elif table is not None:
+            fk = FOREIGN_KEY_LINE.search(line)
+            if fk:
+                required.setdefault(table, []).append(_columns(fk.group(1)))
+                required.setdefault(_name(fk.group(2)), []).append(_columns(fk.group(3)))
+
+    output, deferred = [], {}
+    table, definitions = None, []
+    for line in lines:
+        match = CREATE_TABLE_LINE.match(line)
+        if match and _name(match.group(1)) in tables:
+            table, definitions = _name(match.group(1)), []
+            output.append(line)
+        elif table is not None and line.startswith(b')'):
+            output.append(b',\n'.join(definitions))
+            output.append(line)
+            table = None
+        elif table is not None:
+            definition = line.rstrip(b',')
+            key = KEY_LINE.match(definition)
+            if key:
+                columns = _columns(key.group(1))
+                if not any(columns[:len(needed)] == needed for needed in required.get(table, [])):
+                    deferred.setdefault(table, []).append(definition.strip().decode('utf-8'))
+                    continue
+            definitions.append(definition)
+        else:
+            output.append(line)
+    return b'\n'.join(output), deferred
+
+
+def add_indexes_sql(table, definitions):
+    """ALTER TABLE que crea los índices aplazados de una tabla en una sola pasada"""
+    return f"ALTER TABLE {_quote(table)} " + ', '.join(f"ADD {d}" for d in definitions) + ';\n'
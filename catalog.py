@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+Catálogo SQLite de los backups
+
+Evita recorrer y hacer stat de todo el directorio de backups en cada
+petición del monitor web. backup_mysql.py registra cada backup creado o
+eliminado y el monitor web solo consulta el catálogo.
+
+Si el catálogo se desincroniza (archivos copiados o borrados a mano) se
+puede reconstruir desde el disco:
+    python catalog.py reconcile [directorio_de_backups]
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from binlog_archive import read_binlog_position
+from backup_layout import (
+    backup_size, is_chunked_backup, is_dedup_backup, list_backups, parse_backup_name, read_checksum, read_manifest
+)
+from compression import codec_for_path
+from dedup_store import read_dedup_manifest
+
+CATALOG_NAME = 'catalog.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    filename TEXT PRIMARY KEY,
+    database TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    raw_bytes INTEGER,
+    layout TEXT NOT NULL,
+    codec TEXT,
+    binlog_file TEXT,
+    binlog_pos INTEGER,
+    sha256 TEXT,
+    complete INTEGER,
+    verified_at TEXT,
+    verify_status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_backups_created ON backups (created_at);
+CREATE INDEX IF NOT EXISTS idx_backups_database_created ON backups (database, created_at);
+CREATE TABLE IF NOT EXISTS drills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    database TEXT NOT NULL,
+    target TEXT,
+    started_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    restore_seconds REAL,
+    raw_bytes INTEGER,
+    throughput_mb_s REAL,
+    tables INTEGER,
+    rows INTEGER,
+    regression INTEGER,
+    mismatches TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_drills_database_started ON drills (database, started_at);
+CREATE TABLE IF NOT EXISTS uploads (
+    filename TEXT PRIMARY KEY,
+    database TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    keys TEXT NOT NULL,
+    size INTEGER,
+    status TEXT NOT NULL,
+    uploaded_at TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_status_created ON uploads (status, created_at);
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    database TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    duration_seconds REAL,
+    status TEXT NOT NULL,
+    raw_bytes INTEGER,
+    size INTEGER,
+    attempt INTEGER,
+    filename TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_operations_kind_database ON operations (kind, database, started_at);
+"""
+
+DRILL_COLUMNS = (
+    'filename', 'database', 'target', 'started_at', 'status', 'restore_seconds', 'raw_bytes',
+    'throughput_mb_s', 'tables', 'rows', 'regression', 'mismatches', 'error'
+)
+
+UPLOAD_COLUMNS = ('filename', 'database', 'created_at', 'keys', 'size', 'status', 'uploaded_at', 'error')
+
+OPERATION_COLUMNS = (
+    'kind', 'database', 'started_at', 'duration_seconds', 'status', 'raw_bytes', 'size', 'attempt', 'filename'
+)
+
+COLUMNS = (
+    'filename', 'database', 'created_at', 'mtime', 'size', 'raw_bytes', 'layout', 'codec',
+    'binlog_file', 'binlog_pos', 'sha256', 'complete', 'verified_at', 'verify_status'
+)
+
+# Columnas agregadas después de la primera versión del esquema
+MIGRATIONS = {
+    'binlog_file': 'ALTER TABLE backups ADD COLUMN binlog_file TEXT',
+    'binlog_pos': 'ALTER TABLE backups ADD COLUMN binlog_pos INTEGER',
+    'sha256': 'ALTER TABLE backups ADD COLUMN sha256 TEXT',
+    'complete': 'ALTER TABLE backups ADD COLUMN complete INTEGER',
+    'verified_at': 'ALTER TABLE backups ADD COLUMN verified_at TEXT',
+    'verify_status': 'ALTER TABLE backups ADD COLUMN verify_status TEXT',
+}
+
+
+def describe_backup(path, raw_bytes=None, codec=None, sha256=None, complete=None):
+    """
+    Metadatos de un backup en disco para el catálogo
+
+    Args:
+        path (Path): Archivo o directorio de backup
+        raw_bytes (int): Bytes sin comprimir, si se conocen
+        codec (str): Codec usado, si se conoce
+        sha256 (str): SHA-256 del volcado sin comprimir, si se conoce
+        complete (bool): Si el volcado terminó con "-- Dump completed", si se sabe
+
+    Returns:
+        dict: Fila del catálogo
+    """
+    path = Path(path)
+    mtime = path.stat().st_mtime
+    database, created = parse_backup_name(path.name)
+    layout = 'tables' if path.is_dir() else 'dedup' if is_dedup_backup(path) else 'single'
+    if layout == 'dedup':
+        manifest = read_dedup_manifest(path)
+        raw_bytes = raw_bytes if raw_bytes is not None else manifest.get('raw_bytes')
+        codec = codec or manifest.get('codec')
+        sha256 = sha256 or manifest.get('sha256')
+    elif layout == 'tables' and (raw_bytes is None or codec is None):
+        manifest = read_manifest(path) if is_chunked_backup(path) else {}
+        raw_bytes = raw_bytes if raw_bytes is not None else manifest.get('raw_bytes')
+        codec = codec or manifest.get('codec')
+    else:
+        if codec is None:
+            file_codec = codec_for_path(path)
+            codec = file_codec.name if file_codec else None
+        sha256 = sha256 or read_checksum(path)
+    # Posición del binlog de los volcados hechos con --source-data (backups incrementales)
+    position = read_binlog_position(path) if layout != 'tables' else None
+    return {
+        'filename': path.name,
+        'database': database,
+        'created_at': (created or datetime.fromtimestamp(mtime)).isoformat(),
+        'mtime': mtime,
+        'size': backup_size(path),
+        'raw_bytes': raw_bytes,
+        'layout': layout,
+        'codec': codec,
+        'binlog_file': position[0] if position else None,
+        'binlog_pos': position[1] if position else None,
+        'sha256': sha256,
+        'complete': None if complete is None else int(complete),
+        'verified_at': None,
+        'verify_status': None
+    }
+
+
+class Catalog:
+    """
+    Índice de backups en SQLite
+
+    Args:
+        path (Path): Archivo de la base de datos SQLite
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(backups)")}
+            for column, sql in MIGRATIONS.items():
+                if column not in existing:
+                    conn.execute(sql)
+
+    def _connect(self):
+        # Una conexión por hilo; WAL permite leer mientras otro proceso escribe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, path, raw_bytes=None, codec=None, sha256=None, complete=None):
+        """Registra (o actualiza) un backup existente en disco"""
+        row = describe_backup(path, raw_bytes, codec, sha256, complete)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO backups ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                [row[c] for c in COLUMNS]
+            )
+        return row
+
+    def get(self, filename):
+        """Fila de un backup, o None si no está en el catálogo"""
+        row = self._connect().execute("SELECT * FROM backups WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def oldest_binlog_file(self):
+        """Binlog del backup completo más antiguo con posición registrada (o None)"""
+        row = self._connect().execute(
+            "SELECT binlog_file FROM backups WHERE binlog_file IS NOT NULL ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_verification(self, filename, status, verified_at):
+        """Guarda el resultado de la última verificación de un backup"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE backups SET verify_status = ?, verified_at = ? WHERE filename = ?",
+                (status, verified_at, filename)
+            )
+
+    def remove(self, filename):
+        """Elimina un backup del catálogo"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM backups WHERE filename = ?", (filename,))
+
+    def remove_many(self, filenames):
+        """Elimina varios backups del catálogo en una transacción"""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM backups WHERE filename = ?", [(name,) for name in filenames])
+
+    def record_drill(self, drill):
+        """Guarda el resultado de un simulacro de restauración (ver restore_drill.py)"""
+        row = dict(drill, mismatches=json.dumps(drill.get('mismatches') or []))
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO drills ({', '.join(DRILL_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in DRILL_COLUMNS)})",
+                [row.get(c) for c in DRILL_COLUMNS]
+            )
+
+    def drills(self, database=None, status=None, limit=50):
+        """
+        Simulacros de restauración, más recientes primero
+
+        Args:
+            database (str): Filtrar por base de datos
+            status (str): Filtrar por estado ('ok', 'mismatch', 'failed')
+            limit (int): Máximo de filas
+
+        Returns:
+            list: dicts con las columnas de la tabla drills
+        """
+        clauses, params = [], []
+        if database:
+            clauses.append("database = ?")
+            params.append(database)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT * FROM drills{where} ORDER BY started_at DESC, id DESC LIMIT ?", params + [limit]
+        )
+        return [dict(row, mismatches=json.loads(row['mismatches'] or '[]')) for row in rows]
+
+    def record_operation(self, operation):
+        """
+        Guarda la duración y el resultado de una operación para las métricas (ver metrics.py)
+
+        Args:
+            operation (dict): kind ('backup', 'compress', 'restore'), database,
+                              started_at, duration_seconds, status y, si se
+                              conocen, raw_bytes, size, attempt y filename
+        """
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO operations ({', '.join(OPERATION_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in OPERATION_COLUMNS)})",
+                [operation.get(c) for c in OPERATION_COLUMNS]
+            )
+
+    def operations(self, kind, database=None, status=None, limit=None):
+        """
+        Operaciones registradas, más recientes primero
+
+        Returns:
+            list: dicts con las columnas de la tabla operations
+        """
+        clauses, params = ["kind = ?"], [kind]
+        if database:
+            clauses.append("database = ?")
+            params.append(database)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        sql = f"SELECT * FROM operations WHERE {' AND '.join(clauses)} ORDER BY started_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def record_upload(self, filename, database, created_at, keys, size, status, error=None):
+        """
+        Guarda el estado de la copia remota de un backup (ver object_storage.py)
+
+        Args:
+            filename (str): Backup local
+            keys (list): Claves de los objetos subidos
+            size (int): Bytes subidos
+            status (str): 'uploaded' o 'failed'
+            error (str): Motivo del fallo
+        """
+        uploaded_at = datetime.now().isoformat() if status == 'uploaded' else None
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO uploads ({', '.join(UPLOAD_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in UPLOAD_COLUMNS)})",
+                (filename, database, created_at, json.dumps(keys), size, status, uploaded_at, error)
+            )
+
+    def upload(self, filename):
+        """Estado de la copia remota de un backup, o None si no se ha subido"""
+        row = self._connect().execute("SELECT * FROM uploads WHERE filename = ?", (filename,)).fetchone()
+        return dict(row, keys=json.loads(row['keys'])) if row else None
+
+    def uploads(self, status=None, before=None):
+        """
+        Copias remotas, más antiguas primero
+
+        Las filas se conservan aunque el backup local se elimine: cada copia
+        tiene su propia retención.
+
+        Args:
+            status (str): Filtrar por estado ('uploaded', 'failed')
+            before (str): Fecha ISO máxima de creación del backup (exclusiva)
+
+        Returns:
+            list: dicts con las columnas de la tabla uploads
+        """
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if before:
+            clauses.append("created_at < ?")
+            params.append(before)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        rows = self._connect().execute(f"SELECT * FROM uploads{where} ORDER BY created_at, filename", params)
+        return [dict(row, keys=json.loads(row['keys'])) for row in rows]
+
+    def pending_uploads(self, since=None):
+        """
+        Backups locales sin copia remota o cuya subida falló, más antiguos primero
+
+        Args:
+            since (str): Fecha ISO mínima de creación (inclusive)
+        """
+        rows = self._connect().execute(
+            "SELECT b.* FROM backups b LEFT JOIN uploads u ON u.filename = b.filename "
+            "WHERE (u.filename IS NULL OR u.status != 'uploaded') AND b.created_at >= ? "
+            "ORDER BY b.created_at, b.filename",
+            (since or '',)
+        )
+        return [dict(row) for row in rows]
+
+    def remove_upload(self, filename):
+        """Elimina el registro de una copia remota"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM uploads WHERE filename = ?", (filename,))
+
+    def _where(self, database=None, since=None, until=None, before=None):
+        clauses, params = [], []
+        if database:
+            clauses.append("database = ?")
+            params.append(database)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at <= ?")
+            params.append(until)
+        if before:
+            clauses.append("created_at < ?")
+            params.append(before)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, database=None, since=None, until=None, before=None, limit=20, offset=0, uploads=False):
+        """
+        Backups más recientes primero
+
+        Args:
+            database (str): Filtrar por base de datos
+            since (str): Fecha ISO mínima (inclusive)
+            until (str): Fecha ISO máxima (inclusive)
+            before (str): Fecha ISO máxima (exclusiva)
+            limit (int): Máximo de filas (None = todas)
+            offset (int): Filas a saltar
+            uploads (bool): Añadir remote_status y uploaded_at de la copia remota
+                            (en la misma consulta)
+
+        Returns:
+            list: dicts con las columnas del catálogo
+        """
+        where, params = self._where(database, since, until, before)
+        sql = f"SELECT * FROM backups{where} ORDER BY created_at DESC, filename DESC"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        if uploads:
+            sql = (
+                f"SELECT b.*, u.status AS remote_status, u.uploaded_at FROM ({sql}) b "
+                "LEFT JOIN uploads u ON u.filename = b.filename ORDER BY b.created_at DESC, b.filename DESC"
+            )
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def count(self, database=None, since=None, until=None):
+        """Número de backups que cumplen los filtros"""
+        where, params = self._where(database, since, until)
+        return self._connect().execute(f"SELECT COUNT(*) FROM backups{where}", params).fetchone()[0]
+
+    def stats(self):
+        """
+        Totales del catálogo
+
+        Returns:
+            dict: total, total_size (bytes) y last_created_at (o None)
+        """
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MAX(created_at) FROM backups"
+        ).fetchone()
+        return {'total': row[0], 'total_size': row[1], 'last_created_at': row[2]}
+
+    def database_stats(self):
+        """
+        Totales por base de datos
+
+        Returns:
+            dict: count, size (bytes) y last_created_at por base de datos
+        """
+        rows = self._connect().execute(
+            "SELECT database, COUNT(*), COALESCE(SUM(size), 0), MAX(created_at) FROM backups GROUP BY database"
+        )
+        return {row[0]: {'count': row[1], 'size': row[2], 'last_created_at': row[3]} for row in rows}
+
+    def operation_totals(self, kind):
+        """
+        Operaciones por base de datos y estado
+
+        Returns:
+            list: Tuplas (base de datos, estado, operaciones, reintentos)
+        """
+        return [tuple(row) for row in self._connect().execute(
+            "SELECT database, status, COUNT(*), SUM(CASE WHEN attempt > 1 THEN 1 ELSE 0 END) "
+            "FROM operations WHERE kind = ? GROUP BY database, status ORDER BY database, status",
+            (kind,)
+        )]
+
+    def databases(self):
+        """Bases de datos con al menos un backup"""
+        return [row[0] for row in self._connect().execute("SELECT DISTINCT database FROM backups ORDER BY database")]
+
+    def reconcile(self, backup_dir):
+        """
+        Sincroniza el catálogo con el contenido del directorio de backups
+
+        Returns:
+            tuple: (agregados o actualizados, eliminados)
+        """
+        on_disk = {p.name: p for p in list_backups(backup_dir)}
+        known = {row['filename']: row for row in self._connect().execute("SELECT filename, mtime, size FROM backups")}
+        updated = 0
+        for name, path in on_disk.items():
+            row = known.get(name)
+            if row is None or row['mtime'] != path.stat().st_mtime:
+                self.record(path)
+                updated += 1
+        removed = [name for name in known if name not in on_disk]
+        self.remove_many(removed)
+        return updated, len(removed)
+
+
+def open_catalog(backup_dir):
+    """Abre el catálogo del directorio de backups y lo reconstruye si es nuevo"""
+    path = Path(backup_dir) / CATALOG_NAME
+    is_new = not path.exists()
+    catalog = Catalog(path)
+    if is_new:
+        catalog.reconcile(backup_dir)
+    return catalog
+
+
+def main(argv):
+    if len(argv) < 1 or argv[0] != 'reconcile':
+        print("Uso: python catalog.py reconcile [directorio_de_backups]")
+        return 2
+    backup_dir = Path(argv[1] if len(argv) > 1 else 'backups')
+    catalog = Catalog(backup_dir / CATALOG_NAME)
+    updated, removed = catalog.reconcile(backup_dir)
+    stats = catalog.stats()
+    print(f"Catálogo sincronizado: {updated} agregados/actualizados, {removed} eliminados, {stats['total']} backups")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
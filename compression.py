@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Codecs de compresión para los archivos de backup
+
+Cada codec sabe escribir y leer su formato y la extensión que usa:
+- gzip:  gzip estándar de un solo hilo (.sql.gz)
+- pgzip: gzip paralelo por bloques, compatible con gunzip (.sql.gz)
+- zstd:  Zstandard multihilo (.sql.zst)
+- lz4:   LZ4, el más rápido con menor ratio (.sql.lz4)
+
+zstd y lz4 usan los módulos `zstandard` / `lz4` si están instalados y, si no,
+los binarios `zstd` / `lz4` del sistema.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Tamaño de bloque para la compresión gzip paralela
+PGZIP_BLOCK_SIZE = 1024 * 1024
+
+
+def open_output(target):
+    """
+    Destino de un escritor comprimido
+
+    Args:
+        target: Ruta, o archivo binario ya abierto (con write)
+
+    Returns:
+        tuple: (archivo, True si lo abrió esta función y hay que cerrarlo)
+    """
+    if hasattr(target, 'write'):
+        return target, False
+    return open(target, 'wb'), True
+
+
+def open_input(source):
+    """
+    Origen de un lector comprimido
+
+    Args:
+        source: Ruta, o archivo binario ya abierto (con read)
+
+    Returns:
+        tuple: (archivo, True si lo abrió esta función y hay que cerrarlo)
+    """
+    if hasattr(source, 'read'):
+        return source, False
+    return open(source, 'rb'), True
+
+
+def _feed(source, pipe):
+    # Copia un archivo abierto al stdin de un proceso; si el proceso termina
+    # antes (p.ej. el lector se cerró), el resto se descarta
+    try:
+        shutil.copyfileobj(source, pipe)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+class ProcessWriter:
+    """Escritor que comprime enviando los datos al stdin de un proceso externo"""
+
+    def __init__(self, cmd, path):
+        self._file, self._owned = open_output(path)
+        # Un archivo del disco recibe el stdout del proceso directamente; otro
+        # destino (p.ej. una subida remota) lo recibe copiado por un hilo
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=self._file if self._owned else subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self._pump = None
+        if not self._owned:
+            self._pump = threading.Thread(target=shutil.copyfileobj, args=(self._process.stdout, self._file), daemon=True)
+            self._pump.start()
+
+    def write(self, data):
+        self._process.stdin.write(data)
+        return len(data)
+
+    def close(self):
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+            stderr = process.stderr.read()
+            if self._pump is not None:
+                self._pump.join()
+            if process.wait() != 0:
+                raise IOError(f"{process.args[0]} falló: {stderr.decode('utf-8', errors='replace')}")
+        finally:
+            if self._owned:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ProcessReader:
+    """
+    Lector que descomprime leyendo el stdout de un proceso externo
+
+    Con `source` (un archivo abierto), un hilo se lo envía al proceso por stdin.
+    """
+
+    def __init__(self, cmd, source=None):
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE if source is not None else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        if source is not None:
+            threading.Thread(target=_feed, args=(source, self._process.stdin), daemon=True).start()
+
+    def read(self, size=-1):
+        return self._process.stdout.read(size)
+
+    def close(self):
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        process.stdout.close()
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParallelGzipWriter:
+    """
+    Escritor gzip que comprime bloques en paralelo
+
+    Cada bloque se escribe como un miembro gzip independiente; la
+    concatenación de miembros es un .gz válido para gunzip y gzip.open.
+    """
+
+    def __init__(self, path, level, threads):
+        self._file, self._owned = open_output(path)
+        self._level = level
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._max_pending = threads * 2
+        self._pending = []
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer.extend(data)
+        while len(self._buffer) >= PGZIP_BLOCK_SIZE:
+            self._submit(bytes(self._buffer[:PGZIP_BLOCK_SIZE]))
+            del self._buffer[:PGZIP_BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block):
+        # zlib libera el GIL, por lo que los hilos comprimen en paralelo
+        self._pending.append(self._executor.submit(gzip.compress, block, self._level))
+        while len(self._pending) >= self._max_pending:
+            self._file.write(self._pending.pop(0).result())
+
+    def close(self):
+        if self._executor is None:
+            return
+        try:
+            if self._buffer or not self._pending:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            for future in self._pending:
+                self._file.write(future.result())
+            self._pending = []
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            if self._owned:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Codec:
+    """
+    Formato de compresión de los backups
+
+    Args:
+        name (str): Nombre del codec
+        extension (str): Extensión de los archivos (incluye `.sql`)
+        default_level (int): Nivel de compresión por defecto
+        binary (str): Binario externo necesario si no hay módulo Python
+    """
+
+    def __init__(self, name, extension, default_level, binary=None):
+        self.name = name
+        self.extension = extension
+        self.default_level = default_level
+        self.binary = binary
+
+    def available(self):
+        """Indica si el codec puede usarse en este sistema"""
+        return True
+
+    def open_writer(self, path, level=None, threads=1):
+        """
+        Abre `path` para escritura comprimida; devuelve un objeto con write/close
+
+        `path` también puede ser un archivo binario abierto, que no se cierra
+        al cerrar el escritor.
+        """
+        raise NotImplementedError
+
+    def open_reader(self, path):
+        """
+        Abre `path` para lectura descomprimida; devuelve un objeto con read/close
+
+        `path` también puede ser un archivo binario abierto (p.ej. un rango de
+        un archivo, ver seekable_archive.py), que no se cierra al cerrar el lector.
+        """
+        raise NotImplementedError
+
+    def decompress_command(self, path=None):
+        """Comando que escribe el contenido descomprimido de `path` (o de stdin) en stdout"""
+        raise NotImplementedError
+
+    def compress_block(self, data, level=None):
+        """
+        Comprime un bloque como un flujo independiente del codec
+
+        La concatenación de bloques es un archivo válido del codec. Sin módulo
+        Python, cada bloque se comprime con un proceso del binario.
+        """
+        out = io.BytesIO()
+        with self.open_writer(out, level, 1) as writer:
+            writer.write(data)
+        return out.getvalue()
+
+
+class GzipCodec(Codec):
+
+    def __init__(self):
+        super().__init__('gzip', '.sql.gz', 9, binary='gunzip')
+
+    def open_writer(self, path, level=None, threads=1):
+        return gzip.open(path, 'wb', compresslevel=level or self.default_level)
+
+    def open_reader(self, path):
+        return gzip.open(path, 'rb')
+
+    def decompress_command(self, path=None):
+        return ['gunzip', '-c', *([str(path)] if path is not None else [])]
+
+    def compress_block(self, data, level=None):
+        return gzip.compress(data, level or self.default_level)
+
+
+class ParallelGzipCodec(GzipCodec):
+
+    def __init__(self):
+        super().__init__()
+        self.name = 'pgzip'
+        self.default_level = 6
+
+    def open_writer(self, path, level=None, threads=1):
+        threads = max(1, threads or os.cpu_count() or 1)
+        return ParallelGzipWriter(path, level or self.default_level, threads)
+
+
+class ZstdCodec(Codec):
+
+    def __init__(self):
+        super().__init__('zstd', '.sql.zst', 3, binary='zstd')
+
+    def _module(self):
+        try:
+            import zstandard
+            return zstandard
+        except ImportError:
+            return None
+
+    def available(self):
+        return self._module() is not None or shutil.which(self.binary) is not None
+
+    def open_writer(self, path, level=None, threads=1):
+        level = level or self.default_level
+        zstandard = self._module()
+        if zstandard is not None:
+            compressor = zstandard.ZstdCompressor(level=level, threads=threads or -1)
+            f_out, owned = open_output(path)
+            return compressor.stream_writer(f_out, closefd=owned)
+        return ProcessWriter([self.binary, f'-{level}', f'-T{threads or 0}', '-q', '-c'], path)
+
+    def open_reader(self, path):
+        zstandard = self._module()
+        if zstandard is not None:
+            # Un archivo puede tener varios frames (p.ej. partes concatenadas)
+            f_in, owned = open_input(path)
+            return zstandard.ZstdDecompressor().stream_reader(f_in, closefd=owned, read_across_frames=True)
+        if hasattr(path, 'read'):
+            return ProcessReader(self.decompress_command(), source=path)
+        return ProcessReader(self.decompress_command(path))
+
+    def decompress_command(self, path=None):
+        return [self.binary, '-dc', '-q', *([str(path)] if path is not None else [])]
+
+    def compress_block(self, data, level=None):
+        zstandard = self._module()
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=level or self.default_level).compress(data)
+        return super().compress_block(data, level)
+
+
+class Lz4Codec(Codec):
+
+    def __init__(self):
+        super().__init__('lz4', '.sql.lz4', 1, binary='lz4')
+
+    def _module(self):
+        try:
+            import lz4.frame
+            return lz4.frame
+        except ImportError:
+            return None
+
+    def available(self):
+        return self._module() is not None or shutil.which(self.binary) is not None
+
+    def open_writer(self, path, level=None, threads=1):
+        level = level or self.default_level
+        lz4_frame = self._module()
+        if lz4_frame is not None:
+            return lz4_frame.open(path, 'wb', compression_level=level)
+        return ProcessWriter([self.binary, f'-{level}', '-q', '-c'], path)
+
+    def open_reader(self, path):
+        lz4_frame = self._module()
+        if lz4_frame is not None:
+            return lz4_frame.open(path, 'rb')
+        if hasattr(path, 'read'):
+            return ProcessReader(self.decompress_command(), source=path)
+        return ProcessReader(self.decompress_command(path))
+
+    def decompress_command(self, path=None):
+        return [self.binary, '-dc', '-q', *([str(path)] if path is not None else [])]
+
+    def compress_block(self, data, level=None):
+        lz4_frame = self._module()
+        if lz4_frame is not None:
+            return lz4_frame.compress(data, compression_level=level or self.default_level)
+        return super().compress_block(data, level)
+
+
+CODECS = {codec.name: codec for codec in (GzipCodec(), ParallelGzipCodec(), ZstdCodec(), Lz4Codec())}
+
+# Extensiones reconocidas como backup (sin duplicados, gzip primero)
+BACKUP_EXTENSIONS = list(dict.fromkeys(codec.extension for codec in CODECS.values()))
+
+
+def get_codec(name):
+    """
+    Obtiene un codec por nombre
+
+    Args:
+        name (str): gzip, pgzip, zstd o lz4
+
+    Returns:
+        Codec: Codec solicitado
+
+    Raises:
+        ValueError: Si el codec no existe o no está disponible
+    """
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Codec de compresión desconocido: {name}")
+    if not codec.available():
+        raise ValueError(f"Codec de compresión no disponible en este sistema: {name}")
+    return codec
+
+
+def codec_for_path(path):
+    """
+    Devuelve el codec que corresponde a la extensión de un archivo de backup
+
+    Returns:
+        Codec: Codec del archivo, o None si no es un backup reconocido
+    """
+    name = Path(path).name
+    for codec in CODECS.values():
+        if name.endswith(codec.extension):
+            return codec
+    return None
+
+
+def is_backup_file(path):
+    """Indica si el archivo tiene una extensión de backup comprimido"""
+    return codec_for_path(path) is not None
+
+
+def strip_backup_extension(filename):
+    """Quita la extensión de backup (`.sql.gz`, `.sql.zst`...) de un nombre de archivo"""
+    for extension in BACKUP_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+
+def list_backup_files(directory):
+    """
+    Lista los archivos de backup comprimidos de un directorio (cualquier codec)
+
+    Returns:
+        list: Rutas de los archivos encontrados
+    """
+    files = []
+    for extension in BACKUP_EXTENSIONS:
+        files.extend(Path(directory).glob(f'*{extension}'))
+    return files
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Almacén deduplicado de backups (direccionado por contenido)
+
+Los volcados diarios de una misma base de datos cambian poco de un día a
+otro. En lugar de guardar cada volcado completo se divide en fragmentos
+definidos por su contenido y cada fragmento se guarda una sola vez:
+
+    backups/store/chunks/ab/<sha256>.gz   Fragmento comprimido
+    backups/store/index.db                Fragmentos y sus referencias (SQLite)
+    backups/<db>_<fecha>.dedup            Manifest del backup (lista de fragmentos)
+
+Los cortes se hacen en fin de línea o entre filas de un INSERT extendido
+(`),(`) según un hash del contenido, así que insertar o borrar filas solo
+cambia los fragmentos cercanos y el resto se reutiliza.
+
+Cada fragmento cuenta cuántos backups lo usan; al eliminar un backup se
+descuentan sus fragmentos y se borran los que quedan sin referencias.
+Si un proceso muere a mitad de un backup sus referencias quedan sin liberar;
+`python dedup_store.py gc [directorio]` las recalcula desde los manifests
+(ejecutarlo sin backups en curso).
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from compression import get_codec
+
+STORE_DIR_NAME = 'store'
+CHUNKS_DIR = 'chunks'
+INDEX_NAME = 'index.db'
+MANIFEST_FORMAT = 1
+
+# Tamaños de los fragmentos sin comprimir
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_AVG_SIZE = 64 * 1024
+CHUNK_MAX_SIZE = 256 * 1024
+
+# Posibles puntos de corte: fin de línea o separador de filas de un INSERT extendido
+BOUNDARY_PATTERN = re.compile(rb'\n|\),\(')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    raw_size INTEGER NOT NULL,
+    refs INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_unreferenced ON chunks (hash) WHERE refs <= 0;
+"""
+
+
+class Chunker:
+    """
+    Fragmentación definida por contenido
+
+    Entre dos puntos de corte posibles hay un "token" (una línea o una
+    fila). Se corta tras un token si su crc32 cae bajo un umbral
+    proporcional a su longitud, de modo que el tamaño medio es
+    CHUNK_AVG_SIZE sin recorrer los datos byte a byte en Python.
+    """
+
+    def __init__(self, min_size=CHUNK_MIN_SIZE, avg_size=CHUNK_AVG_SIZE, max_size=CHUNK_MAX_SIZE):
+        self.min_size = min_size
+        self.max_size = max_size
+        self._divisor = max(1, avg_size - min_size)
+        self._pending = b''
+        self._token_offset = 0
+        self._scan_offset = 0
+
+    def feed(self, data):
+        """
+        Agrega datos
+
+        Returns:
+            list: Fragmentos completos (bytes)
+        """
+        data = self._pending + data
+        view = memoryview(data)
+        chunks = []
+        start = 0
+        token_start = self._token_offset
+
+        for match in BOUNDARY_PATTERN.finditer(data, self._scan_offset):
+            end = match.end()
+            if end <= token_start:
+                continue
+            while end - start > self.max_size:
+                chunks.append(data[start:start + self.max_size])
+                start += self.max_size
+                token_start = max(token_start, start)
+            token_length = end - token_start
+            if end - start >= self.min_size and zlib.crc32(view[token_start:end]) * self._divisor < token_length << 32:
+                chunks.append(data[start:end])
+                start = end
+            token_start = end
+
+        while len(data) - start > self.max_size:
+            chunks.append(data[start:start + self.max_size])
+            start += self.max_size
+            token_start = max(token_start, start)
+
+        view.release()
+        self._pending = data[start:]
+        self._token_offset = token_start - start
+        # Se vuelve a mirar el final por si un separador `),(` quedó partido
+        self._scan_offset = max(self._token_offset, len(self._pending) - 2)
+        return chunks
+
+    def flush(self):
+        """Devuelve el último fragmento (o None si no queda nada)"""
+        chunk, self._pending = self._pending, b''
+        self._token_offset = self._scan_offset = 0
+        return chunk or None
+
+
+class DedupStore:
+    """
+    Fragmentos de los backups deduplicados
+
+    Args:
+        root (Path): Directorio del almacén (backups/store)
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.chunks_dir = self.root / CHUNKS_DIR
+        self._local = threading.local()
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        # Una conexión por hilo; las transacciones se abren explícitamente
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / INDEX_NAME, timeout=60, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE: un solo escritor a la vez entre hilos y procesos,
+        # para que la recolección no borre un fragmento que otro backup reutiliza
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def chunk_path(self, digest, codec):
+        suffix = codec.extension[len('.sql'):]
+        return self.chunks_dir / digest[:2] / f"{digest}{suffix}"
+
+    def _compress(self, data, codec, level):
+        fd, tmp = tempfile.mkstemp(prefix='.chunk-', suffix='.part', dir=self.chunks_dir)
+        os.close(fd)
+        with codec.open_writer(tmp, level) as f_out:
+            f_out.write(data)
+        return Path(tmp)
+
+    def put(self, data, codec, level=None, digest=None):
+        """
+        Guarda un fragmento (si no existe) y le suma una referencia
+
+        Args:
+            data (bytes): Contenido sin comprimir
+            codec (Codec): Codec para los fragmentos nuevos
+            level (int): Nivel de compresión
+            digest (str): sha256 de `data`, si ya se calculó
+
+        Returns:
+            tuple: (sha256, bytes comprimidos agregados al almacén; 0 si ya existía)
+        """
+        digest = digest or hashlib.sha256(data).hexdigest()
+        conn = self._connect()
+        row = conn.execute("SELECT refs FROM chunks WHERE hash = ?", (digest,)).fetchone()
+        # La compresión se hace fuera de la transacción para no bloquear a otros escritores
+        prepared = self._compress(data, codec, level) if row is None or row['refs'] <= 0 else None
+        try:
+            with self._transaction() as conn:
+                row = conn.execute("SELECT codec FROM chunks WHERE hash = ?", (digest,)).fetchone()
+                if row is not None and self.chunk_path(digest, get_codec(row['codec'])).exists():
+                    conn.execute("UPDATE chunks SET refs = MAX(refs, 0) + 1 WHERE hash = ?", (digest,))
+                    return digest, 0
+                if prepared is None:
+                    prepared = self._compress(data, codec, level)
+                target = self.chunk_path(digest, codec)
+                target.parent.mkdir(exist_ok=True)
+                os.replace(prepared, target)
+                prepared = None
+                size = target.stat().st_size
+                conn.execute(
+                    "INSERT OR REPLACE INTO chunks (hash, codec, size, raw_size, refs) VALUES (?, ?, ?, ?, 1)",
+                    (digest, codec.name, size, len(data))
+                )
+                return digest, size
+        finally:
+            if prepared is not None:
+                prepared.unlink(missing_ok=True)
+
+    def read(self, digest):
+        """Contenido sin comprimir de un fragmento"""
+        row = self._connect().execute("SELECT codec FROM chunks WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Fragmento no encontrado en el almacén: {digest}")
+        codec = get_codec(row['codec'])
+        with codec.open_reader(self.chunk_path(digest, codec)) as reader:
+            return reader.read()
+
+    def _collect(self, conn):
+        rows = conn.execute("SELECT hash, codec, size FROM chunks WHERE refs <= 0").fetchall()
+        for row in rows:
+            self.chunk_path(row['hash'], get_codec(row['codec'])).unlink(missing_ok=True)
+        conn.executemany("DELETE FROM chunks WHERE hash = ?", [(row['hash'],) for row in rows])
+        return len(rows), sum(row['size'] for row in rows)
+
+    def release(self, digests):
+        """
+        Descuenta una referencia de cada fragmento y borra los que quedan sin uso
+
+        Returns:
+            tuple: (fragmentos eliminados, bytes liberados)
+        """
+        with self._transaction() as conn:
+            conn.executemany("UPDATE chunks SET refs = refs - 1 WHERE hash = ?", [(d,) for d in set(digests)])
+            return self._collect(conn)
+
+    def rebuild(self, manifests):
+        """
+        Recalcula las referencias desde los manifests y borra lo que no se usa
+
+        Args:
+            manifests (list): Rutas de todos los manifests `.dedup`
+
+        Returns:
+            dict: removed, freed_bytes, missing (fragmentos referenciados que no existen)
+        """
+        refs = Counter()
+        for path in manifests:
+            refs.update(set(digest for digest, _ in read_dedup_manifest(path)['chunks']))
+        with self._transaction() as conn:
+            conn.execute("UPDATE chunks SET refs = 0")
+            conn.executemany("UPDATE chunks SET refs = ? WHERE hash = ?", [(n, d) for d, n in refs.items()])
+            known = {row[0] for row in conn.execute("SELECT hash FROM chunks")}
+            removed, freed = self._collect(conn)
+            kept = {row[0] for row in conn.execute("SELECT hash FROM chunks")}
+            # Archivos que no están en el índice (p.ej. de un proceso interrumpido)
+            for path in self.chunks_dir.rglob('*'):
+                if path.is_file() and path.name.split('.', 1)[0] not in kept:
+                    freed += path.stat().st_size
+                    path.unlink()
+        return {'removed': removed, 'freed_bytes': freed, 'missing': sorted(set(refs) - known)}
+
+    def stats(self):
+        """
+        Totales del almacén
+
+        Returns:
+            dict: chunks, size (comprimido en disco) y raw_size (sin comprimir)
+        """
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM chunks"
+        ).fetchone()
+        return {'chunks': row[0], 'size': row[1], 'raw_size': row[2]}
+
+
+class DedupWriter:
+    """
+    Escribe un volcado en el almacén (se usa como un archivo: write())
+
+    Los fragmentos se referencian a medida que se guardan; commit() escribe
+    el manifest y abort() libera las referencias si el volcado falla.
+
+    Args:
+        store (DedupStore): Almacén destino
+        codec (Codec): Codec de los fragmentos nuevos
+        level (int): Nivel de compresión
+    """
+
+    def __init__(self, store, codec, level=None):
+        self.store = store
+        self.codec = codec
+        self.level = level
+        self.chunks = []
+        self.raw_bytes = 0
+        self.new_bytes = 0
+        self._held = set()
+        self._chunker = Chunker()
+        self._digest = hashlib.sha256()
+
+    def _add(self, chunk):
+        digest = hashlib.sha256(chunk).hexdigest()
+        if digest not in self._held:
+            digest, added = self.store.put(chunk, self.codec, self.level, digest)
+            self._held.add(digest)
+            self.new_bytes += added
+        self.chunks.append([digest, len(chunk)])
+
+    def write(self, data):
+        self.raw_bytes += len(data)
+        self._digest.update(data)
+        for chunk in self._chunker.feed(data):
+            self._add(chunk)
+        return len(data)
+
+    def commit(self, manifest_path, **meta):
+        """
+        Guarda los últimos datos y escribe el manifest de forma atómica
+
+        Returns:
+            dict: Manifest escrito
+        """
+        last = self._chunker.flush()
+        if last is not None:
+            self._add(last)
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'layout': 'dedup',
+            **meta,
+            'codec': self.codec.name,
+            'raw_bytes': self.raw_bytes,
+            'sha256': self._digest.hexdigest(),
+            'new_bytes': self.new_bytes,
+            'chunks': self.chunks
+        }
+        manifest_path = Path(manifest_path)
+        tmp_path = Path(str(manifest_path) + '.part')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        self._held = set()
+        return manifest
+
+    def abort(self):
+        """Libera las referencias tomadas por un volcado que no se completó"""
+        if self._held:
+            self.store.release(self._held)
+            self._held = set()
+
+
+class DedupReader:
+    """Lector secuencial (read()) del volcado de un backup deduplicado"""
+
+    def __init__(self, store, manifest):
+        self._store = store
+        self._chunks = iter(manifest['chunks'])
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            entry = next(self._chunks, None)
+            if entry is None:
+                break
+            self._buffer += self._store.read(entry[0])
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._chunks = iter(())
+        self._buffer = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_dedup_manifest(path):
+    """Lee el manifest de un backup deduplicado"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def store_for(backup_path):
+    """Almacén del directorio de un backup deduplicado"""
+    return DedupStore(Path(backup_path).parent / STORE_DIR_NAME)
+
+
+def open_backup(backup_path):
+    """Abre un backup deduplicado para leer su volcado sin comprimir"""
+    return DedupReader(store_for(backup_path), read_dedup_manifest(backup_path))
+
+
+def remove_dedup_backup(backup_path):
+    """
+    Elimina un backup deduplicado y los fragmentos que solo usaba él
+
+    Returns:
+        tuple: (fragmentos eliminados, bytes liberados)
+    """
+    backup_path = Path(backup_path)
+    manifest = read_dedup_manifest(backup_path)
+    # Primero el manifest: si el proceso muere después, las referencias
+    # sobrantes se recuperan con `gc`; al revés quedaría un backup roto
+    backup_path.unlink()
+    return store_for(backup_path).release(digest for digest, _ in manifest['chunks'])
+
+
+def main(argv):
+    if len(argv) < 1 or argv[0] not in ('gc', 'stats'):
+        print("Uso: python dedup_store.py gc|stats [directorio_de_backups]")
+        return 2
+    backup_dir = Path(argv[1] if len(argv) > 1 else 'backups')
+    store = DedupStore(backup_dir / STORE_DIR_NAME)
+    manifests = sorted(backup_dir.glob('*.dedup'))
+    if argv[0] == 'gc':
+        result = store.rebuild(manifests)
+        print(f"Fragmentos eliminados: {result['removed']} ({result['freed_bytes'] / (1024 * 1024):.2f} MB liberados)")
+        if result['missing']:
+            print(f"✗ Fragmentos referenciados que faltan: {len(result['missing'])}")
+            return 1
+        return 0
+    stats = store.stats()
+    logical = sum(read_dedup_manifest(p)['raw_bytes'] for p in manifests)
+    print(f"Backups: {len(manifests)}, fragmentos: {stats['chunks']}")
+    print(f"Datos lógicos: {logical / (1024 * 1024):.2f} MB, en disco: {stats['size'] / (1024 * 1024):.2f} MB")
+    if stats['size']:
+        print(f"Ratio: {logical / stats['size']:.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
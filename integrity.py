@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Verificación de integridad de los backups
+
+Al crear cada backup se calcula el SHA-256 del volcado sin comprimir mientras
+se escribe y se comprueba que termina con el pie "-- Dump completed" de
+mysqldump. La verificación vuelve a descomprimir cada backup, recalcula el
+SHA-256 y lo compara con el guardado:
+- Archivo único: `<archivo>.sha256` (o el catálogo)
+- Por tablas: el sha256 de cada parte en manifest.json
+- Deduplicado: el sha256 del manifest (lee los fragmentos del almacén)
+
+Los backups se verifican en paralelo (la descompresión y el hash liberan el
+GIL), así que el tiempo total escala con los núcleos y el disco:
+    python integrity.py verify [--workers N] [--database DB] [directorio_de_backups]
+"""
+
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import bulk_load
+from backup_layout import is_chunked_backup, is_dedup_backup, read_checksum, read_manifest
+from compression import codec_for_path, get_codec
+from dedup_store import open_backup, read_dedup_manifest
+
+# Pie que mysqldump escribe al terminar un volcado (salvo con --skip-comments)
+DUMP_TRAILER = b'-- Dump completed'
+
+# Bytes del final del volcado en los que buscar el pie
+TRAILER_SCAN_BYTES = 256
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Resultados de una verificación
+OK = 'ok'                    # SHA-256 y pie correctos
+NO_CHECKSUM = 'no_checksum'  # Se descomprime y tiene pie, pero no hay SHA-256 con qué comparar
+CORRUPT = 'corrupt'          # SHA-256 distinto, datos ilegibles o fragmentos perdidos
+INCOMPLETE = 'incomplete'    # Falta el pie "-- Dump completed"
+FAILED_STATES = (CORRUPT, INCOMPLETE)
+
+
+class TrailerTracker:
+    """Guarda el final de un flujo para comprobar el pie de mysqldump"""
+
+    def __init__(self):
+        self.tail = b''
+
+    def update(self, chunk):
+        self.tail = (self.tail + chunk[-TRAILER_SCAN_BYTES:])[-TRAILER_SCAN_BYTES:]
+
+    @property
+    def complete(self):
+        return DUMP_TRAILER in self.tail
+
+
+def hash_stream(reader, on_chunk=None):
+    """
+    Lee un flujo sin comprimir hasta el final
+
+    Args:
+        reader: Lector con read()
+        on_chunk (callable): Recibe cada bloque leído (p.ej. para indexarlo)
+
+    Returns:
+        tuple: (SHA-256 en hexadecimal, bytes leídos, True si termina con el pie)
+    """
+    digest = hashlib.sha256()
+    trailer = TrailerTracker()
+    raw_bytes = 0
+    while True:
+        chunk = reader.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        trailer.update(chunk)
+        raw_bytes += len(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return digest.hexdigest(), raw_bytes, trailer.complete
+
+
+def check_part(label, reader, expected, trailer=True):
+    """
+    Verifica un volcado (o una parte) contra su SHA-256 esperado
+
+    Los datos en TSV (ver bulk_load.py) no tienen pie: se comprueba al convertirlos.
+
+    Returns:
+        tuple: (estado, mensaje o None, bytes leídos)
+    """
+    try:
+        with reader as f:
+            sha256, raw_bytes, complete = hash_stream(f)
+    except Exception as e:
+        # Errores de descompresión (CRC, fin inesperado) o fragmentos perdidos
+        return CORRUPT, f"{label}: no se pudo leer: {str(e)}", 0
+    if expected and sha256 != expected:
+        return CORRUPT, f"{label}: SHA-256 distinto (esperado {expected[:12]}…, leído {sha256[:12]}…)", raw_bytes
+    if trailer and not complete:
+        return INCOMPLETE, f"{label}: falta el pie \"-- Dump completed\"", raw_bytes
+    return (OK if expected else NO_CHECKSUM), None, raw_bytes
+
+
+def verify_backup(path, expected_sha256=None):
+    """
+    Verifica un backup en cualquiera de los formatos
+
+    Args:
+        path (Path): Backup a verificar
+        expected_sha256 (str): SHA-256 de un archivo único, si no está junto al archivo
+
+    Returns:
+        dict: filename, status, message, raw_bytes y duration_seconds
+    """
+    path = Path(path)
+    start = time.monotonic()
+    try:
+        if is_chunked_backup(path):
+            manifest = read_manifest(path)
+            codec = get_codec(manifest['codec'])
+            parts = [manifest['schema'], *manifest['tables'], manifest['objects']]
+            checks = [check_part(p['file'], codec.open_reader(path / p['file']), p.get('sha256'),
+                                 trailer=p.get('format') != bulk_load.TSV_FORMAT) for p in parts]
+        elif is_dedup_backup(path):
+            manifest = read_dedup_manifest(path)
+            checks = [check_part(path.name, open_backup(path), manifest.get('sha256'))]
+        else:
+            codec = codec_for_path(path)
+            if codec is None:
+                raise ValueError("Formato de backup no reconocido")
+            expected = read_checksum(path) or expected_sha256
+            checks = [check_part(path.name, codec.open_reader(path), expected)]
+    except Exception as e:
+        checks = [(CORRUPT, f"{path.name}: {str(e)}", 0)]
+
+    # El peor estado de las partes es el del backup
+    order = (OK, NO_CHECKSUM, INCOMPLETE, CORRUPT)
+    status = max((c[0] for c in checks), key=order.index)
+    messages = [c[1] for c in checks if c[1]]
+    return {
+        'filename': path.name,
+        'status': status,
+        'message': '; '.join(messages[:5]) or None,
+        'raw_bytes': sum(c[2] for c in checks),
+        'duration_seconds': round(time.monotonic() - start, 3)
+    }
+
+
+def verify_backups(paths, expected=None, workers=None, on_result=None):
+    """
+    Verifica varios backups en paralelo
+
+    Args:
+        paths (list): Backups a verificar
+        expected (dict): SHA-256 conocidos por nombre de archivo (p.ej. del catálogo)
+        workers (int): Backups verificados a la vez (por defecto, los núcleos)
+        on_result (callable): Se llama con cada resultado al terminar
+
+    Returns:
+        list: Resultados de verify_backup() en el orden de `paths`
+    """
+    expected = expected or {}
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) or 1))
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify') as executor:
+        futures = {executor.submit(verify_backup, p, expected.get(Path(p).name)): Path(p).name for p in paths}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result is not None:
+                on_result(result)
+    return [results[Path(p).name] for p in paths]
+
+
+def verify_catalog(catalog, backup_dir, database=None, workers=None, on_result=None):
+    """
+    Verifica los backups del catálogo y guarda el resultado de cada uno
+
+    Returns:
+        list: Resultados de verify_backup()
+    """
+    rows = catalog.query(database=database, limit=None)
+    paths = [Path(backup_dir) / row['filename'] for row in rows]
+    expected = {row['filename']: row['sha256'] for row in rows if row['sha256']}
+
+    def record(result):
+        catalog.set_verification(result['filename'], result['status'], datetime.now().isoformat())
+        if on_result is not None:
+            on_result(result)
+
+    return verify_backups(paths, expected, workers, record)
+
+
+def main(argv):
+    from catalog import open_catalog
+
+    args = list(argv)
+    if not args or args.pop(0) != 'verify':
+        print("Uso: python integrity.py verify [--workers N] [--database DB] [directorio_de_backups]")
+        return 2
+    workers = database = None
+    backup_dir = Path('backups')
+    while args:
+        arg = args.pop(0)
+        if arg == '--workers' and args:
+            workers = int(args.pop(0))
+        elif arg == '--database' and args:
+            database = args.pop(0)
+        else:
+            backup_dir = Path(arg)
+
+    def report(result):
+        mb = result['raw_bytes'] / (1024 * 1024)
+        mark = '✗' if result['status'] in FAILED_STATES else '✓'
+        print(f"{mark} {result['filename']}: {result['status']} ({mb:.1f} MB en {result['duration_seconds']:.1f}s)"
+              + (f" - {result['message']}" if result['message'] else ''), flush=True)
+
+    start = time.monotonic()
+    results = verify_catalog(open_catalog(backup_dir), backup_dir, database, workers, report)
+    failed = [r for r in results if r['status'] in FAILED_STATES]
+    total_mb = sum(r['raw_bytes'] for r in results) / (1024 * 1024)
+    print(f"Verificados {len(results)} backups ({total_mb:.1f} MB) en {time.monotonic() - start:.1f}s: "
+          f"{len(results) - len(failed)} correctos, {len(failed)} con errores")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
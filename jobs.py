@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Cola de trabajos en segundo plano para backups y restauraciones
+
+Los trabajos se ejecutan en un pool de hilos acotado y su estado se guarda
+en un archivo JSON para poder consultarlos tras reiniciar el proceso web.
+Al reiniciar, los trabajos que estaban en ejecución quedan como
+'interrupted' y los que seguían en cola se vuelven a encolar con sus
+argumentos guardados (ver JobManager.resume()).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# Estados de un trabajo
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+INTERRUPTED = 'interrupted'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Líneas de salida que se conservan por trabajo
+MAX_OUTPUT_LINES = 200
+
+# Segundos mínimos entre escrituras del archivo por cambios de progreso/salida
+SAVE_INTERVAL = 2.0
+
+
+class JobQueueFull(Exception):
+    """La cola de trabajos alcanzó su límite"""
+
+
+class DuplicateJob(Exception):
+    """Ya hay un trabajo activo que usa el mismo recurso"""
+
+    def __init__(self, job):
+        super().__init__(f"Trabajo en curso: {job['id']}")
+        self.job = job
+
+
+class JobContext:
+    """Interfaz que recibe la función de un trabajo para informar su avance"""
+
+    def __init__(self, manager, job_id):
+        self._manager = manager
+        self.job_id = job_id
+
+    def set_progress(self, **fields):
+        """Actualiza los campos de progreso del trabajo"""
+        self._manager._update(self.job_id, progress=fields)
+
+    def log(self, line):
+        """Agrega una línea a la salida del trabajo"""
+        self._manager._update(self.job_id, output=line)
+
+
+def keys_conflict(a, b):
+    """
+    Indica si dos claves de recurso se solapan
+
+    Las claves son jerárquicas: ('backup',) bloquea a ('backup', 'gastos_db')
+    y viceversa, pero ('backup', 'a') no bloquea a ('backup', 'b').
+    """
+    n = min(len(a), len(b))
+    return tuple(a[:n]) == tuple(b[:n])
+
+
+class JobManager:
+    """
+    Gestor de trabajos en segundo plano
+
+    Args:
+        store_path (Path): Archivo JSON donde persistir los trabajos
+        workers (int): Trabajos ejecutados simultáneamente
+        max_pending (int): Máximo de trabajos en cola o en ejecución
+        history (int): Trabajos terminados que se conservan
+    """
+
+    def __init__(self, store_path, workers=2, max_pending=10, history=100):
+        self.store_path = Path(store_path)
+        self.max_pending = max_pending
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._last_save = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._load()
+
+    def _load(self):
+        if not self.store_path.exists():
+            return
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                jobs = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"No se pudo leer el archivo de trabajos: {str(e)}")
+            return
+        for job in jobs:
+            # Los trabajos en cola se conservan hasta resume()
+            if job['state'] == RUNNING:
+                self._interrupt(job, 'Proceso web reiniciado durante el trabajo')
+            self._jobs[job['id']] = job
+        self._save(force=True)
+
+    def _interrupt(self, job, error):
+        job['state'] = INTERRUPTED
+        job['error'] = error
+        job['finished_at'] = datetime.now().isoformat()
+
+    def resume(self, runners):
+        """
+        Vuelve a encolar los trabajos que quedaron en cola al reiniciar
+
+        Args:
+            runners (dict): {tipo: runner(JobContext, **args)} para cada tipo de trabajo
+
+        Returns:
+            int: Trabajos encolados de nuevo
+        """
+        pending = []
+        with self._lock:
+            queued = sorted((j for j in self._jobs.values() if j['state'] == QUEUED), key=lambda j: j['created_at'])
+            for job in queued:
+                runner = runners.get(job['kind'])
+                if runner is None or job.get('args') is None:
+                    self._interrupt(job, 'Proceso web reiniciado con el trabajo en cola')
+                    continue
+                pending.append((job['id'], runner, job['args']))
+            self._save(force=True)
+
+        for job_id, runner, args in pending:
+            self._executor.submit(self._run, job_id, lambda ctx, runner=runner, args=args: runner(ctx, **args))
+        if pending:
+            logging.info(f"Trabajos en cola reanudados: {len(pending)}")
+        return len(pending)
+
+    def _save(self, force=False):
+        # Se llama con self._lock tomado (o durante la inicialización)
+        now = time.monotonic()
+        if not force and now - self._last_save < SAVE_INTERVAL:
+            return
+        self._last_save = now
+        finished = [j for j in self._jobs.values() if j['state'] not in ACTIVE_STATES]
+        for job in sorted(finished, key=lambda j: j['created_at'])[:-self.history or None]:
+            del self._jobs[job['id']]
+        tmp_path = self.store_path.with_suffix('.json.part')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(list(self._jobs.values()), f, indent=2)
+            os.replace(tmp_path, self.store_path)
+        except OSError as e:
+            logging.warning(f"No se pudo guardar el archivo de trabajos: {str(e)}")
+
+    def _update(self, job_id, progress=None, output=None, force=False, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if progress:
+                job['progress'].update(progress)
+            if output is not None:
+                job['output'].append(output)
+                del job['output'][:-MAX_OUTPUT_LINES]
+            self._save(force=force)
+
+    def submit(self, kind, key, func, params=None, args=None):
+        """
+        Encola un trabajo
+
+        Args:
+            kind (str): Tipo de trabajo ('backup', 'restore'...)
+            key (tuple): Recurso que usa el trabajo, para evitar duplicados
+            func (callable): func(JobContext) -> resultado serializable en JSON
+            params (dict): Parámetros a mostrar (sin credenciales)
+            args (dict): Argumentos (serializables en JSON, sin credenciales) con
+                los que resume() repite el trabajo si se reinicia en cola; sin
+                ellos el trabajo queda 'interrupted'
+
+        Returns:
+            dict: Copia del trabajo creado
+
+        Raises:
+            DuplicateJob: Si un trabajo activo usa un recurso solapado
+            JobQueueFull: Si hay `max_pending` trabajos activos
+        """
+        with self._lock:
+            active = [j for j in self._jobs.values() if j['state'] in ACTIVE_STATES]
+            for job in active:
+                if keys_conflict(job['key'], key):
+                    raise DuplicateJob(dict(job))
+            if len(active) >= self.max_pending:
+                raise JobQueueFull(f"Hay {len(active)} trabajos pendientes")
+
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                'id': job_id,
+                'kind': kind,
+                'key': list(key),
+                'params': params or {},
+                'args': args,
+                'state': QUEUED,
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'progress': {},
+                'output': [],
+                'result': None,
+                'error': None
+            }
+            self._jobs[job_id] = job
+            self._save(force=True)
+            snapshot = dict(job)
+
+        self._executor.submit(self._run, job_id, func)
+        return snapshot
+
+    def _run(self, job_id, func):
+        self._update(job_id, state=RUNNING, started_at=datetime.now().isoformat(), force=True)
+        try:
+            result = func(JobContext(self, job_id))
+        except Exception as e:
+            logging.error(f"Trabajo {job_id} fallido: {str(e)}")
+            self._update(job_id, state=FAILED, error=str(e), finished_at=datetime.now().isoformat(), force=True)
+        else:
+            self._update(job_id, state=SUCCEEDED, result=result, finished_at=datetime.now().isoformat(), force=True)
+
+    def get(self, job_id):
+        """Devuelve una copia del trabajo o None si no existe"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def list(self, limit=50):
+        """Trabajos más recientes primero"""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j['created_at'], reverse=True)[:limit]
+            return json.loads(json.dumps([{k: v for k, v in job.items() if k != 'output'} for job in jobs]))
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Lectura del final de los logs y rotación por tamaño
+
+- LogTail lee las últimas líneas de un log recorriéndolo hacia atrás desde el
+  final por bloques, o las líneas nuevas desde un desplazamiento (para
+  consultas incrementales), sin leer nunca más de MAX_SCAN_BYTES. Las
+  respuestas se cachean mientras el archivo no cambie.
+- RotatingLogHandler rota el log al superar LOG_MAX_BYTES y, si otro proceso
+  lo rotó, vuelve a abrir el archivo nuevo.
+
+Este módulo es compartido por backup_mysql.py, scheduler.py y web_monitor.py.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler
+
+# Rotación: tamaño máximo de cada log y número de archivos antiguos (.1, .2...)
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '5'))
+
+# Tamaño de bloque al leer hacia atrás y máximo de bytes leídos por consulta
+BLOCK_SIZE = 64 * 1024
+MAX_SCAN_BYTES = 4 * 1024 * 1024
+
+# Respuestas cacheadas (las consultas repetidas del monitor no releen el archivo)
+CACHE_SIZE = 32
+
+# Formato de las líneas: '%(asctime)s - %(levelname)s - %(message)s'
+LINE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2} [\d:,]+ - ([A-Z]+) - ')
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+class RotatingLogHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler que tolera varios procesos escribiendo el mismo log
+
+    Si otro proceso rotó el archivo (cambió su inodo o ya no existe), se
+    vuelve a abrir antes de escribir en lugar de seguir escribiendo en el
+    archivo renombrado.
+
+    Args:
+        path (str): Archivo de log
+    """
+
+    def __init__(self, path):
+        super().__init__(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+
+    def emit(self, record):
+        if self.stream is not None:
+            try:
+                current = os.stat(self.baseFilename)
+                opened = os.fstat(self.stream.fileno())
+                rotated = (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+            except OSError:
+                rotated = True
+            if rotated:
+                self.stream.close()
+                self.stream = self._open()
+        super().emit(record)
+
+
+def line_level(line):
+    """Nivel de una línea de log, o None si es continuación de la anterior"""
+    match = LINE_PATTERN.match(line)
+    return match.group(1) if match else None
+
+
+def make_filter(level=None, database=None):
+    """
+    Filtro de entradas de log
+
+    Args:
+        level (str): Nivel mínimo (INFO, WARNING, ERROR...)
+        database (str): Texto (nombre de la base de datos) que debe aparecer en la entrada
+
+    Returns:
+        callable: Recibe (nivel, líneas de la entrada) y devuelve bool, o None sin filtros
+    """
+    if not level and not database:
+        return None
+    if level and level.upper() not in LEVELS:
+        raise ValueError(f"Nivel de log inválido: {level}")
+    minimum = LEVELS.index(level.upper()) if level else 0
+
+    def accept(entry_level, lines):
+        if entry_level not in LEVELS or LEVELS.index(entry_level) < minimum:
+            return False
+        return not database or any(database in line for line in lines)
+
+    return accept
+
+
+def group_entries(lines):
+    """
+    Agrupa líneas en entradas: una línea con fecha y nivel más sus continuaciones
+
+    Returns:
+        list: Tuplas (nivel o None, líneas)
+    """
+    entries = []
+    for line in lines:
+        level = line_level(line)
+        if level is not None or not entries:
+            entries.append((level, [line]))
+        else:
+            entries[-1][1].append(line)
+    return entries
+
+
+class LogTail:
+    """
+    Lector del final de un archivo de log
+
+    Args:
+        path (Path): Archivo de log
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        st = os.stat(self.path)
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def read(self, lines=50, since=None, file_id=None, level=None, database=None):
+        """
+        Últimas líneas del log, o las escritas desde `since`
+
+        Args:
+            lines (int): Máximo de líneas devueltas
+            since (int): Desplazamiento devuelto por la consulta anterior
+            file_id (int): Identificador del archivo devuelto por la consulta anterior;
+                           si cambió (el log rotó) se devuelve el final del archivo nuevo
+            level (str): Nivel mínimo de las entradas
+            database (str): Solo entradas que mencionan esta base de datos
+
+        Returns:
+            dict: logs (líneas), offset y file_id para la siguiente consulta y
+                  reset (True si no se pudo continuar desde `since`)
+        """
+        accept = make_filter(level, database)
+        try:
+            signature = self._signature()
+        except FileNotFoundError:
+            return {'logs': [], 'offset': 0, 'file_id': None, 'reset': since is not None}
+
+        key = (signature, lines, since, file_id, level, database)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        inode, size, _ = signature
+        incremental = (since is not None and since <= size and file_id in (None, inode)
+                       and size - since <= MAX_SCAN_BYTES)
+        if incremental:
+            logs, offset = self._read_from(since, size, lines, accept)
+        else:
+            logs, offset = self._read_tail(size, lines, accept)
+        result = {'logs': logs, 'offset': offset, 'file_id': inode, 'reset': since is not None and not incremental}
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    def _read_from(self, start, size, lines, accept):
+        """Líneas completas entre `start` y `size` (las últimas `lines`)"""
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(size - start)
+        # Una línea a medio escribir se devuelve en la siguiente consulta
+        end = data.rfind(b'\n') + 1
+        text = data[:end].decode('utf-8', errors='replace')
+        selected = []
+        for level, entry in group_entries([line + '\n' for line in text.split('\n')[:-1]]):
+            if accept is None or accept(level, entry):
+                selected.extend(entry)
+        return selected[-lines:] if lines else [], start + end
+
+    def _read_tail(self, size, lines, accept):
+        """Últimas `lines` líneas que pasan el filtro, leyendo hacia atrás por bloques"""
+        selected = []
+        pending = []       # continuaciones cuya línea con nivel aún no se ha leído
+        remainder = b''    # inicio de línea cortado por el bloque
+        pos = offset = size
+        with open(self.path, 'rb') as f:
+            while pos > 0 and len(selected) < lines and size - pos < MAX_SCAN_BYTES:
+                read = min(BLOCK_SIZE, pos)
+                pos -= read
+                f.seek(pos)
+                block = f.read(read) + remainder
+                parts = block.split(b'\n')
+                if pos + read == size:
+                    # Tras el último salto de línea no hay línea (o está a medio escribir)
+                    partial = parts.pop()
+                    if parts:
+                        offset = size - len(partial)
+                # La primera parte puede ser el final de una línea del bloque anterior
+                remainder = parts.pop(0) if pos > 0 and parts else b''
+                for raw in reversed(parts):
+                    line = raw.decode('utf-8', errors='replace') + '\n'
+                    level = line_level(line)
+                    if level is None:
+                        pending.insert(0, line)
+                        continue
+                    entry = [line] + pending
+                    pending = []
+                    if accept is None or accept(level, entry):
+                        selected[:0] = entry
+                        if len(selected) >= lines:
+                            break
+            if pos == 0 and pending and accept is None:
+                # Continuaciones al inicio del archivo sin línea con nivel
+                selected[:0] = pending
+        return selected[-lines:] if lines else [], offset
+
+
+def rotating_handler(path):
+    """Handler de logging con rotación por tamaño y el formato de los scripts"""
+    handler = RotatingLogHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    return handler
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Métricas de Prometheus de los backups
+
+backup_mysql.py y web_monitor.py registran cada backup, compresión y
+restauración (duración, bytes, intentos) en la tabla `operations` del
+catálogo; este módulo las expone con el formato de texto de Prometheus, que
+web_monitor.py sirve en /metrics.
+
+Para detectar un volcado que se va haciendo más lento antes de que se salga
+de su ventana, se puede alertar sobre
+    mysql_backup_last_duration_seconds / mysql_backup_duration_baseline_seconds > 1.5
+o sobre deriv(mysql_backup_last_duration_seconds[7d]).
+"""
+
+import statistics
+from datetime import datetime
+
+# Backups anteriores con los que se calcula la duración de referencia (mediana)
+BASELINE_RUNS = 7
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    # Sin notación científica: las fechas y los bytes no deben perder precisión
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(round(value, 6))
+
+
+def _db(name):
+    return {'database': name}
+
+
+def _timestamp(iso):
+    return datetime.fromisoformat(iso).timestamp() if iso else None
+
+
+class MetricsWriter:
+    """Acumula métricas en el formato de texto de Prometheus"""
+
+    def __init__(self):
+        self.lines = []
+
+    def add(self, name, kind, help_text, samples):
+        """
+        Agrega una métrica
+
+        Args:
+            name (str): Nombre de la métrica
+            kind (str): 'gauge' o 'counter'
+            help_text (str): Descripción
+            samples (list): Tuplas (etiquetas, valor); se omiten los valores None
+        """
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            self.lines.append(f"{name}{{{label_text}}} {_format(value)}" if label_text else f"{name} {_format(value)}")
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def backup_metrics(writer, catalog):
+    """Métricas del último backup de cada base de datos, del historial y del catálogo"""
+    stats = catalog.database_stats()
+    totals = catalog.operation_totals('backup')
+    databases = sorted(set(stats) | {database for database, *_ in totals})
+
+    last, baseline, attempts, latest = [], [], [], []
+    for database in databases:
+        runs = catalog.operations('backup', database, 'success', limit=BASELINE_RUNS + 1)
+        if runs:
+            last.append(runs[0])
+            previous = [r['duration_seconds'] for r in runs[1:] if r['duration_seconds']]
+            baseline.append((database, statistics.median(previous) if previous else None))
+        recent = catalog.operations('backup', database, limit=1)
+        if recent:
+            attempts.append((database, recent[0]['attempt']))
+        rows = catalog.query(database=database, limit=1)
+        if rows:
+            latest.append(rows[0])
+
+    writer.add('mysql_backup_last_success_timestamp_seconds', 'gauge',
+               'Fecha (epoch) del backup más reciente en el catálogo',
+               [(_db(d), _timestamp(s['last_created_at'])) for d, s in sorted(stats.items())])
+    writer.add('mysql_backup_last_duration_seconds', 'gauge',
+               'Duración del último backup correcto',
+               [(_db(r['database']), r['duration_seconds']) for r in last])
+    writer.add('mysql_backup_duration_baseline_seconds', 'gauge',
+               f'Mediana de la duración de los {BASELINE_RUNS} backups correctos anteriores al último',
+               [(_db(d), value) for d, value in baseline])
+    writer.add('mysql_backup_last_throughput_bytes_per_second', 'gauge',
+               'Bytes sin comprimir por segundo del último backup correcto',
+               [(_db(r['database']), r['raw_bytes'] / r['duration_seconds'])
+                for r in last if r['raw_bytes'] and r['duration_seconds']])
+    writer.add('mysql_backup_last_attempts', 'gauge',
+               'Número de intento del último backup (1 = sin reintentos)',
+               [(_db(d), value) for d, value in attempts])
+    writer.add('mysql_backup_last_raw_bytes', 'gauge',
+               'Bytes sin comprimir del backup más reciente',
+               [(_db(r['database']), r['raw_bytes']) for r in latest])
+    writer.add('mysql_backup_last_size_bytes', 'gauge',
+               'Bytes en disco del backup más reciente',
+               [(_db(r['database']), r['size']) for r in latest])
+    writer.add('mysql_backup_last_compression_ratio', 'gauge',
+               'Bytes sin comprimir / bytes en disco del backup más reciente',
+               [(_db(r['database']), r['raw_bytes'] / r['size']) for r in latest if r['raw_bytes'] and r['size']])
+    writer.add('mysql_backup_attempts_total', 'counter',
+               'Intentos de backup por resultado (success, failed, timeout)',
+               [({'database': d, 'status': status}, count) for d, status, count, _ in totals])
+    writer.add('mysql_backup_retries_total', 'counter',
+               'Intentos de backup que fueron reintentos',
+               [({'database': d, 'status': status}, retries) for d, status, _, retries in totals])
+    writer.add('mysql_backup_catalog_backups', 'gauge',
+               'Backups en el catálogo',
+               [(_db(d), s['count']) for d, s in sorted(stats.items())])
+    writer.add('mysql_backup_catalog_bytes', 'gauge',
+               'Bytes en disco de los backups del catálogo',
+               [(_db(d), s['size']) for d, s in sorted(stats.items())])
+
+
+def operation_metrics(writer, catalog, kind, help_name):
+    """Duración de la última operación correcta y totales por resultado (compresión, restauración)"""
+    totals = catalog.operation_totals(kind)
+    last = []
+    for database in sorted({database for database, *_ in totals}):
+        runs = catalog.operations(kind, database, 'success', limit=1)
+        if runs:
+            last.append(runs[0])
+    writer.add(f'mysql_backup_{kind}_last_duration_seconds', 'gauge',
+               f'Duración de la última {help_name} correcta',
+               [(_db(r['database']), r['duration_seconds']) for r in last])
+    writer.add(f'mysql_backup_{kind}_last_bytes', 'gauge',
+               f'Bytes sin comprimir de la última {help_name} correcta',
+               [(_db(r['database']), r['raw_bytes']) for r in last])
+    writer.add(f'mysql_backup_{kind}_total', 'counter',
+               f'Operaciones de {help_name} por resultado',
+               [({'database': d, 'status': status}, count) for d, status, count, _ in totals])
+
+
+def drill_metrics(writer, catalog):
+    """Resultado del último simulacro de restauración de cada base de datos"""
+    latest = {}
+    for drill in catalog.drills(limit=1000):
+        latest.setdefault(drill['database'], drill)
+    writer.add('mysql_backup_drill_last_success', 'gauge',
+               '1 si el último simulacro de restauración fue correcto',
+               [(_db(d), 1 if drill['status'] == 'ok' else 0) for d, drill in sorted(latest.items())])
+    writer.add('mysql_backup_drill_last_restore_seconds', 'gauge',
+               'Duración de la restauración del último simulacro (RTO)',
+               [(_db(d), drill['restore_seconds']) for d, drill in sorted(latest.items())])
+    writer.add('mysql_backup_drill_last_regression', 'gauge',
+               '1 si el último simulacro fue notablemente más lento que los anteriores',
+               [(_db(d), drill['regression']) for d, drill in sorted(latest.items())])
+
+
+def remote_metrics(writer, catalog):
+    """Copias remotas por estado"""
+    counts = {}
+    for upload in catalog.uploads():
+        counts[upload['status']] = counts.get(upload['status'], 0) + 1
+    writer.add('mysql_backup_remote_uploads', 'gauge',
+               'Copias remotas (S3) por estado',
+               [({'status': status}, count) for status, count in sorted(counts.items())])
+
+
+def render_metrics(catalog, extra=None):
+    """
+    Todas las métricas en formato de texto de Prometheus
+
+    Args:
+        catalog (Catalog): Catálogo de backups
+        extra (callable): Recibe el MetricsWriter para agregar métricas propias del proceso
+
+    Returns:
+        str: Cuerpo de la respuesta de /metrics
+    """
+    writer = MetricsWriter()
+    backup_metrics(writer, catalog)
+    operation_metrics(writer, catalog, 'compress', 'compresión')
+    operation_metrics(writer, catalog, 'restore', 'restauración')
+    drill_metrics(writer, catalog)
+    remote_metrics(writer, catalog)
+    if extra is not None:
+        extra(writer)
+    return writer.render()
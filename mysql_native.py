@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Motor MySQL en proceso (PyMySQL) con un pool de conexiones por servidor
+
+Por defecto cada consulta, volcado o carga lanza un cliente `mysql` o
+`mysqldump`, con su conexión TCP y autenticación. Con MYSQL_ENGINE=native
+(requiere `pip install pymysql`) se usan conexiones reutilizadas de un pool
+por servidor (el de origen y cada destino de restore_targets.json) para:
+- Consultas de metadatos (backup_mysql.run_query(), restore_drill.run_sql())
+- El DROP/CREATE DATABASE de las restauraciones
+- Los datos de cada tabla en los backups por tablas (TableDump): cursor del
+  lado del servidor y el mismo formato que `mysqldump --no-create-info`
+- La carga de los datos de cada tabla al restaurar (load_stream()), con los
+  INSERT extendidos del volcado como lotes
+
+El esquema, los objetos (triggers, rutinas, eventos, con DELIMITER), los
+backups de archivo único y LOAD DATA siguen usando mysqldump/mysql. Si
+PyMySQL no está instalado se usan los clientes y se avisa en el log.
+"""
+
+import atexit
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# 'cli' (clientes mysql/mysqldump) o 'native' (PyMySQL en proceso)
+MYSQL_ENGINE = os.environ.get('MYSQL_ENGINE', 'cli')
+
+# Conexiones máximas por servidor (los backups por tablas usan hasta
+# MAX_PARALLEL_DUMPS × MAX_PARALLEL_TABLES a la vez)
+MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', '8'))
+
+CONNECT_TIMEOUT = 30
+
+# Tamaño máximo de cada INSERT extendido (el net_buffer_length de mysqldump)
+NET_BUFFER_LENGTH = 1046528
+
+# Bloques de salida de TableDump
+CHUNK_SIZE = 1024 * 1024
+
+# Tipos de columna del protocolo de MySQL que se escriben sin comillas o como bits
+NUMERIC_TYPES = {0, 1, 2, 3, 4, 5, 8, 9, 13, 246}  # DECIMAL, TINY ... LONGLONG, INT24, YEAR, NEWDECIMAL
+BIT_TYPE = 16
+TEMPORAL_TYPES = {7, 10, 11, 12, 14}  # TIMESTAMP, DATE, TIME, DATETIME, NEWDATE
+
+# Escapes de cadenas de mysql_real_escape_string (los que usa mysqldump)
+ESCAPES = {0: b'\\0', 10: b'\\n', 13: b'\\r', 26: b'\\Z', 34: b'\\"', 39: b"\\'", 92: b'\\\\'}
+ESCAPE_PATTERN = re.compile(rb'[\x00\n\r\x1a"\'\\]')
+
+# Deja la sesión de una conexión como al abrirla (tras cargar un volcado)
+RESET_SESSION_SQL = (
+    "ROLLBACK; UNLOCK TABLES; SET NAMES utf8mb4; "
+    "SET SESSION time_zone = DEFAULT, sql_mode = DEFAULT, foreign_key_checks = DEFAULT, unique_checks = DEFAULT"
+)
+
+_warned = False
+
+
+class NativeError(Exception):
+    """Error de MySQL en el motor nativo"""
+
+
+def _driver():
+    try:
+        import pymysql
+        return pymysql
+    except ImportError:
+        return None
+
+
+def enabled():
+    """Indica si se usa el motor nativo (MYSQL_ENGINE=native y PyMySQL instalado)"""
+    global _warned
+    if MYSQL_ENGINE != 'native':
+        return False
+    if _driver() is None:
+        if not _warned:
+            logging.warning("MYSQL_ENGINE=native requiere PyMySQL (pip install pymysql): se usan los clientes mysql")
+            _warned = True
+        return False
+    return True
+
+
+def _quote(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _literal(value):
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+class ConnectionPool:
+    """
+    Conexiones reutilizables a un servidor MySQL
+
+    Se abren según se necesitan, hasta `size`; si están todas en uso se
+    espera a que se devuelva una. Las que fallan durante su uso se cierran.
+
+    Args:
+        host (str), port (int), user (str), password (str): Servidor
+        size (int): Conexiones máximas
+    """
+
+    def __init__(self, host, port, user, password, size=MYSQL_POOL_SIZE):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.password = password
+        self.size = max(1, size)
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def _connect(self):
+        pymysql = _driver()
+        # Sin conversores de lectura: los valores llegan como el texto (o los
+        # bytes) que envía el servidor, para volcarlos sin perder precisión
+        conversions = {k: v for k, v in pymysql.converters.conversions.items() if not isinstance(k, int)}
+        return pymysql.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            charset='utf8mb4',
+            autocommit=True,
+            connect_timeout=CONNECT_TIMEOUT,
+            client_flag=pymysql.constants.CLIENT.MULTI_STATEMENTS,
+            conv=conversions
+        )
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                self._condition.wait()
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = None
+                self._open += 1
+        try:
+            if conn is None:
+                return self._connect()
+            conn.ping(reconnect=True)
+            return conn
+        except Exception:
+            self._release(conn, keep=False)
+            raise
+
+    def _release(self, conn, keep):
+        if not keep and conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self._condition:
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._open -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, database=None):
+        """
+        Conexión del pool (se devuelve al salir del bloque)
+
+        Args:
+            database (str): Base de datos por defecto de la conexión
+        """
+        conn = self._acquire()
+        keep = False
+        try:
+            if database:
+                conn.select_db(database)
+            yield conn
+            keep = not getattr(conn, 'discard', False)
+        finally:
+            self._release(conn, keep)
+
+    def close(self):
+        """Cierra las conexiones libres"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, port, user, password):
+    """Pool de conexiones de un servidor (uno por host, puerto y usuario)"""
+    key = (host, str(port), user, password)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(host, port, user, password)
+        return _pools[key]
+
+
+def pool_for_target(target):
+    """Pool de un destino de restore_targets.json"""
+    return get_pool(target['host'], target['port'], target['user'], target['password'])
+
+
+def command_target(cmd):
+    """
+    Servidor y base de datos de un comando mysql (el de las restauraciones)
+
+    Returns:
+        tuple: (dict con host, port, user y password, base de datos o None)
+    """
+    target = {'host': 'localhost', 'port': 3306, 'user': 'root', 'password': ''}
+    for arg in cmd[1:]:
+        for option in ('host', 'port', 'user', 'password'):
+            if arg.startswith(f'--{option}='):
+                target[option] = arg.split('=', 1)[1]
+    database = cmd[-1] if len(cmd) > 2 and not cmd[-1].startswith('-') and cmd[-2] != '-e' else None
+    return target, database
+
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+
+
+def _text(value):
+    return value.decode('utf-8', errors='replace') if isinstance(value, (bytes, bytearray)) else str(value)
+
+
+def query(pool, sql, database=None):
+    """
+    Ejecuta una o varias sentencias (separadas por `;`)
+
+    Returns:
+        list: Filas de todos los resultados, cada una como lista de columnas (str),
+              como `mysql --batch --skip-column-names` (NULL como 'NULL')
+
+    Raises:
+        NativeError: Si MySQL devuelve un error
+    """
+    pymysql = _driver()
+    rows = []
+    try:
+        with pool.connection(database) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                while True:
+                    rows.extend(['NULL' if v is None else _text(v) for v in row] for row in cursor.fetchall())
+                    if not cursor.nextset():
+                        break
+    except pymysql.MySQLError as e:
+        raise NativeError(str(e)) from e
+    return rows
+
+
+def _escape(data):
+    return ESCAPE_PATTERN.sub(lambda m: ESCAPES[m.group()[0]], data)
+
+
+def format_value(value, type_code):
+    """Valor de una columna como literal SQL, igual que mysqldump"""
+    if value is None:
+        return b'NULL'
+    if type_code == BIT_TYPE:
+        return b"b'" + format(int.from_bytes(value, 'big'), 'b').encode('ascii') + b"'"
+    if type_code in NUMERIC_TYPES:
+        return value if isinstance(value, bytes) else str(value).encode('ascii')
+    if isinstance(value, (bytes, bytearray)):
+        # Cadenas binarias y fechas (el servidor las envía con el juego binario)
+        return (b"'" if type_code in TEMPORAL_TYPES else b"_binary '") + _escape(bytes(value)) + b"'"
+    return b"'" + _escape(value.encode('utf-8')) + b"'"
+
+
+class TableDump:
+    """
+    Datos de una tabla con el formato de `mysqldump --no-create-info --skip-triggers`
+
+    Se lee en una transacción con instantánea consistente (como
+    --single-transaction) con un cursor del lado del servidor, así que las
+    filas no se cargan en memoria. Las columnas generadas se omiten y las
+    invisibles se incluyen, con lista de columnas en los INSERT.
+
+    Args:
+        pool (ConnectionPool): Pool del servidor de origen
+        database (str): Base de datos
+        table (str): Tabla
+    """
+
+    def __init__(self, pool, database, table):
+        self.pool = pool
+        self.database = database
+        self.table = table
+
+    def __str__(self):
+        return f"mysql_native {self.database}.{self.table}"
+
+    def _columns(self, cursor):
+        cursor.execute(
+            "SELECT COLUMN_NAME, EXTRA FROM information_schema.COLUMNS "
+            f"WHERE TABLE_SCHEMA = {_literal(self.database)} AND TABLE_NAME = {_literal(self.table)} "
+            "ORDER BY ORDINAL_POSITION"
+        )
+        columns = [(_text(name), _text(extra or b'')) for name, extra in cursor.fetchall()]
+        selected = [name for name, extra in columns if 'GENERATED' not in extra.upper()]
+        explicit = len(selected) != len(columns) or any('INVISIBLE' in extra.upper() for _, extra in columns)
+        return selected, explicit
+
+    def chunks(self):
+        """
+        Itera la salida del volcado en bloques de ~CHUNK_SIZE bytes
+
+        Raises:
+            NativeError: Si MySQL devuelve un error
+        """
+        pymysql = _driver()
+        table = _quote(self.table).encode('utf-8')
+        try:
+            with self.pool.connection(self.database) as conn:
+                conn.discard = False
+                with conn.cursor() as cursor:
+                    columns, explicit = self._columns(cursor)
+                    cursor.execute("SET SESSION time_zone = '+00:00'; "
+                                   "SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    while cursor.nextset():
+                        pass
+                    cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+                try:
+                    yield self._header(table)
+                    yield from self._rows(conn, table, columns, explicit)
+                    yield self._footer(table)
+                finally:
+                    # Si se abandona a medias la lectura queda pendiente: no reutilizar
+                    conn.discard = True
+                    try:
+                        conn.rollback()
+                        with conn.cursor() as cursor:
+                            cursor.execute("SET SESSION time_zone = DEFAULT")
+                        conn.discard = False
+                    except Exception:
+                        pass
+        except pymysql.MySQLError as e:
+            raise NativeError(f"{self.database}.{self.table}: {str(e)}") from e
+
+    def _rows(self, conn, table, columns, explicit):
+        pymysql = _driver()
+        column_list = b' (' + b','.join(_quote(c).encode('utf-8') for c in columns) + b')' if explicit else b''
+        prefix = b'INSERT INTO ' + table + column_list + b' VALUES '
+        select = f"SELECT {', '.join(_quote(c) for c in columns)} FROM {_quote(self.table)}"
+        out, statement = [], []
+        out_size = statement_size = 0
+        with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(select)
+            types = [d[1] for d in cursor.description]
+            for row in cursor:
+                values = b'(' + b','.join(format_value(v, t) for v, t in zip(row, types)) + b')'
+                if statement and statement_size + len(values) + 1 > NET_BUFFER_LENGTH:
+                    line = prefix + b','.join(statement) + b';\n'
+                    out.append(line)
+                    out_size += len(line)
+                    statement, statement_size = [], 0
+                    if out_size >= CHUNK_SIZE:
+                        yield b''.join(out)
+                        out, out_size = [], 0
+                statement.append(values)
+                statement_size += len(values) + 1
+        if statement:
+            out.append(prefix + b','.join(statement) + b';\n')
+        if out:
+            yield b''.join(out)
+
+    def _header(self, table):
+        return (
+            f"-- MySQL dump (mysql_native)\n--\n-- Host: {self.pool.host}    Database: {self.database}\n"
+            "-- ------------------------------------------------------\n\n"
+            "/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;\n"
+            "/*!40101 SET NAMES utf8mb4 */;\n"
+            "/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */;\n"
+            "/*!40103 SET TIME_ZONE='+00:00' */;\n"
+            "/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n"
+            "/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n"
+            "/*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;\n\n"
+        ).encode('utf-8') + (
+            b"--\n-- Dumping data for table " + table + b"\n--\n\n"
+            b"LOCK TABLES " + table + b" WRITE;\n"
+            b"/*!40000 ALTER TABLE " + table + b" DISABLE KEYS */;\n"
+        )
+
+    def _footer(self, table):
+        return (
+            b"/*!40000 ALTER TABLE " + table + b" ENABLE KEYS */;\n"
+            b"UNLOCK TABLES;\n"
+            b"/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;\n\n"
+            b"/*!40101 SET SQL_MODE=@OLD_SQL_MODE */;\n"
+            b"/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n"
+            b"/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;\n"
+            b"/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;\n\n"
+        ) + f"-- Dump completed on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n".encode('utf-8')
+
+
+def iter_statements(chunks):
+    """
+    Sentencias de un volcado de datos (terminadas en `;` al final de una línea)
+
+    Solo para SQL sin DELIMITER (datos de tablas, INSERT generados, ALTER):
+    los saltos de línea dentro de las cadenas van escapados.
+    """
+    pending, lines = b'', []
+    for chunk in chunks:
+        parts = (pending + chunk).split(b'\n')
+        pending = parts.pop()
+        for line in parts:
+            if not lines and (not line.strip() or line.startswith(b'--')):
+                continue
+            lines.append(line)
+            if line.rstrip().endswith(b';'):
+                yield b'\n'.join(lines)
+                lines = []
+    if pending.strip() and not pending.startswith(b'--'):
+        lines.append(pending)
+    if lines:
+        yield b'\n'.join(lines)
+
+
+def load_stream(chunks, label, restore_cmd, timeout=None, tracker=None):
+    """
+    Ejecuta el SQL de una unidad de datos con una conexión del pool
+
+    Equivale a restore_engine.load_stream() con el cliente mysql: la base de
+    datos y el servidor se toman de `restore_cmd` y, con `--force`, un error
+    no detiene la carga (se informa al final).
+
+    Returns:
+        float: Duración en segundos
+
+    Raises:
+        NativeError: Si alguna sentencia falla
+        subprocess.TimeoutExpired: Si se supera `timeout` (entre sentencias)
+    """
+    pymysql = _driver()
+    target, database = command_target(restore_cmd)
+    force = '--force' in restore_cmd
+    start = time.monotonic()
+    deadline = start + timeout if timeout else None
+    errors = []
+
+    def counted():
+        for chunk in chunks:
+            if tracker is not None:
+                tracker.add_bytes(len(chunk))
+            yield chunk
+
+    with pool_for_target(target).connection(database) as conn:
+        try:
+            with conn.cursor() as cursor:
+                for statement in iter_statements(counted()):
+                    if deadline and time.monotonic() > deadline:
+                        raise subprocess.TimeoutExpired(label, timeout)
+                    if b'sql_log_bin' in statement:
+                        # No se puede restablecer sin privilegios: no reutilizar la conexión
+                        conn.discard = True
+                    try:
+                        cursor.execute(statement)
+                    except pymysql.MySQLError as e:
+                        if not force:
+                            raise NativeError(f"{label}: {str(e)}") from e
+                        errors.append(str(e))
+                cursor.execute(RESET_SESSION_SQL)
+                while cursor.nextset():
+                    pass
+        except pymysql.MySQLError as e:
+            raise NativeError(f"{label}: {str(e)}") from e
+        except BaseException:
+            conn.discard = True
+            raise
+
+    if errors:
+        raise NativeError(f"{label}: {len(errors)} errores, el primero: {errors[0]}")
+    return time.monotonic() - start
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Copia de los backups en almacenamiento de objetos compatible con S3
+
+Cliente S3 mínimo (firma AWS Signature V4 con la biblioteca estándar, sin
+boto3) probado con AWS S3 y MinIO:
+- MultipartUpload sube un flujo por partes de S3_PART_SIZE, S3_PARALLEL_UPLOADS
+  a la vez. backup_mysql.py le envía la salida del compresor mientras escribe
+  el archivo local, así que el backup no se vuelve a leer del disco.
+- upload_backup() sube un backup ya escrito (por tablas, o el reintento de
+  una subida fallida).
+
+El estado de cada subida queda en la tabla `uploads` del catálogo, con su
+propia retención (REMOTE_RETENTION_DAYS) independiente de la local.
+
+Para probar contra un MinIO local:
+    docker run -p 9000:9000 minio/minio server /data
+    S3_ENDPOINT=http://localhost:9000 S3_BUCKET=backups S3_ACCESS_KEY=minioadmin \\
+        S3_SECRET_KEY=minioadmin python object_storage.py sync
+"""
+
+import hashlib
+import hmac
+import http.client
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+from xml.sax.saxutils import escape
+
+from backup_layout import is_chunked_backup, is_dedup_backup, read_manifest, sidecar_paths
+
+# Conexión (vacío S3_BUCKET = sin copia remota)
+S3_ENDPOINT = os.environ.get('S3_ENDPOINT', 'https://s3.amazonaws.com')
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY', '')
+S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY', '')
+S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+S3_PREFIX = os.environ.get('S3_PREFIX', 'mysql-backups/')
+
+# Multipart: tamaño de parte (S3 exige al menos 5 MiB salvo en la última) y
+# partes subidas a la vez; la memoria usada es de unas S3_PART_SIZE × (S3_PARALLEL_UPLOADS + 1)
+S3_PART_SIZE = int(os.environ.get('S3_PART_SIZE', str(16 * 1024 * 1024)))
+S3_PARALLEL_UPLOADS = int(os.environ.get('S3_PARALLEL_UPLOADS', '4'))
+
+# Días que se conservan los backups remotos (0 = sin límite)
+REMOTE_RETENTION_DAYS = int(os.environ.get('REMOTE_RETENTION_DAYS', '365'))
+
+# Reintentos de cada petición (errores de red y respuestas 5xx)
+REQUEST_ATTEMPTS = 3
+REQUEST_TIMEOUT = 300
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+class StorageError(Exception):
+    """Error de una petición al almacenamiento de objetos"""
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sign_request(method, host, path, query, headers, payload_hash, access_key, secret_key, region, now):
+    """
+    Firma una petición con AWS Signature Version 4
+
+    Args:
+        method (str): Método HTTP
+        host (str): Cabecera Host
+        path (str): Ruta ya codificada (p.ej. /bucket/clave)
+        query (dict): Parámetros de la query (sin codificar)
+        headers (dict): Cabeceras a firmar además de host, x-amz-date y x-amz-content-sha256
+        payload_hash (str): SHA-256 del cuerpo en hexadecimal
+        now (datetime): Instante de la petición (UTC)
+
+    Returns:
+        dict: Cabeceras a enviar, incluida Authorization
+    """
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date = now.strftime('%Y%m%d')
+    signed = {k.lower(): str(v).strip() for k, v in headers.items()}
+    signed.update({'host': host, 'x-amz-date': amz_date, 'x-amz-content-sha256': payload_hash})
+    names = sorted(signed)
+
+    canonical_query = '&'.join(
+        f"{quote(str(k), safe='-_.~')}={quote(str(v), safe='-_.~')}" for k, v in sorted(query.items())
+    )
+    canonical_request = '\n'.join([
+        method,
+        path,
+        canonical_query,
+        ''.join(f"{name}:{signed[name]}\n" for name in names),
+        ';'.join(names),
+        payload_hash
+    ])
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256',
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    ])
+    key = _hmac(_hmac(_hmac(_hmac(f"AWS4{secret_key}".encode('utf-8'), date), region), 's3'), 'aws4_request')
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    signed['authorization'] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={';'.join(names)}, Signature={signature}"
+    )
+    return signed
+
+
+class S3Client:
+    """
+    Cliente S3 (direccionamiento por ruta: endpoint/bucket/clave)
+
+    Args:
+        endpoint (str): URL del servicio (https://s3.amazonaws.com, http://minio:9000...)
+        bucket (str): Bucket
+        access_key (str): Clave de acceso
+        secret_key (str): Clave secreta
+        region (str): Región de la firma
+    """
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, region='us-east-1'):
+        url = urlsplit(endpoint)
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+
+    def _path(self, key=''):
+        return '/' + quote(self.bucket, safe='') + ('/' + quote(key, safe='/-_.~') if key else '')
+
+    def request(self, method, key='', query=None, body=b'', headers=None):
+        """
+        Petición firmada, con reintentos ante errores de red o 5xx
+
+        Returns:
+            tuple: (código HTTP, cabeceras, cuerpo)
+
+        Raises:
+            StorageError: Si la respuesta es un error
+        """
+        query = query or {}
+        path = self._path(key)
+        url = path + ('?' + '&'.join(
+            f"{quote(str(k), safe='-_.~')}={quote(str(v), safe='-_.~')}" for k, v in sorted(query.items())
+        ) if query else '')
+        payload_hash = hashlib.sha256(body).hexdigest() if body else EMPTY_SHA256
+
+        for attempt in range(1, REQUEST_ATTEMPTS + 1):
+            signed = sign_request(
+                method, self.host, path, query, headers or {}, payload_hash,
+                self.access_key, self.secret_key, self.region, datetime.now(timezone.utc)
+            )
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            connection = connection_class(self.host, timeout=REQUEST_TIMEOUT)
+            try:
+                connection.request(method, url, body=body, headers=dict(signed, **{'content-length': str(len(body))}))
+                response = connection.getresponse()
+                data = response.read()
+                status, response_headers = response.status, {k.lower(): v for k, v in response.getheaders()}
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == REQUEST_ATTEMPTS:
+                    raise StorageError(f"{method} {key}: {str(e)}")
+                time.sleep(2 ** attempt)
+                continue
+            finally:
+                connection.close()
+
+            if status >= 500 and attempt < REQUEST_ATTEMPTS:
+                time.sleep(2 ** attempt)
+                continue
+            # CompleteMultipartUpload puede devolver 200 con un error en el cuerpo
+            if status >= 300 or (method == 'POST' and b'<Error>' in data[:200]):
+                code = re.search(rb'<Code>([^<]*)</Code>', data)
+                raise StorageError(f"{method} {key}: HTTP {status} {code.group(1).decode() if code else data[:200]!r}")
+            return status, response_headers, data
+
+    def put_object(self, key, body):
+        """Sube un objeto pequeño en una sola petición"""
+        self.request('PUT', key, body=body)
+
+    def delete_object(self, key):
+        """Elimina un objeto (no falla si no existe)"""
+        self.request('DELETE', key)
+
+    def create_multipart_upload(self, key):
+        """Inicia una subida multipart y devuelve su UploadId"""
+        _, _, data = self.request('POST', key, {'uploads': ''})
+        match = re.search(rb'<UploadId>([^<]+)</UploadId>', data)
+        if match is None:
+            raise StorageError(f"CreateMultipartUpload {key}: respuesta sin UploadId")
+        return match.group(1).decode()
+
+    def upload_part(self, key, upload_id, number, body):
+        """Sube una parte y devuelve su ETag"""
+        _, headers, _ = self.request('PUT', key, {'partNumber': number, 'uploadId': upload_id}, body)
+        return headers['etag']
+
+    def complete_multipart_upload(self, key, upload_id, etags):
+        """Completa una subida multipart con los ETag de las partes en orden"""
+        parts = ''.join(
+            f"<Part><PartNumber>{n}</PartNumber><ETag>{escape(etag)}</ETag></Part>"
+            for n, etag in enumerate(etags, 1)
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode('utf-8')
+        self.request('POST', key, {'uploadId': upload_id}, body)
+
+    def abort_multipart_upload(self, key, upload_id):
+        """Cancela una subida multipart (S3 libera las partes ya subidas)"""
+        self.request('DELETE', key, {'uploadId': upload_id})
+
+
+class MultipartUpload:
+    """
+    Escritor (write/close) que sube un flujo a S3 por partes en paralelo
+
+    La subida multipart solo se inicia si el flujo supera una parte; si no,
+    close() sube el objeto en una sola petición. El objeto no aparece en el
+    bucket hasta close() (o finish(), que no lanza excepciones); abort()
+    cancela la subida.
+
+    Args:
+        client (S3Client): Cliente S3
+        key (str): Clave del objeto
+        part_size (int): Tamaño de cada parte
+        parallel (int): Partes subidas a la vez
+    """
+
+    def __init__(self, client, key, part_size=S3_PART_SIZE, parallel=S3_PARALLEL_UPLOADS):
+        self.client = client
+        self.key = key
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.size = 0
+        self._parallel = max(1, parallel)
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._executor = None
+        self._parts = []
+        self.error = None
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _submit(self, body):
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(self.key)
+            self._executor = ThreadPoolExecutor(max_workers=self._parallel, thread_name_prefix='upload')
+        number = len(self._parts) + 1
+        self._parts.append(self._executor.submit(self.client.upload_part, self.key, self._upload_id, number, body))
+        # Acota la memoria: como mucho `parallel` partes pendientes
+        pending = [p for p in self._parts if not p.done()]
+        if len(pending) >= self._parallel:
+            pending[0].result()
+        # Un error en una parte se detecta cuanto antes
+        for part in self._parts:
+            if part.done():
+                part.result()
+
+    def close(self):
+        """Sube lo que falta y completa el objeto"""
+        try:
+            if self._upload_id is None:
+                self.client.put_object(self.key, bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._submit(bytes(self._buffer))
+                etags = [part.result() for part in self._parts]
+                self.client.complete_multipart_upload(self.key, self._upload_id, etags)
+            self._buffer = bytearray()
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+
+    def fail(self, error):
+        """Cancela la subida y guarda el motivo (ver finish())"""
+        self.error = error
+        self.abort()
+
+    def finish(self):
+        """
+        Completa la subida si no falló antes
+
+        Returns:
+            Exception: Error de la subida, o None si terminó bien
+        """
+        if self.error is None:
+            try:
+                self.close()
+            except Exception as e:
+                self.error = e
+        return self.error
+
+    def abort(self):
+        """Cancela la subida sin dejar partes huérfanas"""
+        self._buffer = bytearray()
+        if self._executor is not None:
+            for part in self._parts:
+                part.cancel()
+            self._executor.shutdown(wait=True)
+        if self._upload_id is not None:
+            try:
+                self.client.abort_multipart_upload(self.key, self._upload_id)
+            except StorageError as e:
+                logging.warning(f"No se pudo cancelar la subida de {self.key}: {str(e)}")
+            self._upload_id = None
+
+
+class TeeWriter:
+    """
+    Archivo que escribe en disco y, a la vez, en una subida a S3
+
+    Si la subida falla se cancela y se deja de enviar a S3, pero el archivo
+    local se sigue escribiendo: un fallo remoto no hace fallar el backup.
+
+    Args:
+        file: Archivo local abierto en modo binario
+        upload (MultipartUpload): Subida que recibe una copia de los datos
+    """
+
+    def __init__(self, file, upload):
+        self.file = file
+        self.upload = upload
+
+    def write(self, data):
+        self.file.write(data)
+        if self.upload.error is None:
+            try:
+                self.upload.write(data)
+            except Exception as e:
+                self.upload.fail(e)
+        return len(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+class ObjectStorage:
+    """
+    Copia remota de los backups
+
+    Args:
+        client (S3Client): Cliente S3
+        prefix (str): Prefijo de las claves en el bucket
+    """
+
+    def __init__(self, client, prefix=S3_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def key_for(self, name):
+        """Clave remota de un archivo de backup"""
+        return f"{self.prefix}{name}"
+
+    def open_upload(self, name):
+        """Subida multipart de un archivo de backup (ver MultipartUpload)"""
+        return MultipartUpload(self.client, self.key_for(name))
+
+    def upload_file(self, path, name):
+        """
+        Sube un archivo del disco
+
+        Returns:
+            int: Bytes subidos
+        """
+        upload = self.open_upload(name)
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(upload.part_size)
+                    if not chunk:
+                        break
+                    upload.write(chunk)
+        except BaseException:
+            upload.abort()
+            raise
+        upload.close()
+        return upload.size
+
+    def upload_backup(self, path):
+        """
+        Sube un backup ya escrito: archivo único (con su .sha256 e índice) o directorio por tablas
+
+        Returns:
+            tuple: (claves subidas, bytes subidos)
+
+        Raises:
+            ValueError: Si el backup es deduplicado (sus fragmentos se comparten
+                        entre backups y no se suben)
+        """
+        path = Path(path)
+        if is_dedup_backup(path):
+            raise ValueError("Los backups deduplicados no se suben al almacenamiento remoto")
+        if is_chunked_backup(path):
+            manifest = read_manifest(path)
+            parts = [manifest['schema']['file'], *(t['file'] for t in manifest['tables']), manifest['objects']['file']]
+            files = [(path / part, f"{path.name}/{part}") for part in parts]
+            # El manifest al final: un backup remoto sin manifest está incompleto
+            files.append((path / 'manifest.json', f"{path.name}/manifest.json"))
+        else:
+            files = [(path, path.name)]
+            files.extend((sidecar, sidecar.name) for sidecar in sidecar_paths(path) if sidecar.exists())
+
+        keys, size = [], 0
+        for file_path, name in files:
+            size += self.upload_file(file_path, name)
+            keys.append(self.key_for(name))
+        return keys, size
+
+    def delete(self, keys):
+        """Elimina objetos remotos"""
+        for key in keys:
+            self.client.delete_object(key)
+
+
+def open_storage():
+    """
+    Almacenamiento remoto configurado por variables de entorno
+
+    Returns:
+        ObjectStorage: o None si S3_BUCKET no está configurado
+    """
+    if not S3_BUCKET:
+        return None
+    return ObjectStorage(S3Client(S3_ENDPOINT, S3_BUCKET, S3_ACCESS_KEY, S3_SECRET_KEY, S3_REGION))
+
+
+def sync_uploads(storage, catalog, backup_dir):
+    """
+    Sube los backups del catálogo que aún no tienen copia remota (o cuya
+    subida falló), desde el disco
+
+    Los backups más antiguos que REMOTE_RETENTION_DAYS no se suben: su copia
+    remota ya se eliminó (o se eliminaría en seguida).
+
+    Returns:
+        tuple: (subidos, fallidos)
+    """
+    uploaded = failed = 0
+    since = remote_cutoff()
+    for row in catalog.pending_uploads(since):
+        if row['layout'] == 'dedup':
+            continue
+        path = Path(backup_dir) / row['filename']
+        try:
+            keys, size = storage.upload_backup(path)
+        except Exception as e:
+            failed += 1
+            catalog.record_upload(row['filename'], row['database'], row['created_at'], [], 0, 'failed', str(e))
+            logging.warning(f"✗ No se pudo subir {row['filename']}: {str(e)}")
+            continue
+        uploaded += 1
+        catalog.record_upload(row['filename'], row['database'], row['created_at'], keys, size, 'uploaded')
+        logging.info(f"✓ Subido {row['filename']} ({size / (1024 * 1024):.2f} MB)")
+    return uploaded, failed
+
+
+def remote_cutoff(days=REMOTE_RETENTION_DAYS):
+    """Fecha ISO desde la que se conservan los backups remotos (None sin límite)"""
+    return (datetime.now() - timedelta(days=days)).isoformat() if days else None
+
+
+def apply_remote_retention(storage, catalog, days=REMOTE_RETENTION_DAYS):
+    """
+    Elimina las copias remotas más antiguas que `days` días (y los registros
+    de subidas fallidas igual de antiguas)
+
+    Returns:
+        int: Backups remotos eliminados
+    """
+    cutoff = remote_cutoff(days)
+    if cutoff is None:
+        return 0
+    removed = 0
+    for upload in catalog.uploads(before=cutoff):
+        try:
+            storage.delete(upload['keys'])
+        except StorageError as e:
+            logging.warning(f"No se pudo eliminar la copia remota de {upload['filename']}: {str(e)}")
+            continue
+        catalog.remove_upload(upload['filename'])
+        if upload['status'] == 'uploaded':
+            removed += 1
+            logging.info(f"Eliminada copia remota antigua: {upload['filename']}")
+    return removed
+
+
+def main(argv):
+    from catalog import open_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(argv) < 1 or argv[0] not in ('sync', 'retention'):
+        print("Uso: python object_storage.py sync|retention [directorio_de_backups]")
+        return 2
+    storage = open_storage()
+    if storage is None:
+        print("Almacenamiento remoto no configurado (S3_BUCKET)")
+        return 2
+    backup_dir = Path(argv[1] if len(argv) > 1 else 'backups')
+    catalog = open_catalog(backup_dir)
+    if argv[0] == 'retention':
+        print(f"Copias remotas eliminadas: {apply_remote_retention(storage, catalog)}")
+        return 0
+    uploaded, failed = sync_uploads(storage, catalog, backup_dir)
+    print(f"Subidos: {uploaded}, fallidos: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Seguimiento del progreso de volcados y restauraciones en curso
+
+Cada operación tiene un ProgressTracker que cuenta bytes, tablas y filas
+(aproximadas) y calcula la velocidad y el tiempo restante estimado.
+ProgressRegistry agrupa las operaciones de un proceso y, si se le indica un
+archivo, publica su estado en JSON para que otro proceso (el monitor web)
+pueda leerlo.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Encabezado que mysqldump escribe antes de los datos de cada tabla
+DUMP_TABLE_MARKER = b'-- Dumping data for table `'
+# Separador de filas en los INSERT extendidos de mysqldump
+ROW_SEPARATOR = b'),('
+INSERT_MARKER = b'INSERT INTO '
+
+# Segundos mínimos entre escrituras del archivo de progreso
+WRITE_INTERVAL = 1.0
+
+# Segundos que una operación terminada sigue visible
+FINISHED_TTL = 30.0
+
+# Segundos sin actualizar el archivo tras los que se marca como obsoleto
+STALE_AFTER = 60.0
+
+
+class ProgressTracker:
+    """
+    Progreso de una operación
+
+    Args:
+        name (str): Nombre de la operación (p.ej. la base de datos)
+        kind (str): 'dump' o 'restore'
+        total_bytes (int): Bytes esperados, para estimar el tiempo restante
+        total_tables (int): Tablas esperadas
+        on_change (callable): on_change(force) tras cada actualización
+    """
+
+    def __init__(self, name, kind, total_bytes=None, total_tables=None, on_change=None):
+        self.name = name
+        self.kind = kind
+        self.total_bytes = total_bytes
+        self.total_tables = total_tables
+        self.stage = kind
+        self.status = 'running'
+        self.bytes = 0
+        self.tables = 0
+        self.rows = 0
+        self.started_at = datetime.now().isoformat()
+        self.finished = None
+        self._start = time.monotonic()
+        self._tail = b''
+        self._lock = threading.Lock()
+        self._on_change = on_change
+
+    def _changed(self, force=False):
+        if self._on_change is not None:
+            self._on_change(force)
+
+    def add_bytes(self, count):
+        """Suma bytes procesados"""
+        with self._lock:
+            self.bytes += count
+        self._changed()
+
+    def scan_dump(self, chunk):
+        """
+        Suma los bytes de un bloque de volcado y cuenta tablas y filas en él
+
+        Las filas se estiman contando los separadores de los INSERT
+        extendidos, sin interpretar el SQL.
+        """
+        # Se conserva el final del bloque anterior por si un marcador quedó partido
+        data = self._tail + chunk
+        tail_size = len(DUMP_TABLE_MARKER) - 1
+        with self._lock:
+            self.bytes += len(chunk)
+            self.tables += data.count(DUMP_TABLE_MARKER) - self._tail.count(DUMP_TABLE_MARKER)
+            self.rows += data.count(ROW_SEPARATOR) - self._tail.count(ROW_SEPARATOR)
+            self.rows += data.count(INSERT_MARKER) - self._tail.count(INSERT_MARKER)
+            self._tail = data[-tail_size:]
+        self._changed()
+
+    def add_table(self):
+        """Cuenta una tabla terminada"""
+        with self._lock:
+            self.tables += 1
+        self._changed()
+
+    def set_stage(self, stage, total_bytes=None, total_tables=None, restart=False):
+        """
+        Cambia la etapa actual (p.ej. 'split', 'load')
+
+        Con `restart` se reinician los bytes y el reloj, para que la velocidad
+        y el ETA midan solo la nueva etapa.
+        """
+        with self._lock:
+            self.stage = stage
+            if total_bytes is not None:
+                self.total_bytes = total_bytes
+            if total_tables is not None:
+                self.total_tables = total_tables
+            if restart:
+                self.bytes = 0
+                self._start = time.monotonic()
+        self._changed()
+
+    def finish(self, status='success'):
+        """Marca la operación como terminada"""
+        with self._lock:
+            self.status = status
+            self.finished = time.monotonic()
+        # El final siempre se publica para no dejar un estado obsoleto
+        self._changed(force=True)
+
+    def snapshot(self):
+        """
+        Estado actual de la operación
+
+        Returns:
+            dict: bytes, tablas, filas, MB/s y ETA en segundos (None si no hay total)
+        """
+        with self._lock:
+            elapsed = (self.finished or time.monotonic()) - self._start
+            rate = self.bytes / elapsed if elapsed > 0 else 0
+            eta = None
+            if self.status == 'running' and self.total_bytes and rate > 0:
+                eta = max(0.0, (self.total_bytes - self.bytes) / rate)
+            return {
+                'name': self.name,
+                'kind': self.kind,
+                'stage': self.stage,
+                'status': self.status,
+                'started_at': self.started_at,
+                'bytes': self.bytes,
+                'total_bytes': self.total_bytes,
+                'tables': self.tables,
+                'total_tables': self.total_tables,
+                'rows': self.rows,
+                'elapsed_seconds': round(elapsed, 1),
+                'mb_per_s': round(rate / (1024 * 1024), 2),
+                'eta_seconds': round(eta, 1) if eta is not None else None
+            }
+
+
+class ProgressRegistry:
+    """
+    Conjunto de operaciones en curso de un proceso
+
+    Args:
+        path (Path): Archivo JSON donde publicar el estado (opcional)
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+
+    def start(self, name, kind, total_bytes=None, total_tables=None):
+        """Registra y devuelve un tracker nuevo (reemplaza uno con el mismo nombre y tipo)"""
+        tracker = ProgressTracker(name, kind, total_bytes, total_tables, on_change=self._publish)
+        with self._lock:
+            self._trackers[(kind, name)] = tracker
+        self._publish(force=True)
+        return tracker
+
+    def snapshot(self):
+        """Estado de las operaciones en curso y de las terminadas recientemente"""
+        now = time.monotonic()
+        with self._lock:
+            for key, tracker in list(self._trackers.items()):
+                if tracker.finished is not None and now - tracker.finished > FINISHED_TTL:
+                    del self._trackers[key]
+            trackers = list(self._trackers.values())
+        return [tracker.snapshot() for tracker in trackers]
+
+    def _publish(self, force=False):
+        if self.path is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write < WRITE_INTERVAL:
+                return
+            self._last_write = now
+        data = {'updated_at': datetime.now().isoformat(), 'operations': self.snapshot()}
+        tmp_path = self.path.with_name(f"{self.path.name}.{threading.get_ident()}.part")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def flush(self):
+        """Publica el estado inmediatamente"""
+        self._publish(force=True)
+
+
+def read_progress_file(path):
+    """
+    Lee el estado publicado por otro proceso
+
+    Las operaciones terminadas hace más de FINISHED_TTL se omiten y las que
+    siguen en curso sin actualizaciones recientes se marcan con `stale`
+    (el volcado puede estar detenido o el proceso haber muerto).
+
+    Returns:
+        list: Operaciones, o lista vacía si no hay archivo
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        age = (datetime.now() - datetime.fromisoformat(data['updated_at'])).total_seconds()
+    except (OSError, ValueError, KeyError):
+        return []
+    operations = []
+    for operation in data.get('operations', []):
+        if operation['status'] != 'running':
+            if age > FINISHED_TTL:
+                continue
+        else:
+            operation['stale'] = age > STALE_AFTER
+        operations.append(operation)
+    return operations
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Simulacros de restauración
+
+Restaura periódicamente el backup más reciente de cada base de datos en una
+base de datos temporal (`drill_<db>`) de un servidor de pruebas y comprueba
+que el backup sirve:
+- El SHA-256 del volcado coincide con el registrado al crearlo (integrity.py)
+- Cada tabla restaurada tiene las mismas filas que el volcado
+- Se mide la duración de la restauración y el rendimiento (MB/s)
+
+El historial queda en la tabla `drills` del catálogo: da el tiempo real de
+recuperación (RTO) de cada base de datos y avisa si una restauración es
+mucho más lenta que las anteriores.
+
+El servidor se elige con DRILL_TARGET (índice en restore_targets.json) o con
+DRILL_HOST/DRILL_PORT/DRILL_USER/DRILL_PASSWORD (p.ej. un MySQL local):
+    python restore_drill.py [--target N] [base_de_datos ...]
+"""
+
+import json
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import bulk_load
+import integrity
+import mysql_native
+import restore_engine
+from backup_layout import is_chunked_backup, is_dedup_backup, read_manifest
+from compression import codec_for_path, get_codec
+from dedup_store import open_backup
+
+TARGETS_FILE = Path('/app/restore_targets.json')
+
+# Servidor de los simulacros: índice en restore_targets.json o conexión directa
+DRILL_TARGET = os.environ.get('DRILL_TARGET', '')
+DRILL_HOST = os.environ.get('DRILL_HOST', '')
+DRILL_PORT = os.environ.get('DRILL_PORT', '3306')
+DRILL_USER = os.environ.get('DRILL_USER', 'root')
+DRILL_PASSWORD = os.environ.get('DRILL_PASSWORD', '')
+
+# Prefijo de las bases de datos temporales (nunca se restaura sobre la original)
+DRILL_PREFIX = 'drill_'
+
+# Conservar la base de datos temporal tras el simulacro (para inspeccionarla)
+DRILL_KEEP = os.environ.get('DRILL_KEEP', 'false').lower() in ('1', 'true', 'yes')
+
+# Conexiones simultáneas de la restauración (como en el monitor web)
+DRILL_PARALLELISM = int(os.environ.get('DRILL_PARALLELISM', os.environ.get('RESTORE_PARALLELISM', '4')))
+
+# Regresión: rendimiento menor que la mediana de los últimos DRILL_BASELINE
+# simulacros correctos dividida por DRILL_REGRESSION_FACTOR
+DRILL_BASELINE = 5
+DRILL_REGRESSION_FACTOR = float(os.environ.get('DRILL_REGRESSION_FACTOR', '1.5'))
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Sentencias INSERT de mysqldump y, dentro de ellas, cadenas y separadores de filas
+INSERT_PATTERN = re.compile(rb'^INSERT INTO `((?:[^`]|``)+)` VALUES ')
+ROW_TOKEN = re.compile(rb"'(?:[^'\\]|\\.)*'|\),\(")
+
+
+class DrillError(Exception):
+    """El backup no se pudo verificar o restaurar"""
+
+
+def load_target(index=None):
+    """
+    Servidor donde restaurar los simulacros
+
+    Args:
+        index (int): Índice en restore_targets.json (por defecto DRILL_TARGET)
+
+    Returns:
+        dict: name, host, port, user y password
+
+    Raises:
+        ValueError: Si no hay ningún servidor configurado
+    """
+    if index is None and DRILL_HOST:
+        return {'name': f'{DRILL_HOST}:{DRILL_PORT}', 'host': DRILL_HOST, 'port': DRILL_PORT,
+                'user': DRILL_USER, 'password': DRILL_PASSWORD}
+    if index is None:
+        if not DRILL_TARGET:
+            raise ValueError("No hay servidor para los simulacros: configura DRILL_TARGET o DRILL_HOST")
+        index = int(DRILL_TARGET)
+    with open(TARGETS_FILE, 'r', encoding='utf-8') as f:
+        targets = json.load(f).get('databases', [])
+    if not 0 <= index < len(targets):
+        raise ValueError(f"Índice de destino inválido: {index}")
+    return targets[index]
+
+
+def mysql_command(target, *args):
+    """Comando mysql para el servidor de los simulacros"""
+    return [
+        'mysql',
+        f'--host={target["host"]}',
+        f'--port={target["port"]}',
+        f'--user={target["user"]}',
+        f'--password={target["password"]}',
+        '--skip-ssl',
+        *args
+    ]
+
+
+def run_sql(target, sql, database=None):
+    """
+    Ejecuta SQL en el servidor de los simulacros
+
+    Returns:
+        list: Filas devueltas, cada una como lista de columnas (str)
+    """
+    if mysql_native.enabled():
+        try:
+            return mysql_native.query(mysql_native.pool_for_target(target), sql, database)
+        except mysql_native.NativeError as e:
+            raise DrillError(f"Error de mysql: {str(e)}") from e
+    cmd = mysql_command(target, '--batch', '--skip-column-names', '-e', sql)
+    if database:
+        cmd.append(database)
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    if result.returncode != 0:
+        raise DrillError(f"Error de mysql: {result.stderr.strip()}")
+    return [line.split('\t') for line in result.stdout.splitlines() if line]
+
+
+def count_dump_rows(reader, counts=None):
+    """
+    Cuenta las filas de cada tabla en los INSERT de un volcado
+
+    Las filas de un INSERT extendido se separan con `),(`; las cadenas se
+    saltan para no contar separadores que aparezcan dentro de los datos.
+
+    Args:
+        reader: Flujo sin comprimir con read()
+        counts (dict): Conteos a los que sumar (para backups por tablas)
+
+    Returns:
+        dict: {tabla: filas}
+    """
+    counts = {} if counts is None else counts
+    buffer = b''
+    while True:
+        chunk = reader.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (buffer + chunk).split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            _count_line(line, counts)
+    _count_line(buffer, counts)
+    return counts
+
+
+def count_tsv_rows(reader):
+    """Filas de un archivo TSV: una por línea (los saltos de línea de los datos van escapados)"""
+    rows = 0
+    while True:
+        chunk = reader.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return rows
+        rows += chunk.count(b'\n')
+
+
+def _count_line(line, counts):
+    match = INSERT_PATTERN.match(line)
+    if match is None:
+        return
+    table = match.group(1).replace(b'``', b'`').decode('utf-8', errors='replace')
+    separators = sum(1 for token in ROW_TOKEN.findall(line, match.end()) if token == b'),(')
+    counts[table] = counts.get(table, 0) + separators + 1
+
+
+def expected_rows(backup_path):
+    """
+    Filas por tabla según el volcado de un backup (cualquier formato)
+
+    Returns:
+        dict: {tabla: filas}
+    """
+    backup_path = Path(backup_path)
+    if is_chunked_backup(backup_path):
+        manifest = read_manifest(backup_path)
+        codec = get_codec(manifest['codec'])
+        counts = {t['name']: 0 for t in manifest['tables']}
+        for table in manifest['tables']:
+            with codec.open_reader(backup_path / table['file']) as reader:
+                if table.get('format') == bulk_load.TSV_FORMAT:
+                    counts[table['name']] = count_tsv_rows(reader)
+                else:
+                    count_dump_rows(reader, counts)
+        return counts
+    if is_dedup_backup(backup_path):
+        with open_backup(backup_path) as reader:
+            return count_dump_rows(reader)
+    with codec_for_path(backup_path).open_reader(backup_path) as reader:
+        return count_dump_rows(reader)
+
+
+def restored_rows(target, database, tables):
+    """
+    Filas de cada tabla restaurada (COUNT(*) exacto)
+
+    Returns:
+        dict: {tabla: filas}
+    """
+    tables = sorted(tables)
+    if not tables:
+        return {}
+    counts = {}
+    # En lotes para no generar una consulta enorme con miles de tablas
+    for i in range(0, len(tables), 200):
+        sql = ' UNION ALL '.join(
+            f"SELECT {i + n}, COUNT(*) FROM `{table.replace('`', '``')}`"
+            for n, table in enumerate(tables[i:i + 200])
+        )
+        for index, count in run_sql(target, sql, database):
+            counts[tables[int(index)]] = int(count)
+    return counts
+
+
+def is_regression(catalog, database, throughput):
+    """Indica si el rendimiento es mucho peor que el de los simulacros anteriores"""
+    history = [d['throughput_mb_s'] for d in catalog.drills(database, status='ok', limit=DRILL_BASELINE)
+               if d['throughput_mb_s']]
+    if len(history) < 2 or not throughput:
+        return False
+    return throughput < statistics.median(history) / DRILL_REGRESSION_FACTOR
+
+
+def run_drill(catalog, backup_dir, row, target):
+    """
+    Simulacro de restauración de un backup
+
+    Args:
+        catalog (Catalog): Catálogo de backups (también guarda el historial)
+        backup_dir (Path): Directorio de backups
+        row (dict): Fila del catálogo del backup
+        target (dict): Servidor donde restaurar
+
+    Returns:
+        dict: Resultado guardado en el historial
+    """
+    backup_path = Path(backup_dir) / row['filename']
+    scratch = f"{DRILL_PREFIX}{row['database']}"
+    drill = {
+        'filename': row['filename'],
+        'database': row['database'],
+        'target': target['name'],
+        'started_at': datetime.now().isoformat(),
+        'raw_bytes': row['raw_bytes']
+    }
+    logging.info(f"Simulacro de restauración: {row['filename']} → {target['name']} ({scratch})")
+
+    try:
+        verification = integrity.verify_backup(backup_path, row['sha256'])
+        if verification['status'] in integrity.FAILED_STATES:
+            raise DrillError(f"Backup {verification['status']}: {verification['message']}")
+        drill['raw_bytes'] = verification['raw_bytes']
+        expected = expected_rows(backup_path)
+
+        run_sql(target, f"DROP DATABASE IF EXISTS `{scratch}`; CREATE DATABASE `{scratch}`;")
+        # Mismo comando que las restauraciones del monitor web, para medir el RTO real
+        restore_cmd = mysql_command(target, '--force', '--comments', '--binary-mode=0', scratch)
+        start = time.monotonic()
+        stats = restore_engine.restore(backup_path, restore_cmd, workers=DRILL_PARALLELISM, work_dir=backup_dir)
+        drill['restore_seconds'] = round(time.monotonic() - start, 3)
+        drill['tables'] = stats['tables']
+
+        restored = restored_rows(target, scratch, expected)
+        drill['rows'] = sum(restored.values())
+        drill['mismatches'] = [
+            {'table': table, 'expected': count, 'restored': restored.get(table)}
+            for table, count in sorted(expected.items()) if restored.get(table) != count
+        ]
+        drill['status'] = 'mismatch' if drill['mismatches'] else 'ok'
+        if drill['restore_seconds'] > 0:
+            drill['throughput_mb_s'] = round(drill['raw_bytes'] / (1024 * 1024) / drill['restore_seconds'], 3)
+        drill['regression'] = int(is_regression(catalog, row['database'], drill.get('throughput_mb_s')))
+
+    except Exception as e:
+        drill['status'] = 'failed'
+        drill['error'] = str(e)
+
+    finally:
+        if not DRILL_KEEP:
+            try:
+                run_sql(target, f"DROP DATABASE IF EXISTS `{scratch}`;")
+            except Exception as e:
+                logging.warning(f"No se pudo eliminar la base de datos temporal {scratch}: {str(e)}")
+
+    catalog.record_drill(drill)
+    if drill['status'] == 'ok':
+        logging.info(f"✓ Simulacro {row['filename']}: {drill['tables']} tablas, {drill['rows']} filas "
+                     f"en {drill['restore_seconds']:.1f}s ({drill.get('throughput_mb_s') or 0:.2f} MB/s)")
+        if drill['regression']:
+            logging.warning(f"Restauración de {row['database']} más lenta que en los simulacros anteriores")
+    elif drill['status'] == 'mismatch':
+        tables = ', '.join(m['table'] for m in drill['mismatches'][:5])
+        logging.error(f"✗ Simulacro {row['filename']}: filas distintas en {len(drill['mismatches'])} tablas ({tables})")
+    else:
+        logging.error(f"✗ Simulacro {row['filename']} fallido: {drill['error']}")
+    return drill
+
+
+def run_drills(catalog, backup_dir, databases=None, target=None):
+    """
+    Simulacro del backup más reciente de cada base de datos
+
+    Args:
+        catalog (Catalog): Catálogo de backups
+        backup_dir (Path): Directorio de backups
+        databases (list): Bases de datos (por defecto, todas las del catálogo)
+        target (dict): Servidor donde restaurar (por defecto load_target())
+
+    Returns:
+        list: Resultados de run_drill()
+    """
+    target = target or load_target()
+    results = []
+    for database in databases or catalog.databases():
+        rows = catalog.query(database=database, limit=1)
+        if not rows:
+            logging.warning(f"Simulacro omitido: {database} no tiene backups")
+            continue
+        results.append(run_drill(catalog, backup_dir, rows[0], target))
+    return results
+
+
+def main(argv):
+    from catalog import open_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = list(argv)
+    index = None
+    if args[:1] == ['--target'] and len(args) > 1:
+        index = int(args[1])
+        args = args[2:]
+    backup_dir = Path('backups')
+    try:
+        results = run_drills(open_catalog(backup_dir), backup_dir, args or None, load_target(index))
+    except ValueError as e:
+        print(str(e))
+        return 2
+    return 0 if all(r['status'] == 'ok' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Motor de restauración en paralelo por tablas
+
+Divide un backup en unidades y las carga con varias conexiones mysql:
+1. Esquema (tablas y vistas temporales), con una conexión
+2. Datos de cada tabla, en paralelo (las más grandes primero)
+3. Objetos (triggers, rutinas, eventos y vistas finales), con una conexión
+
+Los backups por tablas ya están divididos; los de archivo único se dividen
+leyendo el volcado una vez y separando sus secciones en archivos temporales
+comprimidos (con el codec del backup) dentro de un directorio de trabajo. Los datos en TSV
+(BACKUP_LAYOUT=tab) se cargan con LOAD DATA y sus índices secundarios se
+crean después de los datos (ver bulk_load.py). Con MYSQL_ENGINE=native los
+datos de las tablas se cargan con conexiones del pool en lugar de clientes
+mysql (ver mysql_native.py).
+"""
+
+import logging
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import bulk_load
+import mysql_native
+from backup_layout import is_chunked_backup, is_dedup_backup, read_manifest
+from compression import codec_for_path, get_codec
+from dedup_store import open_backup
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Nivel de compresión de las unidades temporales de split_dump() (el más rápido)
+SPLIT_COMPRESSION_LEVEL = 1
+
+# Encabezados de sección que escribe mysqldump
+SCHEMA_MARKERS = (
+    b'-- Table structure for table `',
+    b'-- Temporary view structure for view `',
+    b'-- Temporary table structure for view `',
+)
+DATA_MARKER = b'-- Dumping data for table `'
+OBJECTS_MARKERS = (
+    b'-- Final view structure for view `',
+    b'-- Dumping events for database ',
+    b'-- Dumping routines for database ',
+    b'-- Dump completed',
+)
+# Inicio de los triggers que mysqldump escribe tras los datos de cada tabla
+TRIGGER_MARKERS = (b'/*!50003 SET @saved_cs_client', b'DELIMITER ;;')
+# Sentencias que fijan la base de datos original (se omiten en todas las
+# secciones para restaurar en la base de datos elegida)
+DATABASE_STATEMENTS = (b'CREATE DATABASE ', b'USE `')
+
+
+class RestoreError(Exception):
+    """Error al cargar una unidad de restauración"""
+
+
+class RestorePlan:
+    """
+    Unidades de una restauración
+
+    Args:
+        schema (list): Archivos de esquema, en orden
+        tables (list): Tuplas (tabla, archivo) con los datos de cada tabla
+        objects (list): Archivos de objetos, en orden
+        bulk (dict): {tabla: columnas (None = todas)} de las tablas con los datos en TSV
+        codec (Codec): Codec de los archivos TSV
+        raw_bytes (int): Bytes sin comprimir de todas las unidades, si se conocen
+    """
+
+    def __init__(self, schema, tables, objects, bulk=None, codec=None, raw_bytes=None):
+        self.schema = schema
+        self.tables = tables
+        self.objects = objects
+        self.bulk = bulk or {}
+        self.codec = codec
+        self.raw_bytes = raw_bytes
+
+
+def iter_lines(reader):
+    """Itera las líneas (bytes, con salto de línea) de un lector con read()"""
+    pending = b''
+    while True:
+        chunk = reader.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+
+def section_name(line):
+    """Nombre de la tabla o vista de un encabezado de sección (`-- ... `nombre``)"""
+    return line[line.index(b'`') + 1:line.rindex(b'`')].decode('utf-8', errors='replace')
+
+
+def split_dump(backup_path, work_dir):
+    """
+    Divide un volcado de archivo único en unidades de restauración
+
+    Las unidades se comprimen con el codec del backup (gzip para los
+    deduplicados), así que el directorio de trabajo no necesita el tamaño
+    del volcado sin comprimir.
+
+    Args:
+        backup_path (Path): Archivo de backup comprimido (o manifest deduplicado)
+        work_dir (Path): Directorio donde escribir las unidades
+
+    Returns:
+        RestorePlan: Esquema, datos por tabla y objetos
+    """
+    if is_dedup_backup(backup_path):
+        open_reader = open_backup
+        codec = get_codec('gzip')
+    else:
+        codec = codec_for_path(backup_path)
+        if codec is None:
+            raise RestoreError(f"Formato de backup no reconocido: {Path(backup_path).name}")
+        open_reader = codec.open_reader
+
+    work_dir = Path(work_dir)
+    header = []
+    schema_file = None
+    objects_file = None
+    data_file = None
+    tables = []
+    current = None  # None (cabecera), 'schema', 'data' u 'objects'
+    raw_bytes = 0
+    schema_path = work_dir / f"schema{codec.extension}"
+    objects_path = work_dir / f"objects{codec.extension}"
+
+    def open_unit(path):
+        nonlocal raw_bytes
+        f = codec.open_writer(path, SPLIT_COMPRESSION_LEVEL)
+        f.write(b''.join(header))
+        raw_bytes += sum(len(line) for line in header)
+        return f
+
+    try:
+        with open_reader(backup_path) as reader:
+            for line in iter_lines(reader):
+                if line.startswith(b'-- '):
+                    if line.startswith(SCHEMA_MARKERS):
+                        current = 'schema'
+                    elif line.startswith(DATA_MARKER):
+                        if data_file is not None:
+                            data_file.close()
+                        path = work_dir / f"data_{len(tables):05d}{codec.extension}"
+                        tables.append((section_name(line), path))
+                        data_file = open_unit(path)
+                        current = 'data'
+                    elif line.startswith(OBJECTS_MARKERS):
+                        current = 'objects'
+                elif current == 'data' and line.startswith(TRIGGER_MARKERS):
+                    current = 'objects'
+
+                if line.startswith(DATABASE_STATEMENTS):
+                    # Con --databases, mysqldump repite el USE antes de las vistas finales
+                    continue
+                if current is None:
+                    header.append(line)
+                    continue
+                if current == 'schema':
+                    if schema_file is None:
+                        schema_file = open_unit(schema_path)
+                    schema_file.write(line)
+                elif current == 'data':
+                    data_file.write(line)
+                else:
+                    if objects_file is None:
+                        objects_file = open_unit(objects_path)
+                    objects_file.write(line)
+                raw_bytes += len(line)
+    finally:
+        for f in (schema_file, objects_file, data_file):
+            if f is not None:
+                f.close()
+
+    return RestorePlan(
+        [schema_path] if schema_file is not None else [],
+        tables,
+        [objects_path] if objects_file is not None else [],
+        raw_bytes=raw_bytes
+    )
+
+
+def chunked_plan(backup_path):
+    """Unidades de un backup por tablas a partir de su manifest"""
+    backup_path = Path(backup_path)
+    manifest = read_manifest(backup_path)
+    return RestorePlan(
+        [backup_path / manifest['schema']['file']],
+        [(table['name'], backup_path / table['file']) for table in manifest['tables']],
+        [backup_path / manifest['objects']['file']],
+        {table['name']: table.get('columns') for table in manifest['tables']
+         if table.get('format') == bulk_load.TSV_FORMAT},
+        get_codec(manifest['codec'])
+    )
+
+
+def iter_chunks(reader):
+    """Itera los bloques de READ_CHUNK_SIZE bytes de un lector con read()"""
+    while True:
+        chunk = reader.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def load_unit(path, restore_cmd, timeout=None, tracker=None, native=False):
+    """
+    Carga un archivo SQL (comprimido o no) con un cliente mysql
+
+    El archivo se descomprime en este proceso y se envía al stdin de mysql,
+    contando los bytes para el progreso.
+
+    Args:
+        path (Path): Archivo de la unidad
+        restore_cmd (list): Comando mysql que lee SQL por stdin
+        timeout (int): Segundos máximos para la unidad (None = sin límite)
+        tracker (ProgressTracker): Progreso de la restauración (opcional)
+        native (bool): Cargar con el motor nativo (solo datos, sin DELIMITER)
+
+    Returns:
+        float: Duración en segundos
+
+    Raises:
+        RestoreError: Si mysql termina con error
+        subprocess.TimeoutExpired: Si se supera `timeout`
+    """
+    codec = codec_for_path(path)
+    with (codec.open_reader(path) if codec else open(path, 'rb')) as reader:
+        return load_stream(iter_chunks(reader), path.name, restore_cmd, timeout, tracker, native)
+
+
+def load_schema(path, restore_cmd, tables, timeout=None, tracker=None):
+    """
+    Carga el esquema sin los índices secundarios de `tables` (ver bulk_load.defer_indexes())
+
+    Returns:
+        dict: {tabla: definiciones de los índices aplazados}
+    """
+    with codec_for_path(path).open_reader(path) as reader:
+        schema_sql, deferred = bulk_load.defer_indexes(reader.read(), tables)
+    load_stream([schema_sql], path.name, restore_cmd, timeout, tracker)
+    return deferred
+
+
+def load_bulk(path, codec, table, columns, restore_cmd, load_data=True, indexes=None, timeout=None, tracker=None,
+              native=False):
+    """
+    Carga los datos en TSV de una tabla y después sus índices aplazados
+
+    Args:
+        path (Path): Archivo TSV comprimido
+        codec (Codec): Codec del archivo
+        table (str): Tabla destino
+        columns (list): Columnas de los datos (None = todas)
+        restore_cmd (list): Comando mysql con la base de datos destino como último argumento
+        load_data (bool): Usar LOAD DATA LOCAL (si no, INSERT generados desde el TSV)
+        indexes (list): Definiciones de los índices a crear tras los datos
+        native (bool): Enviar los INSERT y los índices con el motor nativo
+
+    Returns:
+        float: Duración en segundos (datos e índices)
+    """
+    start = time.monotonic()
+    with codec.open_reader(path) as reader:
+        if load_data:
+            load_stream(iter_chunks(reader), path.name, bulk_load.load_data_command(restore_cmd, table, columns),
+                        timeout, tracker)
+        else:
+            load_stream(bulk_load.insert_chunks(reader, table, columns), path.name, restore_cmd, timeout, tracker,
+                        native)
+    if indexes:
+        remaining = timeout - (time.monotonic() - start) if timeout else None
+        if remaining is not None and remaining <= 0:
+            raise subprocess.TimeoutExpired(restore_cmd[0], timeout)
+        index_start = time.monotonic()
+        load_stream([bulk_load.add_indexes_sql(table, indexes).encode('utf-8')], f"{table} (índices)",
+                    restore_cmd, remaining, native=native)
+        logging.info(f"  Índices de {table} creados en {time.monotonic() - index_start:.1f}s")
+    return time.monotonic() - start
+
+
+def load_stream(chunks, label, restore_cmd, timeout=None, tracker=None, native=False):
+    """
+    Envía SQL al stdin de un cliente mysql (ver load_unit())
+
+    Args:
+        chunks (iterable): Bloques de SQL sin comprimir (bytes)
+        label (str): Nombre de la unidad para los errores
+        native (bool): Ejecutarlo con el motor nativo (ver mysql_native.load_stream())
+
+    Returns:
+        float: Duración en segundos
+    """
+    if native:
+        try:
+            return mysql_native.load_stream(chunks, label, restore_cmd, timeout, tracker)
+        except mysql_native.NativeError as e:
+            raise RestoreError(str(e)) from e
+
+    start = time.monotonic()
+    deadline = start + timeout if timeout else None
+
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            restore_cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr_file
+        )
+        try:
+            try:
+                for chunk in chunks:
+                    process.stdin.write(chunk)
+                    if tracker is not None:
+                        tracker.add_bytes(len(chunk))
+                    if deadline and time.monotonic() > deadline:
+                        raise subprocess.TimeoutExpired(restore_cmd[0], timeout)
+                process.stdin.close()
+            except BrokenPipeError:
+                # mysql terminó antes de leerlo todo; su código de salida lo explica
+                pass
+            returncode = process.wait(timeout=max(0, deadline - time.monotonic()) if deadline else None)
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+
+        if returncode != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='replace')
+            raise RestoreError(f"{label}: Return code: {returncode}, STDERR: {stderr}")
+
+    return time.monotonic() - start
+
+
+def execute_plan(plan, restore_cmd, workers=4, timeout=None, on_table=None, tracker=None,
+                 objects_cmd=None, before_objects=None):
+    """
+    Ejecuta un plan: esquema, datos en paralelo y objetos
+
+    Args:
+        plan (RestorePlan): Unidades a cargar
+        restore_cmd (list): Comando mysql (con la base de datos destino)
+        workers (int): Conexiones simultáneas para los datos
+        timeout (int): Segundos máximos por unidad (None = sin límite)
+        on_table (callable): on_table(tablas_terminadas, total) tras cada tabla
+        tracker (ProgressTracker): Progreso de la restauración (opcional)
+        objects_cmd (list): Comando mysql para los objetos (por defecto `restore_cmd`)
+        before_objects (callable): Se llama tras cargar los datos y antes de los
+                                   objetos (p.ej. para validar e intercambiar, ver shadow_restore.py)
+
+    Returns:
+        dict: Métricas de la restauración
+
+    Raises:
+        RestoreError: Si alguna unidad falla (las pendientes se cancelan)
+    """
+    start = time.monotonic()
+    if tracker is not None:
+        tracker.set_stage('schema', total_tables=len(plan.tables))
+
+    native = mysql_native.enabled()
+    load_data = False
+    if plan.bulk:
+        load_data = bulk_load.RESTORE_LOAD_DATA and bulk_load.local_infile_enabled(restore_cmd)
+        logging.info(f"Datos en TSV de {len(plan.bulk)} tablas: se cargan con "
+                     f"{'LOAD DATA LOCAL' if load_data else 'INSERT (el servidor no permite LOAD DATA LOCAL)'}")
+
+    deferred = {}
+    for path in plan.schema:
+        logging.info(f"Cargando esquema: {path.name}")
+        if plan.bulk and bulk_load.RESTORE_DEFER_INDEXES:
+            deferred.update(load_schema(path, restore_cmd, plan.bulk, timeout, tracker))
+        else:
+            load_unit(path, restore_cmd, timeout, tracker)
+    schema_seconds = time.monotonic() - start
+
+    # Las tablas más grandes primero para reducir el tiempo total
+    tables = sorted(plan.tables, key=lambda t: t[1].stat().st_size, reverse=True)
+    workers = max(1, min(workers, len(tables) or 1))
+    logging.info(f"Cargando datos de {len(tables)} tablas con {workers} conexiones...")
+    if tracker is not None:
+        tracker.set_stage('data')
+    data_start = time.monotonic()
+    table_seconds = {}
+
+    def load_table(table, path):
+        if table in plan.bulk:
+            return load_bulk(path, plan.codec, table, plan.bulk[table], restore_cmd, load_data,
+                             deferred.get(table), timeout, tracker, native)
+        return load_unit(path, restore_cmd, timeout, tracker, native)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='restore') as executor:
+        futures = {executor.submit(load_table, table, path): table for table, path in tables}
+        try:
+            for future in as_completed(futures):
+                table = futures[future]
+                table_seconds[table] = round(future.result(), 3)
+                logging.info(f"  Tabla {table} restaurada en {table_seconds[table]:.1f}s")
+                if tracker is not None:
+                    tracker.add_table()
+                if on_table is not None:
+                    on_table(len(table_seconds), len(tables))
+        except BaseException:
+            for pending in futures:
+                pending.cancel()
+            raise
+    data_seconds = time.monotonic() - data_start
+
+    if before_objects is not None:
+        before_objects()
+    if tracker is not None:
+        tracker.set_stage('objects')
+    for path in plan.objects:
+        logging.info(f"Cargando objetos: {path.name}")
+        load_unit(path, objects_cmd or restore_cmd, timeout, tracker)
+
+    return {
+        'tables': len(tables),
+        'workers': workers,
+        'bulk_tables': len(plan.bulk),
+        'load_data': load_data,
+        'engine': 'native' if native else 'cli',
+        'schema_seconds': round(schema_seconds, 3),
+        'data_seconds': round(data_seconds, 3),
+        'total_seconds': round(time.monotonic() - start, 3),
+        'table_seconds': table_seconds
+    }
+
+
+def restore(backup_path, restore_cmd, workers=4, timeout=None, work_dir=None, on_table=None, tracker=None,
+            objects_cmd=None, before_objects=None):
+    """
+    Restaura un backup (archivo único, por tablas o deduplicado) en paralelo
+
+    Args:
+        backup_path (Path): Backup a restaurar
+        restore_cmd (list): Comando mysql con la base de datos destino como último argumento
+        workers (int): Conexiones simultáneas para los datos
+        timeout (int): Segundos máximos por unidad (None = sin límite)
+        work_dir (Path): Directorio para dividir volcados de archivo único
+        on_table (callable): on_table(tablas_terminadas, total) tras cada tabla
+        tracker (ProgressTracker): Progreso de la restauración (opcional)
+        objects_cmd (list): Comando mysql para los objetos (ver execute_plan())
+        before_objects (callable): Se llama antes de cargar los objetos (ver execute_plan())
+
+    Returns:
+        dict: Métricas de la restauración
+    """
+    backup_path = Path(backup_path)
+    if is_chunked_backup(backup_path):
+        if tracker is not None:
+            tracker.set_stage('load', total_bytes=read_manifest(backup_path)['raw_bytes'])
+        return execute_plan(chunked_plan(backup_path), restore_cmd, workers, timeout, on_table, tracker,
+                            objects_cmd, before_objects)
+
+    with tempfile.TemporaryDirectory(prefix='restore-', dir=work_dir) as tmp:
+        split_start = time.monotonic()
+        if tracker is not None:
+            tracker.set_stage('split')
+        plan = split_dump(backup_path, tmp)
+        split_seconds = time.monotonic() - split_start
+        logging.info(f"Volcado dividido en {len(plan.tables)} tablas en {split_seconds:.1f}s")
+        if tracker is not None:
+            tracker.set_stage('load', total_bytes=plan.raw_bytes, restart=True)
+        stats = execute_plan(plan, restore_cmd, workers, timeout, on_table, tracker, objects_cmd, before_objects)
+        stats['split_seconds'] = round(split_seconds, 3)
+        return stats
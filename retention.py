@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Retención de backups abuelo-padre-hijo (GFS)
+
+Por cada base de datos se conservan los backups más recientes de los últimos
+RETENTION_DAILY días, RETENTION_WEEKLY semanas, RETENTION_MONTHLY meses y
+RETENTION_YEARLY años (un mismo backup puede cubrir varios niveles) y se
+eliminan los demás. El conjunto a eliminar se calcula en una pasada sobre el
+catálogo, sin recorrer el directorio de backups, y se borra por lotes.
+
+    python retention.py plan [directorio_de_backups]    # solo muestra qué se eliminaría
+    python retention.py apply [directorio_de_backups]
+"""
+
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from backup_layout import remove_backup
+
+# Backups conservados por nivel (0 = ninguno en ese nivel)
+RETENTION_DAILY = int(os.environ.get('RETENTION_DAILY', '7'))
+RETENTION_WEEKLY = int(os.environ.get('RETENTION_WEEKLY', '4'))
+RETENTION_MONTHLY = int(os.environ.get('RETENTION_MONTHLY', '12'))
+RETENTION_YEARLY = int(os.environ.get('RETENTION_YEARLY', '0'))
+
+# Política propia de algunas bases de datos (los niveles omitidos usan la global)
+DATABASE_RETENTION = {
+    # 'gastos_db': {'daily': 14, 'monthly': 24},
+}
+
+# Con RETENTION_DRY_RUN=true los backups solo registran lo que se eliminaría
+RETENTION_DRY_RUN = os.environ.get('RETENTION_DRY_RUN', 'false').lower() in ('1', 'true', 'yes')
+
+# Backups eliminados entre cada actualización del catálogo
+RETENTION_BATCH_SIZE = 100
+
+# Niveles y el periodo al que pertenece cada backup en cada uno
+TIERS = (
+    ('daily', lambda created: created.date()),
+    ('weekly', lambda created: created.isocalendar()[:2]),
+    ('monthly', lambda created: (created.year, created.month)),
+    ('yearly', lambda created: created.year),
+)
+
+
+def policy_for(database):
+    """
+    Backups a conservar por nivel para una base de datos
+
+    Returns:
+        dict: daily, weekly, monthly y yearly
+    """
+    policy = {
+        'daily': RETENTION_DAILY,
+        'weekly': RETENTION_WEEKLY,
+        'monthly': RETENTION_MONTHLY,
+        'yearly': RETENTION_YEARLY
+    }
+    policy.update(DATABASE_RETENTION.get(database, {}))
+    return policy
+
+
+def select_kept(rows, policy):
+    """
+    Backups que conserva la política
+
+    En cada nivel se conserva el backup más reciente de cada periodo (día,
+    semana ISO, mes, año), para los `policy[nivel]` periodos más recientes
+    que tengan algún backup. El backup más reciente se conserva siempre.
+
+    Args:
+        rows (list): Filas del catálogo de una base de datos, más recientes primero
+        policy (dict): Backups a conservar por nivel (ver policy_for())
+
+    Returns:
+        dict: Niveles que cubre cada backup conservado, por nombre de archivo
+    """
+    kept = {}
+    periods = {tier: set() for tier, _ in TIERS}
+    for row in rows:
+        created = datetime.fromisoformat(row['created_at'])
+        for tier, period_of in TIERS:
+            period = period_of(created)
+            if period in periods[tier] or len(periods[tier]) >= policy.get(tier, 0):
+                continue
+            periods[tier].add(period)
+            kept.setdefault(row['filename'], []).append(tier)
+    if rows:
+        kept.setdefault(rows[0]['filename'], []).append('latest')
+    return kept
+
+
+def plan_retention(catalog):
+    """
+    Calcula qué backups conservar y cuáles eliminar
+
+    Returns:
+        dict: keep (nombre -> niveles), delete (filas del catálogo a eliminar,
+              más antiguas primero) y freed_bytes
+    """
+    by_database = {}
+    for row in catalog.query(limit=None):
+        by_database.setdefault(row['database'], []).append(row)
+
+    keep, delete = {}, []
+    for database, rows in by_database.items():
+        kept = select_kept(rows, policy_for(database))
+        keep.update(kept)
+        delete.extend(row for row in rows if row['filename'] not in kept)
+    delete.sort(key=lambda row: (row['created_at'], row['filename']))
+    return {'keep': keep, 'delete': delete, 'freed_bytes': sum(row['size'] for row in delete)}
+
+
+def apply_retention(catalog, backup_dir, dry_run=RETENTION_DRY_RUN):
+    """
+    Aplica la política de retención
+
+    Args:
+        catalog (Catalog): Catálogo de backups
+        backup_dir (Path): Directorio de backups
+        dry_run (bool): Solo registrar lo que se eliminaría
+
+    Returns:
+        dict: kept, deleted (nombres), failed, freed_bytes y dry_run
+    """
+    plan = plan_retention(catalog)
+    if dry_run:
+        for row in plan['delete']:
+            logging.info(f"[simulación] Se eliminaría: {row['filename']}")
+        deleted = plan['delete']
+        failed = 0
+    else:
+        deleted, failed = [], 0
+        for start in range(0, len(plan['delete']), RETENTION_BATCH_SIZE):
+            removed = []
+            for row in plan['delete'][start:start + RETENTION_BATCH_SIZE]:
+                try:
+                    remove_backup(Path(backup_dir) / row['filename'])
+                except FileNotFoundError:
+                    pass  # Ya no estaba en disco: basta con quitarlo del catálogo
+                except Exception as e:
+                    failed += 1
+                    logging.warning(f"No se pudo eliminar {row['filename']}: {str(e)}")
+                    continue
+                removed.append(row)
+                logging.info(f"Eliminado backup antiguo: {row['filename']}")
+            # Una transacción del catálogo por lote
+            catalog.remove_many([row['filename'] for row in removed])
+            deleted.extend(removed)
+
+    return {
+        'kept': len(plan['keep']),
+        'deleted': [row['filename'] for row in deleted],
+        'failed': failed,
+        'freed_bytes': sum(row['size'] for row in deleted),
+        'dry_run': dry_run
+    }
+
+
+def main(argv):
+    from catalog import open_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(argv) < 1 or argv[0] not in ('plan', 'apply'):
+        print("Uso: python retention.py plan|apply [directorio_de_backups]")
+        return 2
+    backup_dir = Path(argv[1] if len(argv) > 1 else 'backups')
+    catalog = open_catalog(backup_dir)
+
+    if argv[0] == 'plan':
+        plan = plan_retention(catalog)
+        for filename, tiers in sorted(plan['keep'].items()):
+            print(f"  conservar {filename} ({', '.join(tiers)})")
+        for row in plan['delete']:
+            print(f"  eliminar  {row['filename']}")
+        print(f"Se conservarían {len(plan['keep'])} backups y se eliminarían {len(plan['delete'])} "
+              f"({plan['freed_bytes'] / (1024 * 1024):.1f} MB)")
+        return 0
+
+    result = apply_retention(catalog, backup_dir, dry_run=False)
+    print(f"Eliminados {len(result['deleted'])} backups ({result['freed_bytes'] / (1024 * 1024):.1f} MB), "
+          f"conservados {result['kept']}")
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
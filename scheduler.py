@@ -1,62 +1,378 @@
 #!/usr/bin/env python3
 """
-Scheduler para ejecutar backups de MySQL usando Python schedule
+Scheduler para ejecutar backups de MySQL
+
+Ejecuta los backups en el mismo proceso (importando backup_mysql), con:
+- Programación tipo cron por base de datos (DATABASE_SCHEDULES): las bases
+  de datos con la misma programación forman una sola tarea que las respalda
+  de mayor a menor duración estimada (backup_mysql.plan_backups())
+- Inicio escalonado: cada tarea se retrasa unos segundos fijos (según su
+  nombre) para que no coincida con las demás
+- Sin solapamientos: una tarea que sigue en curso no se vuelve a lanzar, y
+  backup_mysql bloquea cada base de datos también frente a otros procesos
+- Logs en streaming (los del backup se escriben al momento)
+- Retención, sincronización con S3 y archivado de binlogs una sola vez tras
+  los backups de cada ciclo, no tras cada base de datos
+- Simulacros de restauración periódicos (DRILL_SCHEDULE)
+- Con DISCOVER_DATABASES, las bases de datos nuevas del servidor se
+  programan sin reiniciar (se consultan cada DISCOVERY_INTERVAL segundos)
+- Próximas ejecuciones publicadas en SCHEDULE_FILE para el monitor web
 """
 
-import schedule
-import time
-import subprocess
+import json
 import logging
-from datetime import datetime
+import os
+import subprocess
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
 from pathlib import Path
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/scheduler.log'),
-        logging.StreamHandler()
+# backup_mysql configura el logging (backup_mysql.log y consola)
+import backup_mysql
+import backup_plan
+import restore_drill
+from log_tail import rotating_handler
+
+# Programación por defecto (formato cron: minuto hora día mes día_semana)
+DEFAULT_SCHEDULE = os.environ.get('BACKUP_SCHEDULE', '30 23 * * *')
+
+# Programación por base de datos (sobrescribe DEFAULT_SCHEDULE)
+DATABASE_SCHEDULES = {
+    # 'gastos_db': '0 */6 * * *',
+}
+
+# Archivado de binlogs (backups incrementales); vacío = desactivado
+BINLOG_SCHEDULE = os.environ.get('BINLOG_SCHEDULE', '')
+
+# Simulacros de restauración (ver restore_drill.py); vacío = desactivado
+DRILL_SCHEDULE = os.environ.get('DRILL_SCHEDULE', '')
+
+# Segundos máximos de retraso para escalonar los inicios
+SCHEDULE_JITTER = int(os.environ.get('SCHEDULE_JITTER', '300'))
+
+# Ejecutar un backup de todas las bases de datos al arrancar
+RUN_ON_START = os.environ.get('RUN_ON_START', 'true').lower() in ('1', 'true', 'yes')
+
+# Estado del scheduler que lee el monitor web
+SCHEDULE_FILE = Path('/app/schedule_status.json')
+
+# Segundos entre consultas de las bases de datos del servidor (DISCOVER_DATABASES)
+DISCOVERY_INTERVAL = int(os.environ.get('DISCOVERY_INTERVAL', '3600'))
+
+# Segundos máximos entre comprobaciones (por si cambia la hora del sistema)
+MAX_SLEEP = 30
+
+# Log propio del scheduler (con rotación), además de los de backup_mysql
+logging.getLogger().addHandler(rotating_handler('/app/scheduler.log'))
+
+
+class CronSchedule:
+    """
+    Expresión cron de 5 campos: minuto hora día mes día_semana
+
+    Admite `*`, números, rangos (`1-5`), listas (`1,15`) y pasos (`*/15`, `0-30/10`).
+    Como en cron, si se restringen el día del mes y el de la semana basta con
+    que coincida uno de los dos.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expresión cron inválida (se esperan 5 campos): {expression}")
+        parsed = [self._parse_field(f, low, high) for f, (low, high) in zip(fields, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 7 también es domingo
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse_field(text, low, high):
+        values = set()
+        for part in text.split(','):
+            base, _, step = part.partition('/')
+            if base == '*':
+                start, end = low, high
+            elif '-' in base:
+                start, end = (int(v) for v in base.split('-', 1))
+            else:
+                start = int(base)
+                end = high if step else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"Valor fuera de rango en cron: {part}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, dt):
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays  # cron: 0 = domingo
+        if self._any_day:
+            return weekday
+        if self._any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, dt):
+        """Primer instante programado posterior a `dt`"""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=5 * 366)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"La expresión cron nunca se cumple: {self.expression}")
+
+
+def stagger_seconds(name):
+    """Retraso fijo (0..SCHEDULE_JITTER s) derivado del nombre, para escalonar los inicios"""
+    return zlib.crc32(name.encode('utf-8')) % (SCHEDULE_JITTER + 1) if SCHEDULE_JITTER > 0 else 0
+
+
+class ScheduledTask:
+    """
+    Tarea programada (backups de una programación, binlogs o simulacros)
+
+    Args:
+        name (str): Nombre ('backups', 'backups <cron>', 'binlogs' o 'drill')
+        expression (str): Programación cron
+        action (callable): Función a ejecutar; devuelve True si fue exitosa
+        databases (list): Bases de datos que respalda la tarea (se actualiza en el sitio)
+    """
+
+    def __init__(self, name, expression, action, databases=None):
+        self.name = name
+        self.databases = databases
+        self.cron = CronSchedule(expression)
+        self.action = action
+        self.stagger = stagger_seconds(name)
+        self.next_run = self._next(datetime.now())
+        self.last_run = None
+        self.last_status = None
+        self.thread = None
+
+    def _next(self, now):
+        # Se busca la siguiente hora cron cuyo inicio escalonado aún no pasó
+        return self.cron.next_after(now - timedelta(seconds=self.stagger)) + timedelta(seconds=self.stagger)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, now):
+        """Lanza la tarea en un hilo (si no sigue en curso) y calcula la siguiente ejecución"""
+        self.next_run = self._next(now)
+        if self.running:
+            logging.warning(f"{self.name}: la ejecución anterior sigue en curso, se omite esta")
+            return
+        self.last_run = now
+        self.last_status = 'running'
+        self.thread = threading.Thread(target=self._run, name=f'schedule-{self.name}', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.last_status = 'success' if self.action() else 'error'
+        except Exception as e:
+            logging.error(f"✗ Error inesperado en la tarea {self.name}: {str(e)}")
+            self.last_status = 'error'
+
+    def snapshot(self):
+        return {
+            'name': self.name,
+            'schedule': self.cron.expression,
+            'databases': self.databases,
+            'stagger_seconds': self.stagger,
+            'next_run': self.next_run.isoformat(),
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_status': self.last_status,
+            'running': self.running
+        }
+
+
+# Hay backups terminados desde la última retención / sincronización con S3
+maintenance_due = threading.Event()
+
+
+def backup_action(databases):
+    """
+    Acción de backup de las bases de datos de una programación (en proceso)
+
+    Se ordenan en cada ejecución con backup_mysql.plan_backups() (mayor
+    duración estimada primero) y se lanzan juntas, así que el pool de
+    MAX_PARALLEL_DUMPS sigue el orden LPT. La lista se lee al ejecutar, de
+    modo que refresh_tasks() puede cambiarla. La retención, la
+    sincronización con S3 y los binlogs se ejecutan después desde el bucle
+    principal (ver start_maintenance()).
+    """
+    def action():
+        try:
+            order = backup_mysql.plan_backups(list(databases), backup_mysql.MAX_PARALLEL_DUMPS)
+            results = backup_mysql.backup_databases(order)
+        finally:
+            maintenance_due.set()
+        return all(r['status'] != 'failed' for r in results)
+    return action
+
+
+def start_maintenance(tasks, current):
+    """
+    Lanza backup_mysql.run_maintenance() si hay backups terminados y ninguna
+    tarea en curso, para que un ciclo con varias bases de datos lo haga una vez
+
+    Returns:
+        threading.Thread: Hilo de la ejecución en curso (o `current`)
+    """
+    if not maintenance_due.is_set() or (current is not None and current.is_alive()):
+        return current
+    if any(task.running for task in tasks):
+        return current
+    maintenance_due.clear()
+    thread = threading.Thread(target=backup_mysql.run_maintenance, name='maintenance', daemon=True)
+    thread.start()
+    return thread
+
+
+def drill_action():
+    """Simulacro de restauración del último backup de cada base de datos"""
+    results = restore_drill.run_drills(backup_mysql.catalog, backup_mysql.BACKUP_DIR, backup_mysql.configured_databases())
+    return all(r['status'] == 'ok' for r in results)
+
+
+def schedule_name(expression):
+    """Nombre de la tarea de backups de una programación"""
+    return 'backups' if expression == DEFAULT_SCHEDULE else f'backups {expression}'
+
+
+def build_tasks(databases=None):
+    """Tareas programadas a partir de la configuración (por defecto, de configured_databases())"""
+    if databases is None:
+        databases = backup_mysql.configured_databases()
+    groups = {}
+    for database in databases:
+        groups.setdefault(DATABASE_SCHEDULES.get(database, DEFAULT_SCHEDULE), []).append(database)
+    tasks = [
+        ScheduledTask(schedule_name(expression), expression, backup_action(group), group)
+        for expression, group in groups.items()
     ]
-)
+    if BINLOG_SCHEDULE:
+        tasks.append(ScheduledTask('binlogs', BINLOG_SCHEDULE, backup_mysql.archive_binlogs))
+    if DRILL_SCHEDULE:
+        tasks.append(ScheduledTask('drill', DRILL_SCHEDULE, drill_action))
+    return tasks
 
-def run_backup():
-    """Ejecutar el script de backup"""
-    logging.info("=" * 60)
-    logging.info("Iniciando backup programado")
-    logging.info("=" * 60)
-    
+
+def refresh_tasks(tasks):
+    """
+    Programa las bases de datos nuevas del servidor y retira las eliminadas
+
+    Las tareas que siguen existiendo se conservan (con su ejecución en curso y
+    la siguiente programada) y solo cambia su lista de bases de datos. Si el
+    servidor no responde no se cambia nada.
+    """
     try:
-        result = subprocess.run(
-            ['python', '/app/backup_mysql.py'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        logging.info("Backup completado exitosamente")
-        logging.info(result.stdout)
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error al ejecutar backup: {e.stderr}")
+        databases = backup_mysql.discover_databases()
+    except (subprocess.CalledProcessError, OSError) as e:
+        logging.warning(f"No se pudieron descubrir las bases de datos: {getattr(e, 'stderr', None) or str(e)}")
+        return tasks
+    if not databases:
+        if tasks:
+            logging.warning("El servidor no tiene bases de datos que respaldar: se mantiene la programación")
+        return tasks
+    previous = {db for task in tasks for db in task.databases or ()}
+    current = {task.name: task for task in tasks}
+    refreshed = []
+    for task in build_tasks(databases):
+        existing = current.get(task.name)
+        if existing is not None:
+            if existing.databases is not None:
+                # En el sitio: backup_action() lee la lista al ejecutarse
+                existing.databases[:] = task.databases
+            task = existing
+        refreshed.append(task)
+    added = [db for db in databases if db not in previous]
+    removed = sorted(previous.difference(databases))
+    if added:
+        logging.info(f"Bases de datos nuevas programadas: {', '.join(added)}")
+    if removed:
+        logging.info(f"Bases de datos retiradas de la programación: {', '.join(removed)}")
+    return refreshed
+
+
+def write_status(tasks):
+    """Publica las próximas ejecuciones para el monitor web (escritura atómica)"""
+    data = {
+        'updated_at': datetime.now().isoformat(),
+        'tasks': [task.snapshot() for task in sorted(tasks, key=lambda t: t.next_run)]
+    }
+    tmp_path = SCHEDULE_FILE.with_suffix('.json.part')
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, SCHEDULE_FILE)
+    except OSError as e:
+        logging.warning(f"No se pudo guardar el estado del scheduler: {str(e)}")
+
 
 def main():
+    tasks = build_tasks()
+
     logging.info("=" * 60)
     logging.info("Scheduler iniciado")
     logging.info(f"Zona horaria: {time.tzname}")
     logging.info(f"Hora actual: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    logging.info("Programación: Todos los días a las 23:30")
+    for task in tasks:
+        logging.info(f"Programación {task.name}: '{task.cron.expression}' (+{task.stagger}s), próxima: {task.next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+        if task.databases:
+            logging.info(f"  Bases de datos: {', '.join(task.databases)}")
     logging.info("=" * 60)
-    
-    # Ejecutar backup inicial
-    logging.info("Ejecutando backup inicial...")
-    run_backup()
-    
-    # Programar ejecución diaria a las 23:30
-    schedule.every().day.at("23:30").do(run_backup)
-    
+
+    if RUN_ON_START:
+        # En un hilo para no retrasar las tareas programadas; las bases de datos
+        # que coincidan con una tarea se omiten gracias al bloqueo de backup_mysql
+        logging.info("Ejecutando backup inicial...")
+        threading.Thread(target=backup_mysql.main, name='initial-backup', daemon=True).start()
+
     # Mantener el scheduler corriendo
+    next_discovery = time.monotonic() + DISCOVERY_INTERVAL
+    maintenance = None
+    idle = False
     while True:
-        schedule.run_pending()
-        time.sleep(60)  # Verificar cada minuto
+        if backup_plan.DISCOVER_DATABASES and (not tasks or time.monotonic() >= next_discovery):
+            tasks = refresh_tasks(tasks)
+            next_discovery = time.monotonic() + DISCOVERY_INTERVAL
+        if not tasks:
+            # Sin bases de datos ni binlogs/simulacros: se sigue consultando el servidor
+            if not idle:
+                logging.warning(f"No hay tareas programadas, se vuelve a comprobar cada {MAX_SLEEP}s")
+                write_status(tasks)
+            idle = True
+            time.sleep(MAX_SLEEP)
+            continue
+        idle = False
+        now = datetime.now()
+        for task in tasks:
+            if task.next_run <= now:
+                logging.info(f"Iniciando tarea programada: {task.name}")
+                task.start(now)
+        maintenance = start_maintenance(tasks, maintenance)
+        write_status(tasks)
+
+        # Dormir hasta la próxima ejecución (como máximo MAX_SLEEP segundos)
+        wait = min(task.next_run for task in tasks) - datetime.now()
+        time.sleep(min(MAX_SLEEP, max(1.0, wait.total_seconds())))
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Backups de archivo único con acceso directo a cada tabla
+
+Con SEEKABLE_BACKUPS (activo por defecto), backup_mysql.py comprime el
+volcado en bloques independientes que empiezan en el encabezado de cada tabla
+(gzip, zstd y lz4 admiten bloques concatenados, así que el archivo sigue
+siendo un `.sql.gz` normal para gunzip) y guarda junto al backup un índice
+`<archivo>.index.json` con la posición comprimida y sin comprimir de cada
+bloque y de cada tabla.
+
+Para restaurar unas pocas tablas solo se descomprimen sus bloques: la
+cabecera del volcado, y la estructura, los datos y los triggers de cada
+tabla, en paralelo y sin tocar el resto de la base de datos destino. Los
+backups sin índice (anteriores, deduplicados) se recorren una vez extrayendo
+las tablas pedidas, y los backups por tablas usan su manifest.
+
+    python seekable_archive.py tables backups/db_20250101_233000.sql.gz
+    python seekable_archive.py extract backups/db_20250101_233000.sql.gz pagos usuarios > tablas.sql
+"""
+
+import bisect
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import bulk_load
+from backup_layout import index_path, is_chunked_backup, is_dedup_backup, read_manifest
+from compression import codec_for_path, get_codec, open_output
+from dedup_store import open_backup
+from restore_engine import (
+    DATA_MARKER, DATABASE_STATEMENTS, OBJECTS_MARKERS, READ_CHUNK_SIZE, SCHEMA_MARKERS,
+    RestoreError, iter_chunks, iter_lines, load_stream, section_name
+)
+
+INDEX_FORMAT = 1
+
+# Tamaño máximo de un bloque sin comprimir
+SEEKABLE_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Una sección solo empieza un bloque nuevo si el anterior ya tiene este tamaño
+# (las tablas pequeñas comparten bloque y el ratio de compresión no empeora)
+SEEKABLE_MIN_BLOCK = 64 * 1024
+
+# Encabezados de sección; las tablas empiezan con su estructura o sus datos
+TABLE_MARKERS = (SCHEMA_MARKERS[0], DATA_MARKER)
+SECTION_MARKERS = (*SCHEMA_MARKERS, DATA_MARKER, *OBJECTS_MARKERS)
+SECTION_LINE = re.compile(b'^(?:' + b'|'.join(re.escape(m) for m in SECTION_MARKERS) + b')[^\n]*', re.M)
+
+# Líneas incompletas más largas que esto no pueden ser un encabezado
+MAX_SECTION_LINE = 4096
+
+
+class SectionIndexer:
+    """
+    Posiciones sin comprimir de las tablas de un volcado de mysqldump
+
+    Recibe el volcado por bloques (sin dividirlo en líneas) y registra, para
+    cada tabla, los rangos [inicio, fin) de su estructura, datos y triggers.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.header_end = None
+        self.tables = {}
+        self._current = None  # (tabla, inicio) de la sección abierta
+        self._carry = b''
+        self._continuation = False  # El bloque siguiente empieza a mitad de una línea
+
+    def feed(self, data):
+        """
+        Procesa un bloque del volcado
+
+        Returns:
+            list: Posiciones donde empieza una sección
+        """
+        text = self._carry + data if self._carry else data
+        base = self.offset - len(self._carry)
+        self.offset += len(data)
+        end = text.rfind(b'\n') + 1
+        if self._continuation and end == 0:
+            return []
+
+        pos = text.find(b'\n') + 1 if self._continuation else 0
+        starts = []
+        for match in SECTION_LINE.finditer(text, pos, end):
+            starts.append(base + match.start())
+            self._section(match.group(), base + match.start())
+
+        # La última línea incompleta se conserva solo si puede ser un encabezado
+        tail = text[end:]
+        if len(tail) < MAX_SECTION_LINE and b'-- '.startswith(tail[:3]):
+            self._carry, self._continuation = bytes(tail), False
+        else:
+            self._carry, self._continuation = b'', True
+        return starts
+
+    def _section(self, line, start):
+        if self.header_end is None:
+            self.header_end = start
+        if self._current is not None:
+            name, begin = self._current
+            ranges = self.tables.setdefault(name, [])
+            # La estructura y los datos de una tabla suelen ser contiguos
+            if ranges and ranges[-1][1] == begin:
+                ranges[-1][1] = start
+            else:
+                ranges.append([begin, start])
+            self._current = None
+        if line.startswith(TABLE_MARKERS):
+            self._current = (table_name(line), start)
+
+    def close(self):
+        """Cierra la última sección al terminar el volcado"""
+        if self._carry.startswith(SECTION_MARKERS):
+            self._section(self._carry, self.offset - len(self._carry))
+        self._carry = b''
+        self._section(b'', self.offset)
+
+
+def table_name(line):
+    """Nombre de la tabla de un encabezado de sección, sin escapar"""
+    return section_name(line).replace('``', '`')
+
+
+def build_index(codec, blocks, indexer):
+    """
+    Índice de un backup
+
+    Args:
+        codec (Codec): Codec del backup
+        blocks (list): [inicio sin comprimir, bytes sin comprimir, inicio comprimido, bytes comprimidos]
+                       de cada bloque independiente, en orden
+        indexer (SectionIndexer): Secciones del volcado completo (ya cerrado)
+
+    Returns:
+        dict: Contenido de `<archivo>.index.json`
+    """
+    return {
+        'format': INDEX_FORMAT,
+        'codec': codec.name,
+        'raw_bytes': indexer.offset,
+        'size': sum(block[3] for block in blocks),
+        'blocks': blocks,
+        'header': [0, indexer.header_end or 0],
+        'tables': indexer.tables
+    }
+
+
+def write_index(path, index):
+    """Escribe el índice de un backup de forma atómica"""
+    target = index_path(path)
+    tmp_path = target.with_name(target.name + '.part')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp_path, target)
+
+
+def read_index(path):
+    """
+    Índice de un backup de archivo único
+
+    Returns:
+        dict: Índice, o None si no tiene o no corresponde al archivo actual
+    """
+    try:
+        with open(index_path(path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('format') != INDEX_FORMAT or index['size'] != Path(path).stat().st_size:
+            return None
+        return index
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class SeekableWriter:
+    """
+    Escritor que comprime en bloques independientes y construye el índice
+
+    Los bloques se comprimen en paralelo (zlib, zstd y lz4 liberan el GIL) y
+    se escriben en orden. Cada sección del volcado empieza un bloque nuevo si
+    el actual tiene al menos SEEKABLE_MIN_BLOCK bytes; ningún bloque supera
+    SEEKABLE_BLOCK_SIZE.
+
+    Args:
+        codec (Codec): Codec de compresión
+        target: Ruta o archivo binario abierto (no se cierra al terminar)
+        level (int): Nivel de compresión (None = el del codec)
+        threads (int): Bloques comprimidos a la vez
+    """
+
+    def __init__(self, codec, target, level=None, threads=1):
+        self.codec = codec
+        self.indexer = SectionIndexer()
+        self.blocks = []
+        self._file, self._owned = open_output(target)
+        self._level = level
+        threads = max(1, threads or os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._max_pending = threads * 2
+        self._pending = []
+        self._buffer = bytearray()
+        self._buffer_offset = 0
+        self._size = 0
+
+    def write(self, data):
+        starts = self.indexer.feed(data)
+        self._buffer.extend(data)
+        for start in starts:
+            if start - self._buffer_offset >= SEEKABLE_MIN_BLOCK:
+                self._submit(start - self._buffer_offset)
+        while len(self._buffer) >= SEEKABLE_BLOCK_SIZE:
+            self._submit(SEEKABLE_BLOCK_SIZE)
+        return len(data)
+
+    def _submit(self, length):
+        block = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        future = self._executor.submit(self.codec.compress_block, block, self._level)
+        self._pending.append((self._buffer_offset, length, future))
+        self._buffer_offset += length
+        while len(self._pending) >= self._max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        raw_offset, raw_bytes, future = self._pending.pop(0)
+        data = future.result()
+        self._file.write(data)
+        self.blocks.append([raw_offset, raw_bytes, self._size, len(data)])
+        self._size += len(data)
+
+    def close(self):
+        if self._executor is None:
+            return
+        try:
+            if self._buffer or not (self._pending or self.blocks):
+                self._submit(len(self._buffer))
+            while self._pending:
+                self._write_next()
+            self.indexer.close()
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            if self._owned:
+                self._file.close()
+
+    def index(self):
+        """Índice del archivo escrito (tras close())"""
+        return build_index(self.codec, self.blocks, self.indexer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RangeReader:
+    """Rango de bytes de un archivo abierto, para los lectores de los codecs"""
+
+    def __init__(self, f, offset, length):
+        f.seek(offset)
+        self._file = f
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readable(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def read_range(path, index, start, end):
+    """
+    Descomprime solo los bloques que contienen el rango [start, end)
+
+    Yields:
+        bytes: Bloques del volcado sin comprimir
+    """
+    codec = codec_for_path(path)
+    blocks = index['blocks']
+    offsets = [block[0] for block in blocks]
+    first = max(0, bisect.bisect_right(offsets, start) - 1)
+    last = max(first, bisect.bisect_left(offsets, end) - 1)
+    compressed_start = blocks[first][2]
+    compressed_end = blocks[last][2] + blocks[last][3]
+    skip, remaining = start - blocks[first][0], end - start
+
+    with open(path, 'rb') as f:
+        with codec.open_reader(RangeReader(f, compressed_start, compressed_end - compressed_start)) as reader:
+            while skip or remaining:
+                chunk = reader.read(min(skip or remaining, READ_CHUNK_SIZE))
+                if not chunk:
+                    raise RestoreError(f"{Path(path).name}: el índice no corresponde al archivo")
+                if skip:
+                    skip -= len(chunk)
+                else:
+                    remaining -= len(chunk)
+                    yield chunk
+
+
+def filter_header(lines):
+    """Cabecera del volcado sin las sentencias que fijan la base de datos original"""
+    return b''.join(line for line in lines if not line.startswith(DATABASE_STATEMENTS))
+
+
+def drop_statement(table):
+    # Los volcados se hacen con --skip-add-drop-table
+    return f"DROP TABLE IF EXISTS `{table.replace('`', '``')}`;\n".encode('utf-8')
+
+
+def list_tables(backup_path):
+    """
+    Tablas de un backup indexado o por tablas, con sus bytes sin comprimir
+
+    Returns:
+        dict: Bytes por tabla, o None si el backup no tiene índice
+    """
+    backup_path = Path(backup_path)
+    if is_chunked_backup(backup_path):
+        return {table['name']: table['raw_bytes'] for table in read_manifest(backup_path)['tables']}
+    index = read_index(backup_path) if backup_path.is_file() else None
+    if index is None:
+        return None
+    return {name: sum(end - start for start, end in ranges) for name, ranges in index['tables'].items()}
+
+
+def indexed_units(backup_path, index, tables):
+    """Unidades de restauración de un backup con índice: se leen por rangos"""
+    header = filter_header(iter_lines(_ChunkReader(read_range(backup_path, index, *index['header']))))
+    units = {}
+    for table in tables:
+        ranges = index['tables'].get(table)
+        if ranges is None:
+            continue
+
+        def chunks(table=table, ranges=ranges):
+            yield header + drop_statement(table)
+            for start, end in ranges:
+                yield from read_range(backup_path, index, start, end)
+
+        units[table] = (sum(end - start for start, end in ranges), chunks)
+    return units
+
+
+def scan_units(reader, tables, work_dir, prefix):
+    """
+    Extrae las tablas pedidas recorriendo un volcado una vez
+
+    Cada tabla queda en un archivo temporal (sin comprimir) con la cabecera
+    del volcado, su DROP TABLE, su estructura, datos y triggers.
+
+    Returns:
+        dict: (bytes, función que itera el archivo) por tabla
+    """
+    wanted = set(tables)
+    header_lines = []
+    header = None
+    files = {}
+    current = None
+    try:
+        for line in iter_lines(reader):
+            if line.startswith(SECTION_MARKERS):
+                if header is None:
+                    header = filter_header(header_lines)
+                current = table_name(line) if line.startswith(TABLE_MARKERS) else None
+                if current in wanted and current not in files:
+                    files[current] = open(work_dir / f"{prefix}_{len(files):05d}.sql", 'wb')
+                    files[current].write(header + drop_statement(current))
+            elif header is None:
+                header_lines.append(line)
+            if current in files:
+                files[current].write(line)
+    finally:
+        for f in files.values():
+            f.close()
+
+    units = {}
+    for table, f in files.items():
+        path = Path(f.name)
+        units[table] = (path.stat().st_size, lambda path=path: _iter_file(path))
+    return units
+
+
+def chunked_units(backup_path, tables, work_dir):
+    """Unidades de un backup por tablas: estructura (de schema.sql) y su archivo de datos"""
+    manifest = read_manifest(backup_path)
+    data_files = {table['name']: table for table in manifest['tables']}
+    schema_path = backup_path / manifest['schema']['file']
+    with codec_for_path(schema_path).open_reader(schema_path) as reader:
+        schema_units = scan_units(reader, [t for t in tables if t in data_files], work_dir, 'schema')
+
+    codec = get_codec(manifest['codec'])
+    units = {}
+    for table, (schema_bytes, schema_chunks) in schema_units.items():
+        data = data_files[table]
+        data_path = backup_path / data['file']
+
+        def chunks(schema_chunks=schema_chunks, data_path=data_path, table=table, data=data):
+            yield from schema_chunks()
+            with codec.open_reader(data_path) as reader:
+                # Los datos en TSV (BACKUP_LAYOUT=tab) se envían como INSERT
+                if data.get('format') == bulk_load.TSV_FORMAT:
+                    yield from bulk_load.insert_chunks(reader, table, data.get('columns'))
+                else:
+                    yield from iter_chunks(reader)
+
+        units[table] = (schema_bytes + data['raw_bytes'], chunks)
+    return units
+
+
+class _ChunkReader:
+    # Lector con read() sobre un iterador de bloques (para iter_lines)
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def read(self, size=-1):
+        return next(self._chunks, b'')
+
+
+def _iter_file(path):
+    with open(path, 'rb') as f:
+        yield from iter_chunks(f)
+
+
+def table_units(backup_path, tables, work_dir):
+    """
+    Unidades de restauración de las tablas pedidas
+
+    Returns:
+        tuple: (dict de (bytes, función que itera su SQL) por tabla, método:
+               'index', 'manifest' o 'scan')
+    """
+    backup_path = Path(backup_path)
+    if is_chunked_backup(backup_path):
+        return chunked_units(backup_path, tables, work_dir), 'manifest'
+    index = read_index(backup_path) if not is_dedup_backup(backup_path) else None
+    if index is not None:
+        return indexed_units(backup_path, index, tables), 'index'
+
+    if is_dedup_backup(backup_path):
+        reader = open_backup(backup_path)
+    else:
+        codec = codec_for_path(backup_path)
+        if codec is None:
+            raise RestoreError(f"Formato de backup no reconocido: {backup_path.name}")
+        reader = codec.open_reader(backup_path)
+    with reader:
+        return scan_units(reader, tables, work_dir, 'table'), 'scan'
+
+
+def restore_tables(backup_path, tables, restore_cmd, workers=4, timeout=None, work_dir=None, on_table=None, tracker=None):
+    """
+    Restaura solo algunas tablas de un backup, en paralelo
+
+    Cada tabla se elimina (si existe) y se vuelve a crear en la base de datos
+    de `restore_cmd`; el resto de la base de datos no se modifica.
+
+    Args:
+        backup_path (Path): Backup (archivo único, por tablas o deduplicado)
+        tables (list): Nombres de las tablas
+        restore_cmd (list): Comando mysql con la base de datos destino como último argumento
+        workers (int): Conexiones simultáneas
+        timeout (int): Segundos máximos por tabla (None = sin límite)
+        work_dir (Path): Directorio temporal para los backups sin índice
+        on_table (callable): on_table(tablas_terminadas, total) tras cada tabla
+        tracker (ProgressTracker): Progreso de la restauración (opcional)
+
+    Returns:
+        dict: Métricas de la restauración (como restore_engine.restore())
+
+    Raises:
+        RestoreError: Si alguna tabla no está en el backup o falla su carga
+    """
+    start = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix='restore-', dir=work_dir) as tmp:
+        if tracker is not None:
+            tracker.set_stage('split')
+        units, method = table_units(backup_path, tables, Path(tmp))
+        missing = [table for table in tables if table not in units]
+        if missing:
+            raise RestoreError(f"Tablas no encontradas en {Path(backup_path).name}: {', '.join(missing)}")
+        extract_seconds = time.monotonic() - start
+
+        workers = max(1, min(workers, len(units)))
+        if tracker is not None:
+            tracker.set_stage('load', total_bytes=sum(size for size, _ in units.values()),
+                              total_tables=len(units), restart=True)
+        table_seconds = {}
+        # Las tablas más grandes primero para reducir el tiempo total
+        ordered = sorted(units.items(), key=lambda item: item[1][0], reverse=True)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='restore') as executor:
+            futures = {
+                executor.submit(load_stream, chunks(), table, restore_cmd, timeout, tracker): table
+                for table, (_, chunks) in ordered
+            }
+            try:
+                for future in as_completed(futures):
+                    table_seconds[futures[future]] = round(future.result(), 3)
+                    if tracker is not None:
+                        tracker.add_table()
+                    if on_table is not None:
+                        on_table(len(table_seconds), len(units))
+            except BaseException:
+                for pending in futures:
+                    pending.cancel()
+                raise
+
+    return {
+        'tables': len(units),
+        'workers': workers,
+        'method': method,
+        'extract_seconds': round(extract_seconds, 3),
+        'total_seconds': round(time.monotonic() - start, 3),
+        'table_seconds': table_seconds
+    }
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] not in ('tables', 'extract') or (argv[0] == 'extract' and len(argv) < 3):
+        print("Uso: python seekable_archive.py tables <backup>")
+        print("     python seekable_archive.py extract <backup> <tabla> [<tabla>...] > tablas.sql")
+        return 2
+    backup_path = Path(argv[1])
+
+    if argv[0] == 'tables':
+        tables = list_tables(backup_path)
+        if tables is None:
+            print(f"{backup_path.name} no tiene índice de tablas")
+            return 1
+        for name, raw_bytes in sorted(tables.items()):
+            print(f"  {name:<40} {raw_bytes / (1024 * 1024):10.2f} MB")
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix='extract-') as tmp:
+        units, method = table_units(backup_path, argv[2:], Path(tmp))
+        missing = [table for table in argv[2:] if table not in units]
+        if missing:
+            print(f"Tablas no encontradas: {', '.join(missing)}", file=sys.stderr)
+            return 1
+        for table in argv[2:]:
+            for chunk in units[table][1]():
+                sys.stdout.buffer.write(chunk)
+        print(f"{len(units)} tablas extraídas ({method})", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Restauración sin dejar la base de datos vacía: base de datos sombra e intercambio
+
+La restauración normal elimina la base de datos destino antes de cargar el
+backup, así que queda vacía mientras dura la carga y se pierde si falla.
+En modo intercambio:
+1. El backup se restaura en `<db>__shadow` mientras `<db>` sigue en uso
+   (sin triggers, vistas ni rutinas: restore_engine los deja para el final).
+2. Se valida la sombra: cada tabla tiene las filas del volcado (como en los
+   simulacros de restore_drill.py; el conteo se hace mientras se carga).
+3. Una sola sentencia RENAME TABLE, atómica, mueve las tablas actuales a
+   `<db>__previous` y las restauradas a `<db>`.
+4. Se cargan en `<db>` los triggers, rutinas, eventos y vistas del backup.
+
+Si algo falla antes del paso 3 la base de datos no se modifica. MySQL no
+permite mover a otra base de datos una tabla con triggers: esas tablas se
+renombran dentro de `<db>` en el intercambio y pasan a `<db>__previous`
+(sin sus triggers) justo después.
+
+`<db>__previous` se conserva hasta el siguiente intercambio para poder
+volver atrás (SWAP_KEEP_PREVIOUS=false la elimina al terminar).
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import restore_drill
+import restore_engine
+
+SHADOW_SUFFIX = '__shadow'
+PREVIOUS_SUFFIX = '__previous'
+
+# Longitud máxima de un identificador de MySQL
+MAX_NAME_LENGTH = 64
+
+# Conservar las tablas anteriores en <db>__previous tras el intercambio
+SWAP_KEEP_PREVIOUS = os.environ.get('SWAP_KEEP_PREVIOUS', 'true').lower() in ('1', 'true', 'yes')
+
+# Segundos que RENAME TABLE espera los bloqueos de las tablas en uso; las
+# consultas nuevas esperan detrás de él, así que es el corte máximo
+SWAP_LOCK_WAIT_TIMEOUT = int(os.environ.get('SWAP_LOCK_WAIT_TIMEOUT', '30'))
+
+
+class SwapError(Exception):
+    """La base de datos sombra no se pudo validar o intercambiar"""
+
+
+def _quote(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _literal(value):
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def schema_name(database, suffix):
+    """Nombre de la base de datos sombra o anterior (recortado a 64 caracteres)"""
+    return database[:MAX_NAME_LENGTH - len(suffix)] + suffix
+
+
+def run_sql(target, sql, database=None):
+    """restore_drill.run_sql() con SwapError"""
+    try:
+        return restore_drill.run_sql(target, sql, database)
+    except restore_drill.DrillError as e:
+        raise SwapError(str(e)) from e
+
+
+def base_tables(target, database):
+    """Tablas (sin vistas) de una base de datos"""
+    rows = run_sql(target, "SELECT TABLE_NAME FROM information_schema.TABLES "
+                           f"WHERE TABLE_SCHEMA = {_literal(database)} AND TABLE_TYPE = 'BASE TABLE'")
+    return sorted(row[0] for row in rows)
+
+
+def views(target, database):
+    rows = run_sql(target, "SELECT TABLE_NAME FROM information_schema.VIEWS "
+                           f"WHERE TABLE_SCHEMA = {_literal(database)}")
+    return sorted(row[0] for row in rows)
+
+
+def triggers(target, database):
+    """
+    Triggers de una base de datos
+
+    Returns:
+        list: Tuplas (trigger, tabla)
+    """
+    rows = run_sql(target, "SELECT TRIGGER_NAME, EVENT_OBJECT_TABLE FROM information_schema.TRIGGERS "
+                           f"WHERE TRIGGER_SCHEMA = {_literal(database)}")
+    return sorted((row[0], row[1]) for row in rows)
+
+
+def rename_statement(database, shadow, previous, live_tables, shadow_tables, parked):
+    """
+    RENAME TABLE del intercambio
+
+    Args:
+        database (str): Base de datos en uso
+        shadow (str): Base de datos sombra (ya validada)
+        previous (str): Destino de las tablas actuales
+        live_tables (list): Tablas actuales
+        shadow_tables (list): Tablas restauradas
+        parked (dict): {tabla: nombre temporal} de las tablas actuales con triggers
+
+    Returns:
+        str: Sentencia única (MySQL la aplica de forma atómica)
+    """
+    pairs = []
+    for table in live_tables:
+        if table in parked:
+            pairs.append(f"{_quote(database)}.{_quote(table)} TO {_quote(database)}.{_quote(parked[table])}")
+        else:
+            pairs.append(f"{_quote(database)}.{_quote(table)} TO {_quote(previous)}.{_quote(table)}")
+    for table in shadow_tables:
+        pairs.append(f"{_quote(shadow)}.{_quote(table)} TO {_quote(database)}.{_quote(table)}")
+    return 'RENAME TABLE ' + ', '.join(pairs)
+
+
+def validate_shadow(target, shadow, expected):
+    """
+    Comprueba que cada tabla de la sombra tiene las filas del volcado
+
+    Returns:
+        int: Filas restauradas
+    """
+    try:
+        restored = restore_drill.restored_rows(target, shadow, expected)
+    except restore_drill.DrillError as e:
+        raise SwapError(str(e)) from e
+    mismatches = [table for table, count in sorted(expected.items()) if restored.get(table) != count]
+    if mismatches:
+        raise SwapError(f"Filas distintas en {len(mismatches)} tablas de {shadow}: {', '.join(mismatches[:5])}")
+    return sum(restored.values())
+
+
+def swap_tables(target, database, shadow, previous):
+    """
+    Intercambia las tablas de `database` por las de `shadow`
+
+    Returns:
+        dict: Tablas intercambiadas y segundos del RENAME TABLE
+    """
+    live_tables = base_tables(target, database)
+    shadow_tables = base_tables(target, shadow)
+    with_triggers = {table for _, table in triggers(target, database)}
+    parked = {table: f'__swap_{n}' for n, table in enumerate(t for t in live_tables if t in with_triggers)}
+
+    run_sql(target, f"DROP DATABASE IF EXISTS {_quote(previous)}; CREATE DATABASE {_quote(previous)};")
+    statement = rename_statement(database, shadow, previous, live_tables, shadow_tables, parked)
+    start = time.monotonic()
+    run_sql(target, f"SET SESSION lock_wait_timeout = {SWAP_LOCK_WAIT_TIMEOUT}; {statement};")
+    seconds = time.monotonic() - start
+    logging.info(f"✓ {len(shadow_tables)} tablas intercambiadas en {database} en {seconds:.3f}s "
+                 f"(anteriores en {previous})")
+
+    # Tras el intercambio los triggers de `database` son los de las tablas
+    # anteriores; las vistas se vuelven a crear con los objetos del backup
+    cleanup = [f"DROP TRIGGER {_quote(database)}.{_quote(trigger)}" for trigger, _ in triggers(target, database)]
+    cleanup += [f"RENAME TABLE {_quote(database)}.{_quote(temporary)} TO {_quote(previous)}.{_quote(table)}"
+                for table, temporary in parked.items()]
+    cleanup += [f"DROP VIEW IF EXISTS {_quote(database)}.{_quote(view)}" for view in views(target, database)]
+    if cleanup:
+        run_sql(target, '; '.join(cleanup) + ';')
+    return {'tables_swapped': len(shadow_tables), 'swap_seconds': round(seconds, 3)}
+
+
+def restore_with_swap(backup_path, target, database, workers=4, timeout=None, work_dir=None,
+                      on_table=None, tracker=None, on_stage=None):
+    """
+    Restaura un backup en una base de datos sombra y la intercambia con `database`
+
+    Args:
+        backup_path (Path): Backup a restaurar
+        target (dict): Servidor destino (host, port, user, password)
+        database (str): Base de datos a reemplazar (se crea si no existe)
+        workers (int): Conexiones simultáneas para los datos
+        timeout (int): Segundos máximos por unidad (None = sin límite)
+        work_dir (Path): Directorio para dividir volcados de archivo único
+        on_table (callable): on_table(tablas_terminadas, total) tras cada tabla
+        tracker (ProgressTracker): Progreso de la restauración (opcional)
+        on_stage (callable): on_stage(etapa) en 'validate', 'swap' y 'objects'
+
+    Returns:
+        dict: Métricas de restore_engine.restore() con rows, tables_swapped y swap_seconds
+    """
+    backup_path = Path(backup_path)
+    shadow = schema_name(database, SHADOW_SUFFIX)
+    previous = schema_name(database, PREVIOUS_SUFFIX)
+    swap_stats = {}
+
+    run_sql(target, f"DROP DATABASE IF EXISTS {_quote(shadow)}; CREATE DATABASE {_quote(shadow)}; "
+                    f"CREATE DATABASE IF NOT EXISTS {_quote(database)};")
+    restore_cmd = restore_drill.mysql_command(target, '--force', '--comments', '--binary-mode=0', shadow)
+    objects_cmd = restore_drill.mysql_command(target, '--force', '--comments', '--binary-mode=0', database)
+
+    def validate_and_swap():
+        if on_stage is not None:
+            on_stage('validate')
+        swap_stats['rows'] = validate_shadow(target, shadow, expected.result())
+        logging.info(f"✓ {shadow} validada: {swap_stats['rows']} filas")
+        if on_stage is not None:
+            on_stage('swap')
+        swap_stats.update(swap_tables(target, database, shadow, previous))
+        if on_stage is not None:
+            on_stage('objects')
+
+    logging.info(f"Restaurando {backup_path.name} en {shadow} (intercambio con {database})")
+    try:
+        # Las filas esperadas se cuentan mientras se carga la sombra
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            expected = executor.submit(restore_drill.expected_rows, backup_path)
+            stats = restore_engine.restore(
+                backup_path,
+                restore_cmd,
+                workers=workers,
+                timeout=timeout,
+                work_dir=work_dir,
+                on_table=on_table,
+                tracker=tracker,
+                objects_cmd=objects_cmd,
+                before_objects=validate_and_swap
+            )
+    except Exception as e:
+        if 'swap_seconds' in swap_stats:
+            logging.error(f"✗ Error tras el intercambio de {database} (tablas anteriores en {previous}): {str(e)}")
+        else:
+            logging.error(f"✗ Restauración en {shadow} fallida, {database} no se ha modificado: {str(e)}")
+        raise
+    finally:
+        try:
+            run_sql(target, f"DROP DATABASE IF EXISTS {_quote(shadow)};")
+        except SwapError as e:
+            logging.warning(f"No se pudo eliminar la base de datos sombra {shadow}: {str(e)}")
+
+    if not SWAP_KEEP_PREVIOUS:
+        run_sql(target, f"DROP DATABASE IF EXISTS {_quote(previous)};")
+    stats.update(swap_stats)
+    return stats
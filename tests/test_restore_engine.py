@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la división de volcados de restore_engine.py
+
+    python -m unittest discover tests
+"""
+
+import gzip
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import restore_engine  # noqa: E402
+
+# Volcado de `mysqldump --databases shop` con una tabla y una vista
+DUMP = b"""-- MySQL dump 10.13
+--
+-- Host: localhost    Database: shop
+-- ------------------------------------------------------
+/*!40101 SET NAMES utf8mb4 */;
+
+--
+-- Current Database: `shop`
+--
+
+CREATE DATABASE /*!32312 IF NOT EXISTS*/ `shop` /*!40100 DEFAULT CHARACTER SET utf8mb4 */;
+
+USE `shop`;
+
+--
+-- Table structure for table `items`
+--
+
+CREATE TABLE `items` (
+  `id` int NOT NULL,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB;
+
+--
+-- Dumping data for table `items`
+--
+
+LOCK TABLES `items` WRITE;
+INSERT INTO `items` VALUES (1),(2);
+UNLOCK TABLES;
+
+--
+-- Temporary view structure for view `v`
+--
+
+SET @saved_cs_client     = @@character_set_client;
+/*!50001 CREATE VIEW `v` AS SELECT 1 AS `id`*/;
+SET character_set_client = @saved_cs_client;
+
+--
+-- Current Database: `shop`
+--
+
+USE `shop`;
+
+--
+-- Final view structure for view `v`
+--
+
+/*!50001 DROP VIEW IF EXISTS `v`*/;
+/*!50001 VIEW `v` AS select `items`.`id` AS `id` from `items` */;
+
+-- Dump completed on 2026-01-01  0:00:00
+"""
+
+
+def read_unit(path):
+    codec = restore_engine.codec_for_path(path)
+    with (codec.open_reader(path) if codec else open(path, 'rb')) as reader:
+        return reader.read()
+
+
+class SplitDumpTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.backup = self.tmp / 'shop_20260101_000000.sql.gz'
+        with gzip.open(self.backup, 'wb') as f:
+            f.write(DUMP)
+        self.work = self.tmp / 'work'
+        self.work.mkdir()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_database_statements_dropped_from_every_unit(self):
+        plan = restore_engine.split_dump(self.backup, self.work)
+        units = [*plan.schema, *(path for _, path in plan.tables), *plan.objects]
+        self.assertEqual(len(plan.objects), 1)
+        for path in units:
+            content = read_unit(path)
+            self.assertNotIn(b'USE `shop`', content, path.name)
+            self.assertNotIn(b'CREATE DATABASE', content, path.name)
+
+    def test_sections(self):
+        plan = restore_engine.split_dump(self.backup, self.work)
+        self.assertEqual([table for table, _ in plan.tables], ['items'])
+        self.assertIn(b'INSERT INTO `items`', read_unit(plan.tables[0][1]))
+        self.assertIn(b'CREATE VIEW `v`', read_unit(plan.schema[0]))
+        objects = read_unit(plan.objects[0])
+        self.assertIn(b'VIEW `v` AS select', objects)
+        self.assertIn(b'-- Dump completed', objects)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,19 +3,75 @@
 Aplicación Flask para monitorear el estado de los backups de MySQL
 """
 
-from flask import Flask, render_template_string, jsonify, request
+from flask import Flask, Response, render_template_string, jsonify, request
 import os
 import json
 from pathlib import Path
 from datetime import datetime
 import subprocess
 import gzip
+import time
+
+import jobs
+import restore_engine
+from progress import ProgressRegistry, read_progress_file
+from backup_layout import is_backup, parse_backup_name, remove_backup
+from binlog_archive import BinlogArchive
+from catalog import open_catalog
+import integrity
+import metrics
+import mysql_native
+import restore_drill
+import retention
+import seekable_archive
+import shadow_restore
+from log_tail import LogTail
 
 app = Flask(__name__)
 
 BACKUP_DIR = Path('/app/backups')
 LOG_FILE = Path('/app/backup_mysql.log')
 STATUS_FILE = Path('/app/backup_status.json')
+PROGRESS_FILE = Path('/app/backup_progress.json')
+SCHEDULE_FILE = Path('/app/schedule_status.json')
+
+# Líneas de log devueltas por defecto y máximo por consulta de /api/logs
+LOG_LINES = 50
+MAX_LOG_LINES = 2000
+
+# Segundos entre eventos de progreso enviados por SSE
+PROGRESS_INTERVAL = 1.0
+
+# Restauración: conexiones simultáneas para los datos, límite por tabla
+# (0 = sin límite) y directorio para dividir volcados de archivo único
+RESTORE_PARALLELISM = int(os.environ.get('RESTORE_PARALLELISM', '4'))
+RESTORE_TIMEOUT = int(os.environ.get('RESTORE_TIMEOUT', '0')) or None
+RESTORE_WORK_DIR = Path(os.environ.get('RESTORE_WORK_DIR', str(BACKUP_DIR)))
+
+# Modo por defecto de /api/restore-backup: 'replace' (eliminar y cargar) o
+# 'swap' (cargar en una base de datos sombra e intercambiar, ver shadow_restore.py)
+RESTORE_MODES = ('replace', 'swap')
+RESTORE_MODE = os.environ.get('RESTORE_MODE', 'replace')
+
+# Backups verificados a la vez por /api/verify-backup (0 = uno por núcleo)
+VERIFY_WORKERS = int(os.environ.get('VERIFY_WORKERS', '0')) or None
+
+# Trabajos en segundo plano: simultáneos, máximo en cola y archivo de estado
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '10'))
+JOBS_FILE = Path('/app/jobs.json')
+
+job_manager = jobs.JobManager(JOBS_FILE, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE)
+
+# Catálogo de backups (se reconstruye desde el disco si no existe)
+BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+catalog = open_catalog(BACKUP_DIR)
+
+# Final del log de backups (lee solo el final del archivo y cachea las respuestas)
+log_tail = LogTail(LOG_FILE)
+
+# Progreso de las restauraciones de este proceso (los volcados lo publican en PROGRESS_FILE)
+restore_progress = ProgressRegistry()
 
 # Template HTML
 HTML_TEMPLATE = """
@@ -90,6 +146,38 @@ HTML_TEMPLATE = """
         .backups-list {
             padding: 30px;
         }
+        .progress-panel {
+            padding: 0 30px;
+        }
+        .progress-item {
+            background: #f8f9fa;
+            border-radius: 10px;
+            padding: 15px 20px;
+            margin-top: 15px;
+        }
+        .progress-item .progress-title {
+            display: flex;
+            justify-content: space-between;
+            margin-bottom: 8px;
+            color: #333;
+        }
+        .progress-bar {
+            height: 10px;
+            background: #e9ecef;
+            border-radius: 5px;
+            overflow: hidden;
+        }
+        .progress-bar div {
+            height: 100%;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            transition: width 0.5s;
+        }
+        .progress-item.failed .progress-bar div { background: #dc3545; }
+        .progress-item .progress-details {
+            margin-top: 6px;
+            font-size: 0.85em;
+            color: #666;
+        }
         .backups-list h2 {
             color: #333;
             margin-bottom: 20px;
@@ -429,6 +517,20 @@ HTML_TEMPLATE = """
             }, 5000);
         }
         
+        // Consulta un trabajo en segundo plano hasta que termine
+        function waitForJob(jobId, onDone) {
+            fetch('/api/jobs/' + jobId)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.state === 'queued' || job.state === 'running') {
+                        setTimeout(() => waitForJob(jobId, onDone), 2000);
+                    } else {
+                        onDone(job);
+                    }
+                })
+                .catch(() => setTimeout(() => waitForJob(jobId, onDone), 5000));
+        }
+        
         function runBackupNow() {
             const btn = document.getElementById('backupBtn');
             btn.disabled = true;
@@ -439,9 +541,17 @@ HTML_TEMPLATE = """
             fetch('/api/run-backup', { method: 'POST' })
                 .then(response => response.json())
                 .then(data => {
-                    if (data.status === 'success') {
-                        showNotification('✅ Backup completado exitosamente', 'success');
-                        setTimeout(() => location.reload(), 2000);
+                    if (data.status === 'accepted') {
+                        waitForJob(data.job_id, job => {
+                            if (job.state === 'succeeded') {
+                                showNotification('✅ Backup completado exitosamente', 'success');
+                                setTimeout(() => location.reload(), 2000);
+                            } else {
+                                showNotification('❌ Error: ' + job.error, 'error');
+                                btn.disabled = false;
+                                btn.textContent = '🔄 Ejecutar Backup';
+                            }
+                        });
                     } else {
                         showNotification('❌ Error: ' + data.message, 'error');
                         btn.disabled = false;
@@ -543,6 +653,7 @@ HTML_TEMPLATE = """
             const targetSelect = document.getElementById('targetServer');
             const targetIndex = targetSelect.value;
             const dbName = document.getElementById('targetDatabase').value.trim();
+            const pointInTime = document.getElementById('pointInTime').value;
             
             if (targetIndex === '') {
                 showNotification('⚠️ Debe seleccionar un servidor destino', 'error');
@@ -571,13 +682,20 @@ HTML_TEMPLATE = """
                 body: JSON.stringify({
                     filename: currentBackupFile,
                     target_index: parseInt(targetIndex),
-                    database_name: dbName
+                    database_name: dbName,
+                    point_in_time: pointInTime || null
                 })
             })
             .then(response => response.json())
             .then(data => {
-                if (data.status === 'success') {
-                    showNotification('✅ Restauración completada exitosamente', 'success');
+                if (data.status === 'accepted') {
+                    waitForJob(data.job_id, job => {
+                        if (job.state === 'succeeded') {
+                            showNotification('✅ Restauración completada exitosamente', 'success');
+                        } else {
+                            showNotification('❌ Error: ' + job.error, 'error');
+                        }
+                    });
                 } else {
                     showNotification('❌ Error: ' + data.message, 'error');
                 }
@@ -657,10 +775,63 @@ HTML_TEMPLATE = """
             });
         }
         
-        // Auto refresh cada 60 segundos
-        setTimeout(function() {
-            location.reload();
-        }, 60000);
+        // Progreso en vivo de volcados y restauraciones (SSE)
+        let activeOperations = 0;
+        
+        function formatMB(bytes) {
+            return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
+        }
+        
+        function formatSeconds(seconds) {
+            if (seconds === null || seconds === undefined) return '-';
+            const m = Math.floor(seconds / 60);
+            const s = Math.round(seconds % 60);
+            return m > 0 ? `${m}m ${s}s` : `${s}s`;
+        }
+        
+        function renderProgress(operations) {
+            const panel = document.getElementById('progressPanel');
+            activeOperations = operations.filter(op => op.status === 'running').length;
+            panel.innerHTML = operations.map(op => {
+                const kind = op.kind === 'dump' ? '💾 Backup' : '♻️ Restauración';
+                const percent = op.total_bytes ? Math.min(100, 100 * op.bytes / op.total_bytes) : (op.status === 'running' ? 0 : 100);
+                const tables = op.total_tables ? `${op.tables}/${op.total_tables}` : op.tables;
+                const state = op.status === 'running' ? (op.stale ? '⚠️ sin actividad' : op.stage) : op.status;
+                return `
+                    <div class="progress-item ${op.status}">
+                        <div class="progress-title">
+                            <strong>${kind}: ${op.name}</strong>
+                            <span>${state}</span>
+                        </div>
+                        <div class="progress-bar"><div style="width: ${percent.toFixed(1)}%"></div></div>
+                        <div class="progress-details">
+                            ${formatMB(op.bytes)}${op.total_bytes ? ' de ~' + formatMB(op.total_bytes) : ''}
+                            · ${op.mb_per_s} MB/s · tablas: ${tables}
+                            ${op.kind === 'dump' ? '· filas: ~' + op.rows : ''}
+                            · transcurrido: ${formatSeconds(op.elapsed_seconds)}
+                            · ETA: ${formatSeconds(op.eta_seconds)}
+                        </div>
+                    </div>
+                `;
+            }).join('');
+        }
+        
+        if (window.EventSource) {
+            const progressSource = new EventSource('/api/progress/stream');
+            progressSource.onmessage = event => renderProgress(JSON.parse(event.data).operations);
+        }
+        
+        // Auto refresh cada 60 segundos (se pospone mientras haya operaciones en curso)
+        function scheduleRefresh() {
+            setTimeout(function() {
+                if (activeOperations > 0) {
+                    scheduleRefresh();
+                } else {
+                    location.reload();
+                }
+            }, 60000);
+        }
+        scheduleRefresh();
     </script>
 </head>
 <body>
@@ -689,6 +860,34 @@ HTML_TEMPLATE = """
             </div>
         </div>
         
+        <div id="progressPanel" class="progress-panel"></div>
+        
+        {% if schedule %}
+        <div class="backups-list">
+            <h2>🕒 Próximas Ejecuciones</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>Tarea</th>
+                        <th>Programación</th>
+                        <th>Próxima ejecución</th>
+                        <th>Última</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for task in schedule %}
+                    <tr>
+                        <td><strong>{{ task.name }}</strong>{% if task.databases %}<br><small>{{ task.databases|join(', ') }}</small>{% endif %}</td>
+                        <td><code>{{ task.schedule }}</code> (+{{ task.stagger_seconds }}s)</td>
+                        <td>{{ task.next_run_display }}</td>
+                        <td>{{ 'en curso' if task.running else (task.last_status or '-') }}</td>
+                    </tr>
+                    {% endfor %}
+                </tbody>
+            </table>
+        </div>
+        {% endif %}
+        
         <div class="backups-list">
             <h2>📁 Archivos de Backup Recientes</h2>
             
@@ -789,6 +988,14 @@ HTML_TEMPLATE = """
                         ⚠️ Si la base de datos existe, será eliminada y recreada
                     </small>
                 </div>
+                
+                <div class="form-group">
+                    <label>⏱️ Recuperar hasta (opcional):</label>
+                    <input type="datetime-local" id="pointInTime" step="1" />
+                    <small style="color: #666; display: block; margin-top: 5px;">
+                        Reproduce los binlogs archivados tras el backup hasta este instante
+                    </small>
+                </div>
             </div>
             <div class="modal-footer">
                 <button class="btn-modal btn-modal-secondary" onclick="closeRestoreModal()">Cancelar</button>
@@ -806,7 +1013,7 @@ HTML_TEMPLATE = """
 """
 
 def get_backup_stats():
-    """Obtener estadísticas de los backups"""
+    """Obtener estadísticas de los backups (desde el catálogo)"""
     stats = {
         'total': 0,
         'last_backup': 'N/A',
@@ -814,22 +1021,19 @@ def get_backup_stats():
         'last_status': 'unknown'
     }
     
-    if BACKUP_DIR.exists():
-        backup_files = sorted(BACKUP_DIR.glob('*.sql.gz'), key=os.path.getmtime, reverse=True)
-        stats['total'] = len(backup_files)
-        
-        if backup_files:
-            last_file = backup_files[0]
-            last_time = datetime.fromtimestamp(last_file.stat().st_mtime)
-            stats['last_backup'] = last_time.strftime('%d/%m/%Y %H:%M')
-            
-            # Calcular tamaño total
-            total_bytes = sum(f.stat().st_size for f in backup_files)
-            total_mb = total_bytes / (1024 * 1024)
-            if total_mb > 1024:
-                stats['total_size'] = f"{total_mb/1024:.1f} GB"
-            else:
-                stats['total_size'] = f"{total_mb:.1f} MB"
+    totals = catalog.stats()
+    stats['total'] = totals['total']
+    
+    if totals['last_created_at']:
+        last_time = datetime.fromisoformat(totals['last_created_at'])
+        stats['last_backup'] = last_time.strftime('%d/%m/%Y %H:%M')
+        
+        # Tamaño total
+        total_mb = totals['total_size'] / (1024 * 1024)
+        if total_mb > 1024:
+            stats['total_size'] = f"{total_mb/1024:.1f} GB"
+        else:
+            stats['total_size'] = f"{total_mb:.1f} MB"
     
     # Leer último estado del archivo de estado
     if STATUS_FILE.exists():
@@ -842,42 +1046,36 @@ def get_backup_stats():
     
     return stats
 
-def get_recent_backups(limit=20):
-    """Obtener lista de backups recientes"""
+def get_schedule():
+    """Tareas programadas publicadas por scheduler.py (próxima y última ejecución)"""
+    try:
+        with open(SCHEDULE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('tasks', [])
+    except (OSError, ValueError):
+        return []
+
+def get_recent_backups(limit=20, offset=0, database=None, since=None, until=None):
+    """Obtener lista de backups recientes (desde el catálogo), con paginación y filtros"""
     backups = []
     
-    if BACKUP_DIR.exists():
-        backup_files = sorted(BACKUP_DIR.glob('*.sql.gz'), key=os.path.getmtime, reverse=True)[:limit]
-        
-        for backup_file in backup_files:
-            # Parsear nombre del archivo
-            filename = backup_file.stem.replace('.sql', '')
-            parts = filename.rsplit('_', 2)
-            
-            if len(parts) >= 3:
-                db_name = '_'.join(parts[:-2])
-                date_str = parts[-2]
-                time_str = parts[-1]
-                
-                # Formatear fecha y hora
-                try:
-                    dt = datetime.strptime(f"{date_str}_{time_str}", "%Y%m%d_%H%M%S")
-                    formatted_datetime = dt.strftime("%d/%m/%Y %H:%M:%S")
-                except:
-                    formatted_datetime = f"{date_str} {time_str}"
-                
-                # Calcular tamaño
-                size_bytes = backup_file.stat().st_size
-                size_mb = size_bytes / (1024 * 1024)
-                formatted_size = f"{size_mb:.2f} MB"
-                
-                backups.append({
-                    'database': db_name,
-                    'datetime': formatted_datetime,
-                    'size': formatted_size,
-                    'path': str(backup_file),
-                    'filename': backup_file.name
-                })
+    for row in catalog.query(database=database, since=since, until=until, limit=limit, offset=offset, uploads=True):
+        # Formatear fecha, hora y tamaño
+        formatted_datetime = datetime.fromisoformat(row['created_at']).strftime("%d/%m/%Y %H:%M:%S")
+        size_mb = row['size'] / (1024 * 1024)
+        formatted_size = f"{size_mb:.2f} MB"
+        backups.append({
+            'database': row['database'],
+            'datetime': formatted_datetime,
+            'size': formatted_size,
+            'path': str(BACKUP_DIR / row['filename']),
+            'filename': row['filename'],
+            'layout': row['layout'],
+            'sha256': row['sha256'],
+            'verify_status': row['verify_status'],
+            'verified_at': row['verified_at'],
+            'remote_status': row['remote_status'],
+            'uploaded_at': row['uploaded_at']
+        })
     
     return backups
 
@@ -886,12 +1084,16 @@ def index():
     """Página principal"""
     stats = get_backup_stats()
     backups = get_recent_backups()
+    schedule = get_schedule()
+    for task in schedule:
+        task['next_run_display'] = datetime.fromisoformat(task['next_run']).strftime("%d/%m/%Y %H:%M:%S")
     current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
     
     return render_template_string(
         HTML_TEMPLATE,
         stats=stats,
         backups=backups,
+        schedule=schedule,
         current_time=current_time
     )
 
@@ -902,63 +1104,383 @@ def api_stats():
 
 @app.route('/api/backups')
 def api_backups():
-    """API para obtener lista de backups"""
-    return jsonify(get_recent_backups())
+    """
+    API para obtener lista de backups
+    
+    Parámetros: limit, offset, database, since y until (fechas ISO, p.ej. 2025-01-31).
+    El total de resultados se devuelve en la cabecera X-Total-Count.
+    """
+    limit = min(request.args.get('limit', 20, type=int), 1000)
+    offset = request.args.get('offset', 0, type=int)
+    database = request.args.get('database')
+    since = request.args.get('since')
+    until = request.args.get('until')
+    # Una fecha sin hora en `until` incluye todo ese día
+    if until and len(until) == 10:
+        until += 'T23:59:59'
+    
+    response = jsonify(get_recent_backups(limit, offset, database, since, until))
+    response.headers['X-Total-Count'] = str(catalog.count(database, since, until))
+    return response
 
 @app.route('/api/logs')
 def api_logs():
-    """API para obtener últimas líneas del log"""
-    if LOG_FILE.exists():
-        with open(LOG_FILE, 'r') as f:
-            lines = f.readlines()
-            return jsonify({'logs': lines[-50:]})  # Últimas 50 líneas
-    return jsonify({'logs': []})
+    """
+    API para obtener las últimas líneas del log
+    
+    Parámetros: lines (máximo de líneas), since y file_id (offset y file_id de
+    la respuesta anterior, para recibir solo las líneas nuevas), level (nivel
+    mínimo: INFO, WARNING, ERROR) y database (entradas que la mencionan)
+    """
+    try:
+        lines = min(MAX_LOG_LINES, max(0, int(request.args.get('lines', LOG_LINES))))
+        since = request.args.get('since')
+        since = int(since) if since else None
+        file_id = request.args.get('file_id')
+        file_id = int(file_id) if file_id else None
+        result = log_tail.read(
+            lines=lines,
+            since=since,
+            file_id=file_id,
+            level=request.args.get('level') or None,
+            database=request.args.get('database') or None
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Parámetro inválido: {str(e)}'}), 400
+    return jsonify(result)
+
+def get_progress():
+    """Operaciones en curso: volcados (de backup_mysql.py) y restauraciones"""
+    return read_progress_file(PROGRESS_FILE) + restore_progress.snapshot()
+
+@app.route('/api/schedule')
+def api_schedule():
+    """API para obtener las próximas ejecuciones programadas"""
+    return jsonify({'tasks': get_schedule()})
+
+@app.route('/api/progress')
+def api_progress():
+    """API para obtener el progreso de volcados y restauraciones en curso"""
+    return jsonify({'operations': get_progress()})
+
+@app.route('/api/progress/stream')
+def api_progress_stream():
+    """Server-Sent Events con el progreso de las operaciones cada PROGRESS_INTERVAL segundos"""
+    def generate():
+        last = None
+        while True:
+            payload = json.dumps({'operations': get_progress()})
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+            else:
+                yield ": keepalive\n\n"
+            time.sleep(PROGRESS_INTERVAL)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/health')
 def health():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
+def run_backup_job(job, databases):
+    """
+    Trabajo en segundo plano: ejecuta backup_mysql.py y registra su salida línea a línea
+    
+    Returns:
+        dict: Código de salida del script
+    """
+    cmd = ['python', '/app/backup_mysql.py', *databases]
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    )
+    for line in process.stdout:
+        job.log(line.rstrip('\n'))
+    returncode = process.wait()
+    
+    if returncode != 0:
+        raise RuntimeError(f'backup_mysql.py terminó con código {returncode}')
+    return {'returncode': returncode}
+
 @app.route('/api/run-backup', methods=['POST'])
 def run_backup():
-    """Ejecuta un backup manual"""
+    """Encola un backup manual (de todas las bases de datos o de una)"""
     import logging
     
+    data = request.get_json(silent=True) or {}
+    database = data.get('database')
+    databases = [database] if database else []
+    key = ('backup', database) if database else ('backup',)
+    
     try:
-        logging.info("Ejecutando backup manual desde interfaz web...")
-        
-        # Ejecutar el script de backup
-        result = subprocess.run(
-            ['python', '/app/backup_mysql.py'],
-            capture_output=True,
-            text=True,
-            timeout=300  # Timeout de 5 minutos
+        logging.info("Encolando backup manual desde interfaz web...")
+        job = job_manager.submit(
+            'backup',
+            key,
+            lambda ctx: run_backup_job(ctx, databases),
+            {'database': database or 'todas'},
+            {'databases': databases}
         )
+        return jsonify({
+            'status': 'accepted',
+            'message': 'Backup en cola',
+            'job_id': job['id']
+        }), 202
         
-        if result.returncode == 0:
-            return jsonify({
-                'status': 'success',
-                'message': 'Backup completado exitosamente',
-                'output': result.stdout
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Error al ejecutar backup',
-                'error': result.stderr
-            }), 500
-            
-    except subprocess.TimeoutExpired:
+    except jobs.DuplicateJob as e:
         return jsonify({
             'status': 'error',
-            'message': 'Timeout: El backup tardó más de 5 minutos'
-        }), 500
+            'message': 'Ya hay un backup en curso',
+            'job_id': e.job['id']
+        }), 409
+    except jobs.JobQueueFull as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Cola de trabajos llena: {str(e)}'
+        }), 503
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
 
+def run_verify_job(job, filename=None, database=None):
+    """
+    Trabajo en segundo plano: verifica un backup, los de una base de datos o todos
+    
+    Returns:
+        dict: Totales y backups con errores
+    """
+    done = []
+    
+    def on_result(result):
+        done.append(result)
+        job.set_progress(verified=len(done))
+        mark = '✗' if result['status'] in integrity.FAILED_STATES else '✓'
+        job.log(f"{mark} {result['filename']}: {result['status']}" + (f" - {result['message']}" if result['message'] else ''))
+    
+    if filename:
+        row = catalog.get(filename)
+        job.set_progress(total=1, verified=0)
+        result = integrity.verify_backup(BACKUP_DIR / filename, row['sha256'] if row else None)
+        catalog.set_verification(filename, result['status'], datetime.now().isoformat())
+        on_result(result)
+        results = [result]
+    else:
+        job.set_progress(total=catalog.count(database), verified=0)
+        results = integrity.verify_catalog(catalog, BACKUP_DIR, database, VERIFY_WORKERS, on_result)
+    
+    failed = [r for r in results if r['status'] in integrity.FAILED_STATES]
+    return {
+        'verified': len(results),
+        'ok': sum(1 for r in results if r['status'] == integrity.OK),
+        'no_checksum': sum(1 for r in results if r['status'] == integrity.NO_CHECKSUM),
+        'failed': failed
+    }
+
+@app.route('/api/verify-backup', methods=['POST'])
+def verify_backup():
+    """
+    Encola la verificación de integridad de backups
+    
+    Cuerpo JSON: {"filename": ...} para un backup, {"database": ...} para los
+    de una base de datos o {} para todos. El resultado queda en /api/jobs/<id>.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    database = data.get('database')
+    
+    if filename:
+        backup_path = BACKUP_DIR / filename
+        if not is_backup(backup_path) or not backup_path.parent == BACKUP_DIR:
+            return jsonify({
+                'status': 'error',
+                'message': 'Backup no encontrado'
+            }), 404
+    
+    try:
+        job = job_manager.submit(
+            'verify',
+            ('verify', filename or database) if (filename or database) else ('verify',),
+            lambda ctx: run_verify_job(ctx, filename, database),
+            {'filename': filename, 'database': database or ('todas' if not filename else None)},
+            {'filename': filename, 'database': database}
+        )
+        return jsonify({
+            'status': 'accepted',
+            'message': 'Verificación en cola',
+            'job_id': job['id']
+        }), 202
+        
+    except jobs.DuplicateJob as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Ya hay una verificación en curso',
+            'job_id': e.job['id']
+        }), 409
+    except jobs.JobQueueFull as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Cola de trabajos llena: {str(e)}'
+        }), 503
+
+def run_drill_job(job, databases, target_index=None):
+    """
+    Trabajo en segundo plano: simulacro de restauración del último backup de cada base de datos
+    
+    Returns:
+        dict: Resultados de los simulacros
+    """
+    target = restore_drill.load_target(target_index)
+    databases = databases or catalog.databases()
+    results = []
+    for n, database in enumerate(databases):
+        job.set_progress(database=database, done=n, total=len(databases))
+        for drill in restore_drill.run_drills(catalog, BACKUP_DIR, [database], target):
+            results.append(drill)
+            job.log(f"{drill['filename']}: {drill['status']}" + (f" - {drill['error']}" if drill.get('error') else ''))
+    job.set_progress(done=len(databases), total=len(databases))
+    return {'drills': results}
+
+@app.route('/api/run-drill', methods=['POST'])
+def run_drill():
+    """
+    Encola un simulacro de restauración
+    
+    Cuerpo JSON opcional: {"database": ..., "target_index": ...}; por defecto
+    todas las bases de datos en el servidor de DRILL_TARGET / DRILL_HOST.
+    """
+    data = request.get_json(silent=True) or {}
+    database = data.get('database')
+    target_index = data.get('target_index')
+    
+    try:
+        target_index = int(target_index) if target_index not in (None, '') else None
+        restore_drill.load_target(target_index)
+        job = job_manager.submit(
+            'drill',
+            ('drill',),
+            lambda ctx: run_drill_job(ctx, [database] if database else [], target_index),
+            {'database': database or 'todas', 'target_index': target_index},
+            {'databases': [database] if database else [], 'target_index': target_index}
+        )
+        return jsonify({
+            'status': 'accepted',
+            'message': 'Simulacro en cola',
+            'job_id': job['id']
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except jobs.DuplicateJob as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Ya hay un simulacro en curso',
+            'job_id': e.job['id']
+        }), 409
+    except jobs.JobQueueFull as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Cola de trabajos llena: {str(e)}'
+        }), 503
+
+@app.route('/api/drills')
+def api_drills():
+    """
+    API para obtener el historial de simulacros de restauración
+    
+    Parámetros: database, status y limit. Incluye por base de datos el RTO
+    (duración de la última restauración correcta) y el rendimiento medio.
+    """
+    database = request.args.get('database')
+    limit = min(request.args.get('limit', 50, type=int), 1000)
+    drills = catalog.drills(database, request.args.get('status'), limit)
+    
+    summary = {}
+    for drill in catalog.drills(database, 'ok', limit=1000):
+        entry = summary.setdefault(drill['database'], {'rto_seconds': drill['restore_seconds'], 'throughputs': []})
+        if drill['throughput_mb_s']:
+            entry['throughputs'].append(drill['throughput_mb_s'])
+    for entry in summary.values():
+        throughputs = entry.pop('throughputs')
+        entry['avg_throughput_mb_s'] = round(sum(throughputs) / len(throughputs), 3) if throughputs else None
+    
+    return jsonify({'drills': drills, 'summary': summary})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Métricas de Prometheus (ver metrics.py)"""
+    def process_metrics(writer):
+        writer.add('mysql_backup_jobs_active', 'gauge', 'Trabajos en cola o en ejecución del monitor web',
+                   [({}, sum(1 for job in job_manager.list(1000) if job['state'] in jobs.ACTIVE_STATES))])
+    return Response(metrics.render_metrics(catalog, process_metrics), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/api/retention-plan')
+def api_retention_plan():
+    """
+    API para simular la política de retención (no elimina nada)
+    
+    Devuelve los backups que se conservarían (con los niveles que cubren) y
+    los que se eliminarían en la próxima ejecución.
+    """
+    plan = retention.plan_retention(catalog)
+    return jsonify({
+        'policy': {db: retention.policy_for(db) for db in catalog.databases()},
+        'keep': plan['keep'],
+        'delete': [row['filename'] for row in plan['delete']],
+        'freed_bytes': plan['freed_bytes']
+    })
+
+@app.route('/api/backup-tables')
+def api_backup_tables():
+    """
+    API para obtener las tablas de un backup (para restaurar tablas sueltas)
+    
+    Los backups sin índice (anteriores o deduplicados) también admiten
+    restauraciones por tablas, pero sus tablas no se conocen sin recorrerlos.
+    """
+    filename = request.args.get('filename', '')
+    backup_path = BACKUP_DIR / filename
+    if not filename or '/' in filename or not is_backup(backup_path):
+        return jsonify({
+            'status': 'error',
+            'message': f'Backup no encontrado: {filename}'
+        }), 404
+    
+    tables = seekable_archive.list_tables(backup_path)
+    return jsonify({
+        'status': 'success',
+        'indexed': tables is not None,
+        'tables': [{'name': name, 'raw_bytes': size} for name, size in sorted((tables or {}).items())]
+    })
+
+@app.route('/api/jobs')
+def api_jobs():
+    """API para obtener los trabajos recientes"""
+    return jsonify({'jobs': job_manager.list(request.args.get('limit', 50, type=int))})
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """API para obtener estado, progreso y salida de un trabajo"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Trabajo no encontrado'
+        }), 404
+    return jsonify(job)
+
 @app.route('/api/delete-backup', methods=['POST'])
 def delete_backup():
     """Elimina un archivo de backup"""
@@ -984,14 +1506,15 @@ def delete_backup():
             }), 404
         
         # Validar que es un archivo de backup válido (seguridad)
-        if not backup_path.suffix == '.gz' or not backup_path.parent == BACKUP_DIR:
+        if not is_backup(backup_path) or not backup_path.parent == BACKUP_DIR:
             return jsonify({
                 'status': 'error',
                 'message': 'Archivo inválido'
             }), 400
         
-        # Eliminar el archivo
-        backup_path.unlink()
+        # Eliminar el archivo (o directorio de backup por tablas)
+        remove_backup(backup_path)
+        catalog.remove(filename)
         
         logging.info(f"Backup eliminado: {filename}")
         
@@ -1035,12 +1558,13 @@ def delete_multiple_backups():
                     continue
                 
                 # Validar que es un archivo de backup válido (seguridad)
-                if not backup_path.suffix == '.gz' or not backup_path.parent == BACKUP_DIR:
+                if not is_backup(backup_path) or not backup_path.parent == BACKUP_DIR:
                     errors.append(f'{filename}: Archivo inválido')
                     continue
                 
-                # Eliminar el archivo
-                backup_path.unlink()
+                # Eliminar el archivo (o directorio de backup por tablas)
+                remove_backup(backup_path)
+                catalog.remove(filename)
                 deleted_count += 1
                 logging.info(f"Backup eliminado: {filename}")
                 
@@ -1099,6 +1623,225 @@ def get_restore_targets():
             'message': str(e)
         }), 500
 
+def run_restore_job(job, backup_path, target, database_name, point_in_time=None, base=None, tables=None,
+                    mode='replace'):
+    """
+    Trabajo en segundo plano: restaura el backup (ver restore_to_target()) y
+    registra la duración y el resultado para /metrics
+    
+    Returns:
+        dict: Métricas de restore_engine.restore()
+    """
+    started_at = datetime.now()
+    start = time.monotonic()
+    source_database = parse_backup_name(backup_path.name)[0]
+    try:
+        restore_stats = restore_to_target(job, backup_path, target, database_name, point_in_time, base, tables, mode)
+    except BaseException:
+        record_restore(source_database, started_at, time.monotonic() - start, 'failed', backup_path.name)
+        raise
+    record_restore(source_database, started_at, time.monotonic() - start, 'success', backup_path.name,
+                   restore_stats.get('bytes'))
+    return restore_stats
+
+def resume_restore_job(job, filename, target_index, database_name, point_in_time=None, tables=None,
+                       mode='replace'):
+    """
+    Restauración que quedó en cola al reiniciar (ver jobs.JobManager.resume()):
+    el destino y el backup base se vuelven a leer de la configuración y del catálogo
+    
+    Returns:
+        dict: Métricas de restore_engine.restore()
+    """
+    with open('/app/restore_targets.json', 'r', encoding='utf-8') as f:
+        targets = json.load(f).get('databases', [])
+    if not 0 <= target_index < len(targets):
+        raise ValueError(f'Índice de destino inválido: {target_index}')
+    backup_path = BACKUP_DIR / filename
+    if not backup_path.exists():
+        raise FileNotFoundError(f'Archivo de backup no encontrado: {backup_path}')
+    if point_in_time:
+        point_in_time = datetime.fromisoformat(point_in_time)
+        base = catalog.get(filename)
+    else:
+        base = None
+    return run_restore_job(job, backup_path, targets[target_index], database_name, point_in_time, base, tables, mode)
+
+def record_restore(database_name, started_at, duration, status, filename, raw_bytes=None):
+    """Registra una restauración en el catálogo para /metrics"""
+    import logging
+    
+    try:
+        catalog.record_operation({
+            'kind': 'restore',
+            'database': database_name,
+            'started_at': started_at.isoformat(),
+            'duration_seconds': round(duration, 3),
+            'status': status,
+            'raw_bytes': raw_bytes,
+            'filename': filename
+        })
+    except Exception as e:
+        logging.warning(f"No se pudo registrar la métrica de restauración: {str(e)}")
+
+def restore_to_target(job, backup_path, target, database_name, point_in_time=None, base=None, tables=None,
+                      mode='replace'):
+    """
+    Recrea la base de datos destino y restaura el backup
+    
+    Con `point_in_time` se reproducen después los binlogs archivados desde la
+    posición del backup (`base`, su fila del catálogo) hasta ese instante.
+    Con `tables` solo se restauran esas tablas (ver seekable_archive.py): la
+    base de datos destino se crea si no existe y el resto no se modifica.
+    Con mode='swap' la base de datos destino sigue en uso durante la carga
+    y se intercambia al final (ver shadow_restore.py).
+    
+    Returns:
+        dict: Métricas de restore_engine.restore()
+    """
+    import logging
+    
+    if mode == 'swap':
+        return restore_with_swap(job, backup_path, target, database_name)
+    
+    # Limpiar (eliminar y recrear) la base de datos destino
+    prepare_sql = f'DROP DATABASE IF EXISTS `{database_name}`; CREATE DATABASE `{database_name}`;'
+    if tables:
+        prepare_sql = f'CREATE DATABASE IF NOT EXISTS `{database_name}`;'
+    drop_cmd = [
+        'mysql',
+        f'--host={target["host"]}',
+        f'--port={target["port"]}',
+        f'--user={target["user"]}',
+        f'--password={target["password"]}',
+        '--skip-ssl',
+        '-e',
+        prepare_sql
+    ]
+    
+    job.set_progress(stage='prepare')
+    logging.info(f"Ejecutando comando DROP/CREATE DATABASE...")
+    logging.debug(f"Comando (sin password): mysql --host={target['host']} --port={target['port']} --user={target['user']} --skip-ssl -e '{prepare_sql}'")
+    
+    if mysql_native.enabled():
+        # Conexión del pool del destino en lugar de un cliente mysql
+        try:
+            mysql_native.query(mysql_native.pool_for_target(target), prepare_sql)
+        except mysql_native.NativeError as e:
+            logging.error(f"Error al preparar base de datos: {str(e)}")
+            raise RuntimeError(f'Error al preparar base de datos: {str(e)}')
+    else:
+        result = subprocess.run(drop_cmd, capture_output=True, text=True, timeout=30)
+        
+        logging.debug(f"Return code DROP/CREATE: {result.returncode}")
+        logging.debug(f"STDOUT: {result.stdout}")
+        logging.debug(f"STDERR: {result.stderr}")
+        
+        if result.returncode != 0:
+            logging.error(f"Error al preparar base de datos: {result.stderr}")
+            raise RuntimeError(f'Error al preparar base de datos: {result.stderr}')
+    
+    logging.info(f"Base de datos {database_name} preparada correctamente")
+    
+    restore_cmd = [
+        'mysql',
+        f'--host={target["host"]}',
+        f'--port={target["port"]}',
+        f'--user={target["user"]}',
+        f'--password={target["password"]}',
+        '--skip-ssl',
+        '--force',              # Continuar si hay errores no críticos
+        '--comments',           # Preservar comentarios SQL
+        '--binary-mode=0',      # Modo texto para manejar procedimientos
+        database_name           # Base destino (se omite el USE original del volcado)
+    ]
+    
+    logging.info(f"Iniciando proceso de restauración ({RESTORE_PARALLELISM} conexiones)...")
+    logging.debug(f"Comando mysql (sin password): mysql --host={target['host']} --port={target['port']} --user={target['user']} --skip-ssl --force --comments --binary-mode=0 {database_name}")
+    
+    job.set_progress(stage='restore')
+    tracker = restore_progress.start(database_name, 'restore')
+    try:
+        if tables:
+            logging.info(f"Restaurando solo las tablas: {', '.join(tables)}")
+            restore_stats = seekable_archive.restore_tables(
+                backup_path,
+                tables,
+                restore_cmd,
+                workers=RESTORE_PARALLELISM,
+                timeout=RESTORE_TIMEOUT,
+                work_dir=RESTORE_WORK_DIR,
+                on_table=lambda done, total: job.set_progress(tables_done=done, tables_total=total),
+                tracker=tracker
+            )
+        else:
+            restore_stats = restore_engine.restore(
+                backup_path,
+                restore_cmd,
+                workers=RESTORE_PARALLELISM,
+                timeout=RESTORE_TIMEOUT,
+                work_dir=RESTORE_WORK_DIR,
+                on_table=lambda done, total: job.set_progress(tables_done=done, tables_total=total),
+                tracker=tracker
+            )
+    except BaseException:
+        tracker.finish('failed')
+        raise
+    tracker.finish()
+    restore_stats['bytes'] = tracker.bytes
+    
+    if point_in_time is not None:
+        job.set_progress(stage='binlogs')
+        logging.info(f"Reproduciendo binlogs desde {base['binlog_file']}:{base['binlog_pos']} hasta {point_in_time}...")
+        restore_stats['binlogs_replayed'] = BinlogArchive(BACKUP_DIR).replay(
+            base['binlog_file'],
+            base['binlog_pos'],
+            point_in_time,
+            base['database'],
+            database_name,
+            restore_cmd,
+            timeout=RESTORE_TIMEOUT
+        )
+        restore_stats['point_in_time'] = point_in_time.isoformat()
+    
+    logging.info(f"Restauración: {restore_stats['tables']} tablas en {restore_stats['total_seconds']:.1f}s")
+    logging.info(f"✅ Backup {backup_path.name} restaurado exitosamente en {target['name']} como {database_name}")
+    logging.info("=== FIN DE PROCESO DE RESTAURACIÓN ===")
+    
+    return restore_stats
+
+def restore_with_swap(job, backup_path, target, database_name):
+    """Restaura en una base de datos sombra y la intercambia con la destino"""
+    import logging
+    
+    logging.info(f"Iniciando restauración con intercambio ({RESTORE_PARALLELISM} conexiones)...")
+    job.set_progress(stage='restore')
+    tracker = restore_progress.start(database_name, 'restore')
+    try:
+        restore_stats = shadow_restore.restore_with_swap(
+            backup_path,
+            target,
+            database_name,
+            workers=RESTORE_PARALLELISM,
+            timeout=RESTORE_TIMEOUT,
+            work_dir=RESTORE_WORK_DIR,
+            on_table=lambda done, total: job.set_progress(tables_done=done, tables_total=total),
+            tracker=tracker,
+            on_stage=lambda stage: job.set_progress(stage=stage)
+        )
+    except BaseException:
+        tracker.finish('failed')
+        raise
+    tracker.finish()
+    restore_stats['bytes'] = tracker.bytes
+    
+    logging.info(f"Restauración: {restore_stats['tables']} tablas en {restore_stats['total_seconds']:.1f}s, "
+                 f"intercambio en {restore_stats['swap_seconds']:.3f}s")
+    logging.info(f"✅ Backup {backup_path.name} restaurado exitosamente en {target['name']} como {database_name}")
+    logging.info("=== FIN DE PROCESO DE RESTAURACIÓN ===")
+    
+    return restore_stats
+
 @app.route('/api/restore-backup', methods=['POST'])
 def restore_backup():
     """Restaura un backup en un servidor destino"""
@@ -1120,8 +1863,37 @@ def restore_backup():
         filename = data.get('filename')
         target_index = data.get('target_index')
         database_name = data.get('database_name')
+        point_in_time = data.get('point_in_time')
+        tables = data.get('tables') or None
+        mode = data.get('mode') or RESTORE_MODE
+        
+        logging.info(f"Parámetros - Archivo: {filename}, Target Index: {target_index}, DB: {database_name}, "
+                     f"Tablas: {tables}, Modo: {mode}")
         
-        logging.info(f"Parámetros - Archivo: {filename}, Target Index: {target_index}, DB: {database_name}")
+        if tables is not None and (not isinstance(tables, list) or not all(isinstance(t, str) and t for t in tables)):
+            return jsonify({
+                'status': 'error',
+                'message': 'tables debe ser una lista de nombres de tabla'
+            }), 400
+        if tables and point_in_time:
+            return jsonify({
+                'status': 'error',
+                'message': 'La recuperación a un instante restaura la base de datos completa'
+            }), 400
+        if mode not in RESTORE_MODES:
+            return jsonify({
+                'status': 'error',
+                'message': f'Modo de restauración inválido: {mode} (replace o swap)'
+            }), 400
+        # Las tablas sueltas no eliminan la base de datos; el intercambio
+        # valida contra el volcado, que no incluye los binlogs
+        if tables or point_in_time:
+            if data.get('mode') == 'swap':
+                return jsonify({
+                    'status': 'error',
+                    'message': 'El intercambio restaura la base de datos completa y sin binlogs'
+                }), 400
+            mode = 'replace'
         
         if not filename or target_index is None or not database_name:
             logging.error(f"Parámetros incompletos - filename: {filename}, target_index: {target_index}, database_name: {database_name}")
@@ -1143,6 +1915,38 @@ def restore_backup():
         
         logging.info(f"Archivo encontrado. Tamaño: {backup_path.stat().st_size} bytes")
         
+        # Recuperación a un instante: el backup debe tener posición de binlog
+        # y los binlogs archivados deben cubrir desde ella sin huecos
+        base = None
+        if point_in_time:
+            try:
+                point_in_time = datetime.fromisoformat(point_in_time)
+            except ValueError:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Fecha inválida: {point_in_time}'
+                }), 400
+            base = catalog.get(filename)
+            if not base or not base.get('binlog_file'):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'El backup no tiene posición de binlog (requiere INCREMENTAL_BACKUPS)'
+                }), 400
+            if point_in_time < datetime.fromisoformat(base['created_at']):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'El instante es anterior al backup'
+                }), 400
+            try:
+                BinlogArchive(BACKUP_DIR).chain_from(base['binlog_file'])
+            except ValueError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 409
+        else:
+            point_in_time = None
+        
         # Cargar configuración de destinos
         targets_file = Path('/app/restore_targets.json')
         logging.info(f"Cargando configuración de destinos desde: {targets_file}")
@@ -1172,108 +1976,48 @@ def restore_backup():
         target = targets[target_index]
         logging.info(f"Target seleccionado: {target['name']} - {target['host']}:{target['port']}")
         
-        # Limpiar (eliminar y recrear) la base de datos destino
-        drop_cmd = [
-            'mysql',
-            f'--host={target["host"]}',
-            f'--port={target["port"]}',
-            f'--user={target["user"]}',
-            f'--password={target["password"]}',
-            '--skip-ssl',
-            '-e',
-            f'DROP DATABASE IF EXISTS `{database_name}`; CREATE DATABASE `{database_name}`;'
-        ]
-        
-        logging.info(f"Ejecutando comando DROP/CREATE DATABASE...")
-        logging.debug(f"Comando (sin password): mysql --host={target['host']} --port={target['port']} --user={target['user']} --skip-ssl -e 'DROP DATABASE IF EXISTS `{database_name}`; CREATE DATABASE `{database_name}`;'")
-        
-        result = subprocess.run(drop_cmd, capture_output=True, text=True, timeout=30)
-        
-        logging.debug(f"Return code DROP/CREATE: {result.returncode}")
-        logging.debug(f"STDOUT: {result.stdout}")
-        logging.debug(f"STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            logging.error(f"Error al preparar base de datos: {result.stderr}")
-            return jsonify({
-                'status': 'error',
-                'message': f'Error al preparar base de datos: {result.stderr}'
-            }), 500
-        
-        logging.info(f"Base de datos {database_name} preparada correctamente")
-        
-        # Restaurar el backup usando gunzip y pipe a mysql
-        gunzip_cmd = ['gunzip', '-c', str(backup_path)]
-        
-        restore_cmd = [
-            'mysql',
-            f'--host={target["host"]}',
-            f'--port={target["port"]}',
-            f'--user={target["user"]}',
-            f'--password={target["password"]}',
-            '--skip-ssl',
-            '--force',              # Continuar si hay errores no críticos
-            '--comments',           # Preservar comentarios SQL
-            '--binary-mode=0'       # Modo texto para manejar procedimientos
-        ]
-        
-        logging.info("Iniciando proceso de restauración...")
-        logging.debug(f"Comando gunzip: {' '.join(gunzip_cmd)}")
-        logging.debug(f"Comando mysql (sin password): mysql --host={target['host']} --port={target['port']} --user={target['user']} --skip-ssl --force --comments --binary-mode=0")
-        
-        # Ejecutar gunzip
-        logging.info("Ejecutando gunzip...")
-        gunzip_process = subprocess.Popen(
-            gunzip_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        logging.info("Ejecutando mysql restore...")
-        result = subprocess.run(
-            restore_cmd,
-            stdin=gunzip_process.stdout,
-            capture_output=True,
-            text=True,
-            timeout=600  # 10 minutos timeout
+        # Encolar la restauración en segundo plano
+        job = job_manager.submit(
+            'restore',
+            ('restore', target_index, database_name),
+            lambda ctx: run_restore_job(ctx, backup_path, target, database_name, point_in_time, base, tables, mode),
+            {
+                'filename': filename,
+                'target': target['name'],
+                'database_name': database_name,
+                'point_in_time': point_in_time.isoformat() if point_in_time else None,
+                'tables': tables,
+                'mode': mode
+            },
+            # Sin las credenciales del destino: resume_restore_job() las relee
+            {
+                'filename': filename,
+                'target_index': target_index,
+                'database_name': database_name,
+                'point_in_time': point_in_time.isoformat() if point_in_time else None,
+                'tables': tables,
+                'mode': mode
+            }
         )
-        
-        gunzip_process.stdout.close()
-        gunzip_stderr = gunzip_process.communicate()[1]
-        gunzip_returncode = gunzip_process.wait()
-        
-        logging.debug(f"Gunzip return code: {gunzip_returncode}")
-        if gunzip_stderr:
-            logging.debug(f"Gunzip STDERR: {gunzip_stderr.decode('utf-8', errors='replace')}")
-        
-        logging.debug(f"MySQL return code: {result.returncode}")
-        logging.debug(f"MySQL STDOUT: {result.stdout}")
-        logging.debug(f"MySQL STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            error_msg = f"Error al restaurar backup. Return code: {result.returncode}, STDERR: {result.stderr}"
-            logging.error(error_msg)
-            return jsonify({
-                'status': 'error',
-                'message': error_msg
-            }), 500
-        
-        logging.info(f"✅ Backup {filename} restaurado exitosamente en {target['name']} como {database_name}")
-        logging.info("=== FIN DE PROCESO DE RESTAURACIÓN ===")
+        logging.info(f"Restauración encolada como trabajo {job['id']}")
         
         return jsonify({
-            'status': 'success',
-            'message': f'Backup restaurado correctamente en {target["name"]}'
-        })
+            'status': 'accepted',
+            'message': f'Restauración en cola en {target["name"]}',
+            'job_id': job['id']
+        }), 202
         
-    except subprocess.TimeoutExpired as e:
-        error_msg = f"Timeout durante la restauración: {str(e)}"
-        logging.error(error_msg)
-        logging.error(traceback.format_exc())
+    except jobs.DuplicateJob as e:
         return jsonify({
             'status': 'error',
-            'message': error_msg
-        }), 500
+            'message': f'Ya hay una restauración en curso para {database_name}',
+            'job_id': e.job['id']
+        }), 409
+    except jobs.JobQueueFull as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Cola de trabajos llena: {str(e)}'
+        }), 503
     except Exception as e:
         error_msg = f"Excepción durante restauración: {type(e).__name__}: {str(e)}"
         logging.error(error_msg)
@@ -1283,5 +2027,13 @@ def restore_backup():
             'message': error_msg
         }), 500
 
+# Trabajos que quedaron en cola al reiniciar el proceso web
+job_manager.resume({
+    'backup': run_backup_job,
+    'verify': run_verify_job,
+    'drill': run_drill_job,
+    'restore': resume_restore_job
+})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)